@@ -1,19 +1,87 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_file
+from markupsafe import Markup
 from flask_sqlalchemy import SQLAlchemy
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.engine import Engine
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import wraps
+import asyncio
+import base64
+import click
+import csv
 import os
 import markdown
 import re
+import difflib
+import gzip
+import hashlib
+import json
+import mimetypes
+import sqlite3
+import tarfile
+import tempfile
+import threading
+import time
+import zlib
+from urllib.parse import parse_qs, urlsplit
+
+# Pillow is only needed for image thumbnails; uploads still work without it
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+# Brotli is optional; responses fall back to gzip without it
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# NumPy/SciPy are only needed to build the related-posts table offline
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = None
+    sparse = None
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here'  # Change this in production
 
-# Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///blog.db'
+# Database configuration (DATABASE_URL overrides the default file, e.g. for tests)
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///blog.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Rate limit storage: 'memory' (per process) or 'sqlite' (shared by all
+# workers on this host through a small separate database file)
+app.config['RATELIMIT_STORAGE'] = os.environ.get('RATELIMIT_STORAGE', 'memory')
+app.config['RATELIMIT_SQLITE_PATH'] = os.path.join(app.instance_path, 'ratelimit.db')
+
+# Sweep orphan likes in the background of each serving process ('0' disables)
+app.config['LIKE_SWEEPER'] = os.environ.get('LIKE_SWEEPER', '1') != '0'
+
+# python app.py serves like events and relays everything else from port 5000
+# on one event loop thread; the WSGI server listens on this loopback port
+app.config['LIKE_EVENTS_BACKEND_PORT'] = int(os.environ.get('LIKE_EVENTS_BACKEND_PORT', 5001))
+
+# Largest accepted request body (image/attachment uploads)
+app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024
+
 db = SQLAlchemy(app)
 
+# SQLite ignores foreign keys (and ON DELETE CASCADE) unless enabled per connection
+@event.listens_for(Engine, 'connect')
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
 # Register markdown filter for Jinja2
 @app.template_filter('markdown')
 def markdown_filter(text):
@@ -45,113 +113,1366 @@ class User(db.Model):
 # Like model for tracking post likes
 class Like(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    post_filename = db.Column(db.String(255), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    post_filename = db.Column(db.String(255), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
     
     # Ensure one user can like a post only once
     __table_args__ = (db.UniqueConstraint('user_id', 'post_filename', name='unique_user_post_like'),)
     
-    user = db.relationship('User', backref='likes')
+    user = db.relationship('User', backref=db.backref('likes', passive_deletes=True))
+
+# Draft model for autosaved, unpublished post content
+class Draft(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    # 'new' for the create form, otherwise the filename of the post being edited
+    draft_key = db.Column(db.String(255), nullable=False)
+    title = db.Column(db.String(255), default='')
+    content = db.Column(db.Text, default='')
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(),
+                           onupdate=db.func.current_timestamp())
+
+    # One draft per user per post (or per new post)
+    __table_args__ = (db.UniqueConstraint('user_id', 'draft_key', name='unique_user_draft'),)
+
+# PostRevision model for post edit history
+class PostRevision(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    post_filename = db.Column(db.String(255), nullable=False)
+    number = db.Column(db.Integer, nullable=False)
+    # Snapshots hold the full text, other revisions a delta against number - 1
+    is_snapshot = db.Column(db.Boolean, nullable=False, default=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+    title = db.Column(db.String(255))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'))
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+    __table_args__ = (db.UniqueConstraint('post_filename', 'number', name='unique_post_revision'),)
+
+    user = db.relationship('User')
+
+# Comment model; threads are stored as materialized paths of zero-padded ids
+# ("00000012.00000045") so a whole thread sorts correctly by path alone
+class Comment(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    post_filename = db.Column(db.String(255), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'))
+    parent_id = db.Column(db.Integer, db.ForeignKey('comment.id', ondelete='CASCADE'))
+    path = db.Column(db.String(512), nullable=False, default='')
+    depth = db.Column(db.Integer, nullable=False, default=0)
+    body = db.Column(db.Text, nullable=False)
+    is_hidden = db.Column(db.Boolean, nullable=False, default=False)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+    __table_args__ = (db.Index('ix_comment_post_path', 'post_filename', 'path'),)
+
+# Visible comment count per post, updated with each comment change
+class CommentCount(db.Model):
+    post_filename = db.Column(db.String(255), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+# Precomputed "related posts" neighbors, rebuilt by 'flask build-related'
+class RelatedPost(db.Model):
+    post_filename = db.Column(db.String(255), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    related_filename = db.Column(db.String(255), nullable=False)
+    related_title = db.Column(db.String(255))
+    score = db.Column(db.Float, nullable=False)
+
+# Single-row table holding the applied schema migration version
+class SchemaVersion(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
 
 # Posts directory
 POSTS_DIR = 'posts'
 
+# Uploaded images/attachments, stored by content hash: uploads/ab/abcd...ef.png
+UPLOADS_DIR = 'uploads'
+UPLOAD_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp', 'pdf'}
+
+# Resized variants (longest side in pixels) generated once at upload time.
+# GIFs are kept as-is so animations survive
+IMAGE_VARIANTS = {'thumb': 320, 'medium': 800, 'large': 1600}
+RESIZABLE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'webp'}
+
+# Upload names are <sha256>[-<variant>].<ext>
+UPLOAD_NAME_RE = re.compile(r'^([0-9a-f]{64})(?:-(' + '|'.join(IMAGE_VARIANTS) + r'))?\.([a-z]+)$')
+
+# Uploads never change for a given name, so browsers can cache them for a year
+UPLOAD_CACHE_SECONDS = 365 * 24 * 3600
+
+# Worker pool for resizing images off the request thread
+image_executor = ThreadPoolExecutor(max_workers=max(2, min(4, os.cpu_count() or 1)),
+                                    thread_name_prefix='image-resize')
+
+# Draft key used by the create form
+NEW_DRAFT_KEY = 'new'
+
+# Client-side autosave debounce (milliseconds): keystrokes are coalesced into
+# one request after this much idle time, and at least every DRAFT_MAX_WAIT_MS
+DRAFT_DEBOUNCE_MS = 2000
+DRAFT_MAX_WAIT_MS = 10000
+
+# Store a full snapshot every N revisions so rebuilding any revision needs
+# one snapshot plus at most N - 1 deltas
+REVISION_SNAPSHOT_INTERVAL = 10
+
+# Users shown per page in the admin panel
+ADMIN_USERS_PER_PAGE = 50
+
+# Orphan like sweeper: rows checked per batch and seconds between runs
+LIKE_SWEEP_BATCH_SIZE = 500
+LIKE_SWEEP_INTERVAL = 3600
+
+# Maximum rendered post card fragments kept in memory
+POST_FRAGMENT_CACHE_SIZE = 2000
+
+# Maximum parsed post files kept in memory, keyed by path and checked
+# against the file's mtime and size on every read
+POST_CACHE_SIZE = 2000
+_post_cache = OrderedDict()
+_post_cache_lock = threading.Lock()
+
+# Rendered viewer-independent card fragments, keyed by (fragment, filename, version)
+_post_fragments = OrderedDict()
+_post_fragments_lock = threading.Lock()
+
+# Like event subscribers: max posts per connection, queued events per
+# connection before dropping, seconds between keep-alive comments, and
+# seconds a client gets to send its request head
+LIKE_EVENTS_MAX_POSTS = 200
+LIKE_EVENTS_QUEUE_SIZE = 100
+LIKE_EVENTS_HEARTBEAT = 15
+LIKE_EVENTS_HEAD_TIMEOUT = 10
+
+# Comments: page size for JSON loading, max nesting shown, max body length
+COMMENTS_PER_PAGE = 50
+COMMENT_MAX_DEPTH = 8
+COMMENT_MAX_LENGTH = 5000
+
+# Related posts: neighbors kept per post, weight of co-likes vs. text
+# similarity, and rows of the similarity matrix computed at a time
+RELATED_POSTS_TOP_K = 5
+RELATED_LIKE_WEIGHT = 0.3
+RELATED_BLOCK_SIZE = 512
+RELATED_STOP_WORDS = frozenset('''
+    a an and are as at be but by for from has have i in is it its of on or so that the
+    this to was we were will with you your my our not can just also if then than into
+'''.split())
+
+# JSON API: fields clients may request with ?fields=, the defaults for list
+# and detail responses, and page sizes for cursor pagination
+API_POST_FIELDS = ('slug', 'title', 'author', 'content', 'html', 'like_count',
+                   'comment_count', 'version', 'created_at', 'url')
+API_LIST_FIELDS = ('slug', 'title', 'author', 'like_count', 'created_at')
+API_DETAIL_FIELDS = ('slug', 'title', 'author', 'content', 'like_count',
+                     'comment_count', 'version', 'created_at')
+API_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = 100
+
+# Fingerprinted static assets: precompressed copies live here
+ASSET_CACHE_DIR = os.path.join(app.instance_path, 'assets')
+ASSET_CACHE_SECONDS = 365 * 24 * 3600
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.json', '.txt', '.html'}
+
+# Dynamic responses smaller than this aren't worth compressing
+COMPRESS_MIN_SIZE = 500
+COMPRESS_MIMETYPES = {'text/html', 'text/css', 'text/plain', 'application/json', 'application/javascript'}
+
+# static path -> fingerprinted name, and fingerprinted name -> files to serve
+ASSET_MANIFEST = {}
+_asset_files = {}
+# Built on first use rather than at import, which would write into instance/
+_asset_manifest_state = {'built': False}
+_asset_manifest_lock = threading.Lock()
+
+# Rows per fetch/insert batch when exporting or importing the blog
+ARCHIVE_BATCH_SIZE = 1000
+
+# Cached author -> post count map, rebuilt when the posts directory changes
+_author_post_counts = {'mtime': None, 'counts': {}}
+
+# Process that started the like sweeper (a forked worker starts its own)
+_like_sweeper = {'pid': None}
+_like_sweeper_lock = threading.Lock()
+
+# Rate limits per route: scope -> (burst capacity, seconds to refill it).
+# 'ip' buckets are keyed by client address, 'user' buckets by the logged-in
+# user, or on the login form by client address plus submitted username, so
+# nobody can lock a victim out by guessing at their username from elsewhere
+RATE_LIMITS = {
+    'login': {'ip': (10, 60), 'user': (5, 300)},
+    'register': {'ip': (5, 3600)},
+    'like': {'ip': (60, 60), 'user': (30, 60)},
+    'upload': {'ip': (30, 300), 'user': (20, 300)},
+    'comment': {'ip': (30, 60), 'user': (10, 60)},
+}
+
+# Maximum buckets kept by the in-memory store before evicting the least recently used
+RATE_LIMIT_MAX_BUCKETS = 10000
+
+class MemoryTokenBucketStore:
+    """Token buckets held in a bounded LRU dict (one per process)"""
+
+    def __init__(self, max_buckets=RATE_LIMIT_MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        # key -> (tokens, last refill timestamp)
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def consume(self, key, capacity, period):
+        """Take one token; returns (allowed, seconds until a token is available)"""
+        now = time.monotonic()
+        rate = capacity / period
+        with self.lock:
+            tokens, last = self.buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - last) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self.buckets[key] = (tokens, now)
+            while len(self.buckets) > self.max_buckets:
+                self.buckets.popitem(last=False)
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+class SQLiteTokenBucketStore:
+    """Token buckets in a SQLite file so every worker sees the same counts"""
+
+    # Buckets idle this long are full again and can be dropped
+    IDLE_SECONDS = 3600
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.last_cleanup = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._connect()
+        conn.execute('CREATE TABLE IF NOT EXISTS buckets '
+                     '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_buckets_updated ON buckets (updated)')
+
+    def _connect(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            self.local.conn = conn
+        return conn
+
+    def consume(self, key, capacity, period):
+        """Take one token; returns (allowed, seconds until a token is available)"""
+        now = time.time()
+        rate = capacity / period
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+            tokens, last = row if row else (capacity, now)
+            tokens = min(capacity, tokens + (now - last) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            conn.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                         (key, tokens, now))
+            if now - self.last_cleanup > self.IDLE_SECONDS:
+                conn.execute('DELETE FROM buckets WHERE updated < ?', (now - self.IDLE_SECONDS,))
+                self.last_cleanup = now
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+def create_rate_limit_store():
+    """Create the configured rate limit store"""
+    if app.config['RATELIMIT_STORAGE'] == 'sqlite':
+        return SQLiteTokenBucketStore(app.config['RATELIMIT_SQLITE_PATH'])
+    return MemoryTokenBucketStore()
+
+rate_limit_store = create_rate_limit_store()
+
+def rate_limit(name, template=None):
+    """Throttle POSTs to a route using the buckets configured in RATE_LIMITS
+
+    Runs before the view so throttled requests never reach the database or
+    password hashing. JSON routes get a JSON 429, form routes re-render
+    their template with a flash message.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if request.method != 'POST':
+                return view(*args, **kwargs)
+            
+            limits = RATE_LIMITS.get(name, {})
+            keys = []
+            if 'ip' in limits:
+                keys.append((f'{name}:ip:{request.remote_addr}', limits['ip']))
+            if 'user' in limits:
+                user_key = session.get('user_id')
+                if not user_key:
+                    username = request.form.get('username', '').strip().lower()
+                    user_key = f'{request.remote_addr}:{username}' if username else None
+                if user_key:
+                    keys.append((f'{name}:user:{user_key}', limits['user']))
+            
+            for key, (capacity, period) in keys:
+                try:
+                    allowed, retry_after = rate_limit_store.consume(key, capacity, period)
+                except Exception as e:
+                    # Fail open; a broken limiter shouldn't take the site down
+                    print(f"Rate limit error for {key}: {e}")
+                    continue
+                if not allowed:
+                    message = 'Too many requests. Please try again later.'
+                    if template:
+                        flash(message, 'error')
+                        response = app.make_response((render_template(template), 429))
+                    else:
+                        response = app.make_response((jsonify({'error': message}), 429))
+                    response.headers['Retry-After'] = str(int(retry_after) + 1)
+                    return response
+            
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
+
 def get_posts():
-    """Get all posts"""
+    """Get all posts, newest first
+
+    Parsed files come from the post cache, so only new or changed files are
+    read, and likes for the whole list take two grouped queries.
+    """
     posts = []
     try:
         if not os.path.exists(POSTS_DIR):
             print(f"Posts directory {POSTS_DIR} does not exist")
             return posts
         
-        for filename in os.listdir(POSTS_DIR):
-            if filename.endswith('.md'):
-                post = get_post(filename)
-                if post:
-                    try:
-                        # Add like count and user like status
-                        post['like_count'] = Like.query.filter_by(post_filename=filename).count()
-                        if session.get('user_id'):
-                            post['user_liked'] = Like.query.filter_by(
-                                user_id=session['user_id'], 
-                                post_filename=filename
-                            ).first() is not None
-                        else:
-                            post['user_liked'] = False
-                        posts.append(post)
-                    except Exception as e:
-                        print(f"Error processing likes for {filename}: {e}")
-                        # Still add the post without like info
-                        post['like_count'] = 0
-                        post['user_liked'] = False
-                        posts.append(post)
-        
-        # Sort posts by creation time (newest first)
-        posts.sort(key=lambda x: os.path.getctime(os.path.join(POSTS_DIR, x['filename'])), reverse=True)
+        for _, filename, stat in list_post_entries():
+            try:
+                cached = load_post(filename, stat)
+            except Exception as e:
+                print(f"Error reading post {filename}: {e}")
+                continue
+            if cached:
+                posts.append(dict(cached))
+        
+        # Add like count and user like status
+        like_counts, user_likes = get_like_info()
+        for post in posts:
+            post['like_count'] = like_counts.get(post['filename'], 0)
+            post['user_liked'] = post['filename'] in user_likes
         return posts
     except Exception as e:
         print(f"Error reading posts: {e}")
         return posts
 
+def parse_post_content(filename, content):
+    """Split raw post markdown into (author, title, content)"""
+    # Extract author from first line if it starts with "Author: "
+    lines = content.split('\n')
+    author = None
+    if lines and lines[0].startswith('Author: '):
+        author = lines[0].replace('Author: ', '').strip()
+        # Remove author line and get the rest of the content
+        content = '\n'.join(lines[1:]).strip()
+    
+    # Extract title from first non-empty line (after author)
+    title = None
+    for line in lines[1:]:
+        if line.strip():
+            if line.strip().startswith('# '):
+                title = line.strip().replace('# ', '')
+            else:
+                title = line.strip()
+            break
+    
+    if not title:
+        title = filename.replace('.md', '').replace('-', ' ').title()
+    
+    return author, title, content
+
+def load_post(filename, stat=None):
+    """Parsed post file without like info, re-read only when the file changes
+
+    Returns None if the file doesn't exist. The dict is shared through the
+    cache, so copy it before adding request-specific fields.
+    """
+    filepath = os.path.join(POSTS_DIR, filename)
+    if stat is None:
+        try:
+            stat = os.stat(filepath)
+        except FileNotFoundError:
+            return None
+    
+    # Changes whenever the file is rewritten; also keys cached fragments
+    version = f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+    with _post_cache_lock:
+        cached = _post_cache.get(filepath)
+        if cached is not None and cached['version'] == version:
+            _post_cache.move_to_end(filepath)
+            return cached
+    
+    with open(filepath, 'r', encoding='utf-8') as f:
+        content = f.read()
+    author, title, content = parse_post_content(filename, content)
+    post = {
+        'filename': filename,
+        'title': title,
+        'content': content,
+        'author': author,
+        'author_username': author,  # Add this for easier access
+        'version': version
+    }
+    
+    with _post_cache_lock:
+        _post_cache[filepath] = post
+        _post_cache.move_to_end(filepath)
+        while len(_post_cache) > POST_CACHE_SIZE:
+            _post_cache.popitem(last=False)
+    return post
+
+def get_like_counts(filenames=None):
+    """post -> like count in one grouped query (every post without filenames)"""
+    query = db.session.query(Like.post_filename, db.func.count(Like.id))
+    if filenames is not None:
+        query = query.filter(Like.post_filename.in_(filenames))
+    return dict(query.group_by(Like.post_filename).all())
+
+def get_like_info(filenames=None):
+    """(post -> like count, posts the viewer liked) in one grouped query each
+
+    Without filenames the queries cover every post, so a full listing needs
+    no IN list.
+    """
+    try:
+        like_counts = get_like_counts(filenames)
+        liked = db.session.query(Like.post_filename)
+        if filenames is not None:
+            liked = liked.filter(Like.post_filename.in_(filenames))
+        user_likes = set()
+        if session.get('user_id'):
+            user_likes = {row[0] for row in liked.filter(Like.user_id == session['user_id'])}
+        return like_counts, user_likes
+    except Exception as e:
+        print(f"Error getting like info: {e}")
+        return {}, set()
+
 def get_post(filename):
     """Get a single post by filename"""
     try:
-        filepath = os.path.join(POSTS_DIR, filename)
-        if not os.path.exists(filepath):
-            print(f"Post file {filepath} does not exist")
+        cached = load_post(filename)
+        if cached is None:
+            print(f"Post file {os.path.join(POSTS_DIR, filename)} does not exist")
+            return None
+        
+        # Add like count and user like status
+        post = dict(cached)
+        like_counts, user_likes = get_like_info([filename])
+        post['like_count'] = like_counts.get(filename, 0)
+        post['user_liked'] = filename in user_likes
+        return post
+    except Exception as e:
+        print(f"Error reading post {filename}: {e}")
+        return None
+
+def apply_draft_delta(content, ops):
+    """Apply a list of text replacement ops to draft content.
+
+    Each op is {"start": int, "end": int, "text": str} and replaces the
+    text between start and end with text. Ops are applied in order.
+    Offsets are UTF-16 code units, as JavaScript string indexes are, so
+    they are applied to the UTF-16 encoding rather than to the Python str
+    (which counts an emoji as one character instead of two).
+    """
+    units = content.encode('utf-16-le')
+    for op in ops:
+        start = op.get('start')
+        end = op.get('end', start)
+        text = op.get('text', '')
+        if not isinstance(start, int) or not isinstance(end, int) or not isinstance(text, str):
+            raise ValueError('Invalid delta op')
+        if start < 0 or end < start or end * 2 > len(units):
+            raise ValueError('Delta op out of range')
+        units = units[:start * 2] + text.encode('utf-16-le', 'surrogatepass') + units[end * 2:]
+    try:
+        return units.decode('utf-16-le')
+    except UnicodeDecodeError:
+        raise ValueError('Delta op splits a character')
+
+def get_draft(user_id, draft_key):
+    """Get the user's draft for a post (or for a new post)"""
+    return Draft.query.filter_by(user_id=user_id, draft_key=draft_key).first()
+
+def discard_draft(user_id, draft_key):
+    """Delete the user's draft once its content has been published"""
+    try:
+        Draft.query.filter_by(user_id=user_id, draft_key=draft_key).delete()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error discarding draft {draft_key}: {e}")
+
+def read_post_file(filename):
+    """Get the raw markdown of a post file (including the Author line)"""
+    filepath = os.path.join(POSTS_DIR, filename)
+    if not os.path.exists(filepath):
+        return None
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def encode_revision_delta(old_text, new_text):
+    """Encode new_text as a compressed line diff against old_text"""
+    old_lines = old_text.splitlines(keepends=True)
+    new_lines = new_text.splitlines(keepends=True)
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    ops = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append(['=', i1, i2])
+        elif j2 > j1:
+            # replace/insert; deletes simply don't copy the old lines
+            ops.append(['+', new_lines[j1:j2]])
+    return zlib.compress(json.dumps(ops).encode('utf-8'))
+
+def apply_revision_delta(old_text, data):
+    """Rebuild a revision from the previous revision text and its delta"""
+    old_lines = old_text.splitlines(keepends=True)
+    new_lines = []
+    for op in json.loads(zlib.decompress(data).decode('utf-8')):
+        if op[0] == '=':
+            new_lines.extend(old_lines[op[1]:op[2]])
+        else:
+            new_lines.extend(op[1])
+    return ''.join(new_lines)
+
+def get_revision_content(filename, number):
+    """Rebuild a revision from the nearest snapshot and its delta chain; None if it can't be"""
+    snapshot = PostRevision.query.filter(
+        PostRevision.post_filename == filename,
+        PostRevision.number <= number,
+        PostRevision.is_snapshot.is_(True)
+    ).order_by(PostRevision.number.desc()).first()
+    if not snapshot:
+        return None
+    
+    deltas = PostRevision.query.filter(
+        PostRevision.post_filename == filename,
+        PostRevision.number > snapshot.number,
+        PostRevision.number <= number
+    ).order_by(PostRevision.number).all()
+    # A missing link would silently apply the next delta to the wrong text
+    if [revision.number for revision in deltas] != list(range(snapshot.number + 1, number + 1)):
+        return None
+    try:
+        content = zlib.decompress(snapshot.data).decode('utf-8')
+        for revision in deltas:
+            content = apply_revision_delta(content, revision.data)
+    except (zlib.error, ValueError, TypeError, IndexError):
+        return None
+    return content
+
+def record_revision(filename, full_content, title=None, user_id=None, attempts=5):
+    """Record a new revision of a post, as a snapshot or a delta
+
+    The number is the latest one + 1. If a concurrent save takes the same
+    number first, the insert fails on unique_post_revision and is retried
+    against the new latest revision, so neither save is lost.
+    """
+    for attempt in range(attempts):
+        latest = PostRevision.query.filter_by(post_filename=filename).order_by(
+            PostRevision.number.desc()).first()
+        number = latest.number + 1 if latest else 1
+        
+        if number % REVISION_SNAPSHOT_INTERVAL == 1 or REVISION_SNAPSHOT_INTERVAL == 1:
+            revision = PostRevision(is_snapshot=True,
+                                    data=zlib.compress(full_content.encode('utf-8')))
+        else:
+            previous = get_revision_content(filename, latest.number)
+            revision = PostRevision(is_snapshot=False,
+                                    data=encode_revision_delta(previous, full_content))
+        
+        revision.post_filename = filename
+        revision.number = number
+        revision.title = title
+        revision.user_id = user_id
+        db.session.add(revision)
+        try:
+            db.session.commit()
+            return revision
+        except IntegrityError:
+            db.session.rollback()
+            if attempt == attempts - 1:
+                raise
+
+def record_post_save(filename, full_content, title, previous_content=None):
+    """Record a post save, seeding history with the pre-edit text if needed"""
+    try:
+        if previous_content is not None and not PostRevision.query.filter_by(
+                post_filename=filename).first():
+            record_revision(filename, previous_content)
+        record_revision(filename, full_content, title, session.get('user_id'))
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error recording revision for {filename}: {e}")
+
+def get_author_post_counts():
+    """Get post counts per author, reading only the Author line of each post"""
+    try:
+        mtime = os.path.getmtime(POSTS_DIR)
+    except OSError:
+        return {}
+    
+    # Creating/deleting/renaming posts changes the directory mtime
+    if _author_post_counts['mtime'] == mtime:
+        return _author_post_counts['counts']
+    
+    counts = {}
+    for filename in os.listdir(POSTS_DIR):
+        if not filename.endswith('.md'):
+            continue
+        try:
+            with open(os.path.join(POSTS_DIR, filename), 'r', encoding='utf-8') as f:
+                first_line = f.readline()
+        except Exception as e:
+            print(f"Error reading author of {filename}: {e}")
+            continue
+        if first_line.startswith('Author: '):
+            author = first_line.replace('Author: ', '').strip()
+            counts[author] = counts.get(author, 0) + 1
+    
+    _author_post_counts['mtime'] = mtime
+    _author_post_counts['counts'] = counts
+    return counts
+
+def prefix_filter(column, prefix):
+    """Range filter for a prefix match that can use the column's index"""
+    return db.and_(column >= prefix, column < prefix + '\uffff')
+
+def admin_users_redirect():
+    """Redirect back to the admin users page the action was submitted from"""
+    page = request.args.get('page', 1, type=int)
+    query = request.args.get('q', '').strip()
+    return redirect(url_for('admin_users', page=page if page > 1 else None, q=query or None))
+
+def sweep_orphan_likes(batch_size=LIKE_SWEEP_BATCH_SIZE):
+    """Delete likes whose post file no longer exists, in batches
+
+    Walks the distinct Like.post_filename values in keyset order so each
+    batch is one indexed query plus at most one bulk delete.
+    """
+    deleted = 0
+    last_filename = ''
+    while True:
+        filenames = [row[0] for row in db.session.query(Like.post_filename)
+                     .filter(Like.post_filename > last_filename)
+                     .group_by(Like.post_filename)
+                     .order_by(Like.post_filename)
+                     .limit(batch_size).all()]
+        if not filenames:
+            break
+        
+        # Never treat a missing posts dir as "every post was deleted"
+        if not os.path.isdir(POSTS_DIR):
+            print(f"Stopping like sweep, {POSTS_DIR} is missing")
+            break
+        # Checked per batch, right before the delete, so a post created
+        # while the sweep runs keeps its likes
+        orphans = [f for f in filenames if post_file_missing(f)]
+        if orphans:
+            deleted += Like.query.filter(Like.post_filename.in_(orphans)).delete(
+                synchronize_session=False)
+            db.session.commit()
+        last_filename = filenames[-1]
+    
+    return deleted
+
+def post_file_missing(filename):
+    """True only if the post file is known not to exist (other errors raise)"""
+    try:
+        os.stat(os.path.join(POSTS_DIR, filename))
+    except FileNotFoundError:
+        return True
+    return False
+
+def start_like_sweeper(interval=LIKE_SWEEP_INTERVAL):
+    """Run sweep_orphan_likes() every interval seconds on a daemon thread"""
+    def run():
+        while True:
+            with app.app_context():
+                try:
+                    deleted = sweep_orphan_likes()
+                    if deleted:
+                        print(f"Like sweeper removed {deleted} orphan likes")
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Like sweeper error: {e}")
+            stop.wait(interval)
+    
+    stop = threading.Event()
+    thread = threading.Thread(target=run, name='like-sweeper', daemon=True)
+    thread.start()
+    return stop
+
+@app.before_request
+def ensure_like_sweeper():
+    """Start the like sweeper in each process that serves requests
+
+    Started on the first request rather than at import, so it runs once per
+    serving process under the debug reloader (whose watcher process never
+    serves), flask run --no-reload and every gunicorn worker alike.
+    """
+    if _like_sweeper['pid'] == os.getpid() or not app.config['LIKE_SWEEPER']:
+        return
+    with _like_sweeper_lock:
+        if _like_sweeper['pid'] != os.getpid():
+            _like_sweeper['pid'] = os.getpid()
+            start_like_sweeper()
+
+@app.template_global()
+def post_fragment(name, post):
+    """Render a viewer-independent post card fragment, cached per post version"""
+    key = (name, post['filename'], post.get('version'))
+    with _post_fragments_lock:
+        html = _post_fragments.get(key)
+        if html is not None:
+            _post_fragments.move_to_end(key)
+            return html
+    
+    html = Markup(render_template(f'fragments/{name}.html', post=post))
+    with _post_fragments_lock:
+        _post_fragments[key] = html
+        while len(_post_fragments) > POST_FRAGMENT_CACHE_SIZE:
+            _post_fragments.popitem(last=False)
+    return html
+
+def upload_path(name):
+    """Get the on-disk path of an upload or variant name"""
+    return os.path.join(UPLOADS_DIR, name[:2], name)
+
+def resize_image(source_path, variant, size):
+    """Write one resized variant of an uploaded image; returns its name or None"""
+    digest, ext = os.path.splitext(os.path.basename(source_path))
+    name = f"{digest}-{variant}{ext}"
+    target_path = upload_path(name)
+    if os.path.exists(target_path):
+        return name
+    
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        # Never upscale; smaller images are served as the original
+        if max(image.size) <= size:
             return None
+        image.thumbnail((size, size))
+        if ext in ('.jpg', '.jpeg') and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        tmp_path = f"{target_path}.{threading.get_ident()}.tmp"
+        image.save(tmp_path, format=Image.registered_extensions()[ext], quality=85, optimize=True)
+    os.replace(tmp_path, target_path)
+    return name
+
+def store_upload(file_storage):
+    """Save an uploaded file under its content hash and build its variants
+
+    Returns (name, {variant: name}). Identical uploads share one file.
+    """
+    ext = file_storage.filename.rsplit('.', 1)[-1].lower()
+    os.makedirs(UPLOADS_DIR, exist_ok=True)
+    
+    # Hash while streaming to a temp file so large uploads aren't held in memory
+    sha = hashlib.sha256()
+    tmp_path = os.path.join(UPLOADS_DIR, f".upload-{os.getpid()}-{threading.get_ident()}.tmp")
+    with open(tmp_path, 'wb') as f:
+        for chunk in iter(lambda: file_storage.stream.read(64 * 1024), b''):
+            sha.update(chunk)
+            f.write(chunk)
+    
+    name = f"{sha.hexdigest()}.{ext}"
+    path = upload_path(name)
+    if os.path.exists(path):
+        os.remove(tmp_path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+    
+    variants = {}
+    if Image is not None and ext in RESIZABLE_EXTENSIONS:
+        futures = {variant: image_executor.submit(resize_image, path, variant, size)
+                   for variant, size in IMAGE_VARIANTS.items()}
+        for variant, future in futures.items():
+            try:
+                variant_name = future.result()
+            except Exception as e:
+                print(f"Error resizing {name} to {variant}: {e}")
+                continue
+            if variant_name:
+                variants[variant] = variant_name
+    
+    return name, variants
+
+def build_asset_manifest():
+    """Fingerprint every static file and precompress the text ones
+
+    style.css becomes style.<hash>.css, so its URL changes whenever the
+    content does and browsers can cache each version forever.
+    """
+    ASSET_MANIFEST.clear()
+    _asset_files.clear()
+    static_dir = app.static_folder
+    if not static_dir or not os.path.isdir(static_dir):
+        return
+    
+    for root, _, files in os.walk(static_dir):
+        for filename in files:
+            source = os.path.join(root, filename)
+            path = os.path.relpath(source, static_dir).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                data = f.read()
+            
+            stem, ext = os.path.splitext(path)
+            name = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+            encoded = {}
+            if ext in COMPRESSIBLE_EXTENSIONS:
+                encoded['gzip'] = write_precompressed(name + '.gz', lambda: gzip.compress(data, 9))
+                if brotli is not None:
+                    encoded['br'] = write_precompressed(name + '.br', lambda: brotli.compress(data))
+            
+            ASSET_MANIFEST[path] = name
+            _asset_files[name] = (source, encoded)
+
+def ensure_asset_manifest():
+    """Build the asset manifest once per process, on first use"""
+    if not _asset_manifest_state['built']:
+        with _asset_manifest_lock:
+            if not _asset_manifest_state['built']:
+                build_asset_manifest()
+                _asset_manifest_state['built'] = True
+
+def write_precompressed(name, compress):
+    """Write a compressed asset copy once; the hashed name means it never goes stale"""
+    target = os.path.join(ASSET_CACHE_DIR, name)
+    if not os.path.exists(target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = f"{target}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(compress())
+        os.replace(tmp_path, target)
+    return target
+
+@app.template_global()
+def asset_url(path):
+    """URL of a static file under its fingerprinted name"""
+    ensure_asset_manifest()
+    name = ASSET_MANIFEST.get(path)
+    if name is None:
+        return url_for('static', filename=path)
+    return url_for('asset', name=name)
+
+def preferred_encoding():
+    """Best response encoding the client accepts: 'br', 'gzip' or None"""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+@app.after_request
+def compress_response(response):
+    """Compress rendered HTML/JSON for clients that accept it"""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESS_MIMETYPES):
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    encoding = preferred_encoding()
+    if encoding is None or len(data) < COMPRESS_MIN_SIZE:
+        return response
+    
+    if encoding == 'br':
+        response.set_data(brotli.compress(data, quality=5))
+    else:
+        response.set_data(gzip.compress(data, 6))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def duplicate_user_message(error):
+    """Map a unique constraint violation on User to the form's flash message"""
+    detail = str(error.orig).lower()
+    if 'username' in detail:
+        return 'Username already exists'
+    if 'email' in detail:
+        return 'Email already exists'
+    return 'Username or email already exists'
+
+def build_user(username, email, password, is_admin=False):
+    """Create an unsaved User with a hashed password"""
+    user = User(username=username, email=email, is_admin=is_admin)
+    user.set_password(password)
+    return user
+
+def create_user(username, email, password):
+    """Insert a user in one statement; returns (user, error message)
+
+    The unique indexes on username/email do the duplicate check, which is
+    one round trip and safe when two workers register the same name.
+    """
+    user = build_user(username, email, password)
+    db.session.add(user)
+    try:
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        return None, duplicate_user_message(e)
+    return user, None
+
+def provision_users(rows, batch_size=ARCHIVE_BATCH_SIZE):
+    """Bulk-create users from dicts; returns (created, [(username, error)])
+
+    Each batch is inserted in one transaction. A batch that hits a
+    duplicate is retried row by row so only the offending rows are skipped.
+    """
+    created = 0
+    failures = []
+    
+    def flush(batch):
+        nonlocal created
+        try:
+            db.session.add_all(batch)
+            db.session.commit()
+            created += len(batch)
+            return
+        except IntegrityError:
+            db.session.rollback()
+        for user in batch:
+            db.session.add(user)
+            try:
+                db.session.commit()
+                created += 1
+            except IntegrityError as e:
+                db.session.rollback()
+                failures.append((user.username, duplicate_user_message(e)))
+    
+    batch = []
+    for row in rows:
+        username = (row.get('username') or '').strip()
+        email = (row.get('email') or '').strip()
+        password = (row.get('password') or '').strip()
+        if not username or not email or len(password) < 6:
+            failures.append((username, 'Missing username/email or password shorter than 6 characters'))
+            continue
+        is_admin_flag = (row.get('is_admin') or '').strip().lower() in ('1', 'true', 'yes')
+        batch.append(build_user(username, email, password, is_admin_flag))
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    
+    return created, failures
+
+class LikeEventBroker:
+    """In-process pub/sub for like counts, served as Server-Sent Events
+
+    Runs an asyncio front on a dedicated thread, listening on the app's own
+    port: it answers /events/likes itself, with each subscriber a coroutine
+    holding a small queue, so idle streams cost memory rather than worker
+    threads, and relays every other request to the WSGI server behind it.
+    like_post() publishes from request threads.
+    """
+
+    # Request headers the front replaces before relaying to the WSGI server
+    hop_headers = (b'connection', b'keep-alive', b'proxy-connection', b'x-forwarded-for')
+
+    def __init__(self):
+        self.loop = None
+        self.backend_port = None
+        # post filename -> set of subscriber queues
+        self.subscribers = defaultdict(set)
+        # Initial counts are read off the loop, one query at a time
+        self.reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix='like-counts')
+
+    def start(self, host, port, backend_port):
+        """Start the event loop thread listening on host:port
+
+        Returns the bound port (pass 0 for any free one); raises OSError if
+        the port can't be bound.
+        """
+        self.backend_port = backend_port
+        ready = threading.Event()
+        result = {}
         
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                server = loop.run_until_complete(asyncio.start_server(self.handle, host, port))
+            except OSError as e:
+                result['error'] = e
+                loop.close()
+                ready.set()
+                return
+            result['port'] = server.sockets[0].getsockname()[1]
+            self.loop = loop
+            ready.set()
+            loop.run_forever()
         
-        # Extract author from first line if it starts with "Author: "
-        lines = content.split('\n')
-        author = None
-        if lines and lines[0].startswith('Author: '):
-            author = lines[0].replace('Author: ', '').strip()
-            # Remove author line and get the rest of the content
-            content = '\n'.join(lines[1:]).strip()
+        threading.Thread(target=run, name='like-events', daemon=True).start()
+        ready.wait()
+        if 'error' in result:
+            raise result['error']
+        return result['port']
+
+    @staticmethod
+    def event(filename, likes):
+        return f"event: like\ndata: {json.dumps({'post': filename, 'likes': likes})}\n\n".encode('utf-8')
+
+    def publish(self, filename, likes):
+        """Send a post's new like count to everyone watching it (thread-safe)"""
+        if self.loop is None:
+            return
+        self.loop.call_soon_threadsafe(self._fan_out, filename, self.event(filename, likes))
+
+    def _fan_out(self, filename, event):
+        for queue in self.subscribers.get(filename, ()):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Slow client; the next event carries the absolute count anyway
+                pass
+
+    def read_counts(self, filenames):
+        with app.app_context():
+            return get_like_counts(filenames)
+
+    async def handle(self, reader, writer):
+        """Serve one client connection: a like stream, or a relayed request"""
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), LIKE_EVENTS_HEAD_TIMEOUT)
+            parts = head.split(b'\r\n', 1)[0].decode('latin-1').split()
+            url = urlsplit(parts[1]) if len(parts) == 3 else None
+            if url is not None and parts[0] == 'GET' and url.path == '/events/likes':
+                await self.stream(url.query, reader, writer)
+            else:
+                await self.relay(head, reader, writer)
+        except (ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        except Exception as e:
+            print(f"Like events error: {e}")
+        finally:
+            writer.close()
+
+    async def stream(self, query, reader, writer):
+        """Send the watched posts' counts, then a 'like' event per change"""
+        posts = parse_qs(query).get('posts', [''])[0]
+        filenames = list(dict.fromkeys(f for f in posts.split(',') if f.endswith('.md')))[:LIKE_EVENTS_MAX_POSTS]
+        if not filenames:
+            body = json.dumps({'error': 'No posts to watch'}).encode('utf-8')
+            writer.write(b'HTTP/1.1 400 BAD REQUEST\r\n'
+                         b'Content-Type: application/json\r\n'
+                         + f'Content-Length: {len(body)}\r\n'.encode('latin-1')
+                         + b'Connection: close\r\n\r\n' + body)
+            await writer.drain()
+            return
         
-        # Extract title from first non-empty line (after author)
-        title = None
-        for line in lines[1:]:
-            if line.strip():
-                if line.strip().startswith('# '):
-                    title = line.strip().replace('# ', '')
+        queue = asyncio.Queue(maxsize=LIKE_EVENTS_QUEUE_SIZE)
+        for filename in filenames:
+            self.subscribers[filename].add(queue)
+        # The client sends nothing more, so any read finishing means it left
+        closed = asyncio.ensure_future(reader.read(1))
+        try:
+            writer.write(b'HTTP/1.1 200 OK\r\n'
+                         b'Content-Type: text/event-stream\r\n'
+                         b'Cache-Control: no-cache\r\n'
+                         b'X-Accel-Buffering: no\r\n'
+                         b'Connection: close\r\n\r\n'
+                         b'retry: 5000\n\n')
+            # Subscribed first, so a like made during the read is still queued
+            counts = await asyncio.get_running_loop().run_in_executor(self.reader, self.read_counts, filenames)
+            for filename in filenames:
+                writer.write(self.event(filename, counts.get(filename, 0)))
+            await writer.drain()
+            
+            while True:
+                get = asyncio.ensure_future(queue.get())
+                await asyncio.wait((get, closed), timeout=LIKE_EVENTS_HEARTBEAT,
+                                   return_when=asyncio.FIRST_COMPLETED)
+                if closed.done():
+                    get.cancel()
+                    return
+                if get.done():
+                    event = get.result()
                 else:
-                    title = line.strip()
-                break
+                    get.cancel()
+                    # Comment line keeps proxies from closing the connection
+                    event = b': ping\n\n'
+                writer.write(event)
+                await writer.drain()
+        finally:
+            closed.cancel()
+            for filename in filenames:
+                self.subscribers[filename].discard(queue)
+                if not self.subscribers[filename]:
+                    del self.subscribers[filename]
+
+    async def relay(self, head, reader, writer):
+        """Pass one request to the WSGI server and copy back its response"""
+        try:
+            backend_reader, backend_writer = await asyncio.open_connection('127.0.0.1', self.backend_port)
+        except OSError:
+            writer.write(b'HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+            await writer.drain()
+            return
         
-        if not title:
-            title = filename.replace('.md', '').replace('-', ' ').title()
+        # One request per connection, tagged with the client's address for ProxyFix
+        peer = writer.get_extra_info('peername')
+        lines = head[:-4].split(b'\r\n')
+        headers = [line for line in lines[1:] if line.split(b':', 1)[0].strip().lower() not in self.hop_headers]
+        headers.append(b'Connection: close')
+        if peer:
+            headers.append(f'X-Forwarded-For: {peer[0]}'.encode('latin-1'))
+        backend_writer.write(b'\r\n'.join([lines[0]] + headers) + b'\r\n\r\n')
         
-        # Add like count and user like status
+        upload = asyncio.ensure_future(self.pipe(reader, backend_writer))
         try:
-            like_count = Like.query.filter_by(post_filename=filename).count()
-            user_liked = False
-            if session.get('user_id'):
-                user_liked = Like.query.filter_by(
-                    user_id=session['user_id'], 
-                    post_filename=filename
-                ).first() is not None
-        except Exception as e:
-            print(f"Error getting like info for {filename}: {e}")
-            like_count = 0
-            user_liked = False
-        
-        return {
-            'filename': filename,
-            'title': title,
-            'content': content,
-            'author': author,
-            'like_count': like_count,
-            'user_liked': user_liked,
-            'author_username': author  # Add this for easier access
-        }
-    except Exception as e:
-        print(f"Error reading post {filename}: {e}")
+            await self.pipe(backend_reader, writer)
+        finally:
+            upload.cancel()
+            backend_writer.close()
+
+    @staticmethod
+    async def pipe(reader, writer):
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        except ConnectionError:
+            pass
+
+like_events = LikeEventBroker()
+
+@app.template_global()
+def like_events_url():
+    """URL of the like event stream, or None when the front isn't running"""
+    if like_events.loop is None:
         return None
+    return '/events/likes'
+
+def comment_path_segment(comment_id):
+    """Fixed-width path segment so string order matches id order"""
+    return f"{comment_id:08d}"
+
+def adjust_comment_count(filename, delta):
+    """Add delta to a post's comment count in one upsert (caller commits)"""
+    if not delta:
+        return
+    db.session.execute(db.text(
+        'INSERT INTO comment_count (post_filename, count) VALUES (:filename, :delta) '
+        'ON CONFLICT (post_filename) DO UPDATE SET count = MAX(count + :delta, 0)'
+    ), {'filename': filename, 'delta': delta})
+
+def get_comment_count(filename):
+    """Get a post's visible comment count (one primary key lookup)"""
+    row = db.session.get(CommentCount, filename)
+    return row.count if row else 0
+
+def serialize_comment(comment, username, admin):
+    """JSON-ready comment; hidden bodies are only shown to admins"""
+    return {
+        'id': comment.id,
+        'parent_id': comment.parent_id,
+        'depth': min(comment.depth, COMMENT_MAX_DEPTH),
+        'path': comment.path,
+        'author': username or 'Deleted user',
+        'body': comment.body if admin or not comment.is_hidden else None,
+        'is_hidden': comment.is_hidden,
+        'created_at': comment.created_at.isoformat() if comment.created_at else None
+    }
+
+def tokenize_post(text):
+    """Lowercase word tokens used for TF-IDF"""
+    return [token for token in re.findall(r'[a-z0-9]+', text.lower())
+            if len(token) > 2 and token not in RELATED_STOP_WORDS]
+
+def build_tfidf_matrix(texts):
+    """Row-normalized sparse TF-IDF matrix (posts x terms)"""
+    vocabulary = {}
+    rows, cols, counts = [], [], []
+    for row, text in enumerate(texts):
+        term_counts = {}
+        for token in tokenize_post(text):
+            col = vocabulary.setdefault(token, len(vocabulary))
+            term_counts[col] = term_counts.get(col, 0) + 1
+        rows.extend([row] * len(term_counts))
+        cols.extend(term_counts.keys())
+        counts.extend(term_counts.values())
+    
+    shape = (len(texts), max(len(vocabulary), 1))
+    matrix = sparse.csr_matrix((np.asarray(counts, dtype=np.float64), (rows, cols)), shape=shape)
+    # Sublinear term frequency and smoothed inverse document frequency
+    matrix.data = 1 + np.log(matrix.data)
+    document_frequency = np.bincount(matrix.indices, minlength=shape[1])
+    idf = np.log((1 + shape[0]) / (1 + document_frequency)) + 1
+    matrix = matrix @ sparse.diags(idf)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms) @ matrix
+
+def build_colike_matrix(filenames):
+    """Cosine-normalized co-like counts (posts x posts) from the Like table"""
+    index = {filename: i for i, filename in enumerate(filenames)}
+    pairs = [(user_id, index[filename]) for user_id, filename
+             in db.session.query(Like.user_id, Like.post_filename).all() if filename in index]
+    if not pairs:
+        return sparse.csr_matrix((len(filenames), len(filenames)))
+    
+    user_ids = {user_id: i for i, user_id in enumerate({user_id for user_id, _ in pairs})}
+    likes = sparse.csr_matrix(
+        (np.ones(len(pairs)), ([user_ids[u] for u, _ in pairs], [p for _, p in pairs])),
+        shape=(len(user_ids), len(filenames)))
+    colikes = (likes.T @ likes).tocsr()
+    degree = np.sqrt(colikes.diagonal())
+    degree[degree == 0] = 1
+    return sparse.diags(1 / degree) @ colikes @ sparse.diags(1 / degree)
+
+def compute_related_posts(top_k=RELATED_POSTS_TOP_K, like_weight=RELATED_LIKE_WEIGHT):
+    """Rebuild the RelatedPost table from post text and co-likes
+
+    Similarities are computed a block of rows at a time so memory stays
+    at RELATED_BLOCK_SIZE x posts regardless of how many posts there are.
+    """
+    if np is None or sparse is None:
+        raise RuntimeError('numpy and scipy are required to build related posts')
+    
+    filenames, titles, texts = [], [], []
+    for filename in sorted(os.listdir(POSTS_DIR)):
+        content = read_post_file(filename) if filename.endswith('.md') else None
+        if content is None:
+            continue
+        _, title, body = parse_post_content(filename, content)
+        filenames.append(filename)
+        titles.append(title)
+        texts.append(f"{title}\n{body}")
+    
+    rows = []
+    count = len(filenames)
+    if count > 1:
+        text_matrix = build_tfidf_matrix(texts)
+        colike_matrix = build_colike_matrix(filenames)
+        k = min(top_k, count - 1)
+        for start in range(0, count, RELATED_BLOCK_SIZE):
+            stop = min(start + RELATED_BLOCK_SIZE, count)
+            scores = ((1 - like_weight) * (text_matrix[start:stop] @ text_matrix.T).toarray()
+                      + like_weight * colike_matrix[start:stop].toarray())
+            # A post is never related to itself
+            scores[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+            for offset in range(stop - start):
+                for rank, (j, score) in enumerate(zip(top[offset], top_scores[offset])):
+                    if score > 0:
+                        rows.append({'post_filename': filenames[start + offset], 'rank': rank,
+                                     'related_filename': filenames[j], 'related_title': titles[j],
+                                     'score': float(score)})
+    
+    # Swap the whole table in one transaction so readers never see it half-built
+    RelatedPost.query.delete()
+    for start in range(0, len(rows), ARCHIVE_BATCH_SIZE):
+        db.session.execute(db.insert(RelatedPost), rows[start:start + ARCHIVE_BATCH_SIZE])
+    db.session.commit()
+    return len(rows)
+
+def get_related_posts(filename):
+    """Get a post's precomputed related posts (one primary key range lookup)"""
+    try:
+        return RelatedPost.query.filter_by(post_filename=filename).order_by(RelatedPost.rank).all()
+    except Exception as e:
+        print(f"Error getting related posts for {filename}: {e}")
+        return []
+
+def save_new_post(title, content, username):
+    """Write a new post file and record its first revision; returns the filename"""
+    # Create filename from title
+    filename = sanitize_filename(title)
+    
+    # Add author information at the top of the content
+    full_content = f"Author: {username}\n\n# {title}\n\n{content}"
+    
+    # Save post to file
+    post_path = os.path.join(POSTS_DIR, filename)
+    with open(post_path, 'w', encoding='utf-8') as f:
+        f.write(full_content)
+    record_post_save(filename, full_content, title)
+    return filename
+
+def save_post_edit(filename, title, content, author):
+    """Rewrite a post, renaming it if the title changed; returns the new filename"""
+    # Create new filename if title changed
+    new_filename = sanitize_filename(title)
+    
+    # Add author information at the top of the content
+    full_content = f"Author: {author}\n\n# {title}\n\n{content}"
+    
+    previous_content = read_post_file(filename)
+    
+    # If filename changed, delete old file and create new one
+    if new_filename != filename:
+        old_path = os.path.join(POSTS_DIR, filename)
+        new_path = os.path.join(POSTS_DIR, new_filename)
+        
+        # Never overwrite another post; checked before anything is changed
+        if os.path.exists(new_path):
+            raise ValueError('A post with this title already exists')
+        
+        try:
+            # History left under the new name by a post deleted outside the
+            # app would collide with the moved revision numbers; drop it first
+            for model in (PostRevision, Comment, CommentCount):
+                model.query.filter_by(post_filename=new_filename).delete(synchronize_session=False)
+            
+            # Move the history and comments over to the new filename
+            for model in (PostRevision, Comment, CommentCount):
+                model.query.filter_by(post_filename=filename).update(
+                    {'post_filename': new_filename}, synchronize_session=False)
+            db.session.flush()
+            
+            # Create new file, then commit; a failure before the commit
+            # leaves both the old file and the database as they were
+            with open(new_path, 'w', encoding='utf-8') as f:
+                f.write(full_content)
+            try:
+                db.session.commit()
+            except Exception:
+                os.remove(new_path)
+                raise
+        except Exception:
+            db.session.rollback()
+            raise
+        
+        # Delete old file
+        if os.path.exists(old_path):
+            os.remove(old_path)
+    else:
+        # Update existing file
+        filepath = os.path.join(POSTS_DIR, filename)
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write(full_content)
+    
+    record_post_save(new_filename, full_content, title, previous_content)
+    return new_filename
 
 def is_admin():
     """Check if current user is admin"""
@@ -173,7 +1494,9 @@ def post(filename):
     if post_data:
         # Convert Markdown to HTML
         html_content = markdown.markdown(post_data['content'])
-        return render_template('post.html', post=post_data, html_content=html_content)
+        return render_template('post.html', post=post_data, html_content=html_content,
+                               comment_count=get_comment_count(filename),
+                               related_posts=get_related_posts(filename))
     else:
         flash('Post not found', 'error')
         return redirect(url_for('index'))
@@ -191,29 +1514,23 @@ def create_post():
         
         if not title or not content:
             flash('Title and content are required', 'error')
-            return render_template('create.html')
-        
-        # Create filename from title
-        filename = sanitize_filename(title)
+            return render_template('create.html', draft_key=NEW_DRAFT_KEY,
+                                   debounce_ms=DRAFT_DEBOUNCE_MS, max_wait_ms=DRAFT_MAX_WAIT_MS)
         
         # Get current user
         user = User.query.get(session['user_id'])
         username = user.username if user else 'Unknown'
         
-        # Add author information at the top of the content
-        full_content = f"Author: {username}\n\n# {title}\n\n{content}"
-        
-        # Save post to file
-        post_path = os.path.join(POSTS_DIR, filename)
         try:
-            with open(post_path, 'w', encoding='utf-8') as f:
-                f.write(full_content)
+            filename = save_new_post(title, content, username)
+            discard_draft(session['user_id'], NEW_DRAFT_KEY)
             flash('Post created successfully!', 'success')
             return redirect(url_for('post', filename=filename))
         except Exception as e:
             flash(f'Error creating post: {str(e)}', 'error')
     
-    return render_template('create.html')
+    return render_template('create.html', draft_key=NEW_DRAFT_KEY,
+                           debounce_ms=DRAFT_DEBOUNCE_MS, max_wait_ms=DRAFT_MAX_WAIT_MS)
 
 @app.route('/edit/<filename>', methods=['GET', 'POST'])
 def edit_post(filename):
@@ -233,46 +1550,21 @@ def edit_post(filename):
         
         if not title or not content:
             flash('Title and content are required', 'error')
-            return render_template('edit.html', post=post)
-        
-        # Preserve the original author
-        author = post.get('author', 'Unknown')
-        
-        # Create new filename if title changed
-        new_filename = sanitize_filename(title)
-        
-        # Add author information at the top of the content
-        full_content = f"Author: {author}\n\n# {title}\n\n{content}"
+            return render_template('edit.html', post=post, draft_key=filename,
+                                   debounce_ms=DRAFT_DEBOUNCE_MS, max_wait_ms=DRAFT_MAX_WAIT_MS)
         
         try:
-            # If filename changed, delete old file and create new one
-            if new_filename != filename:
-                old_path = os.path.join(POSTS_DIR, filename)
-                new_path = os.path.join(POSTS_DIR, new_filename)
-                
-                # Delete old file
-                if os.path.exists(old_path):
-                    os.remove(old_path)
-                
-                # Create new file
-                with open(new_path, 'w', encoding='utf-8') as f:
-                    f.write(full_content)
-                
-                flash('Post updated successfully!', 'success')
-                return redirect(url_for('post', filename=new_filename))
-            else:
-                # Update existing file
-                filepath = os.path.join(POSTS_DIR, filename)
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    f.write(full_content)
-                
-                flash('Post updated successfully!', 'success')
-                return redirect(url_for('post', filename=filename))
-                
+            # Preserve the original author
+            new_filename = save_post_edit(filename, title, content, post.get('author') or 'Unknown')
+            discard_draft(session['user_id'], filename)
+            
+            flash('Post updated successfully!', 'success')
+            return redirect(url_for('post', filename=new_filename))
         except Exception as e:
             flash(f'Error updating post: {str(e)}', 'error')
     
-    return render_template('edit.html', post=post)
+    return render_template('edit.html', post=post, draft_key=filename,
+                           debounce_ms=DRAFT_DEBOUNCE_MS, max_wait_ms=DRAFT_MAX_WAIT_MS)
 
 @app.route('/delete/<filename>', methods=['POST'])
 def delete_post(filename):
@@ -299,10 +1591,11 @@ def delete_post(filename):
     if os.path.exists(filepath):
         os.remove(filepath)
         
-        # Delete associated likes
-        likes = Like.query.filter_by(post_filename=filename).all()
-        for like in likes:
-            db.session.delete(like)
+        # Delete associated likes in one statement
+        Like.query.filter_by(post_filename=filename).delete(synchronize_session=False)
+        PostRevision.query.filter_by(post_filename=filename).delete()
+        Comment.query.filter_by(post_filename=filename).delete(synchronize_session=False)
+        CommentCount.query.filter_by(post_filename=filename).delete()
         db.session.commit()
         
         if user.is_admin:
@@ -314,6 +1607,197 @@ def delete_post(filename):
     
     return redirect(url_for('index'))
 
+@app.route('/post/<filename>/revisions')
+def post_revisions(filename):
+    """List the revision history of a post - admin only"""
+    if not is_admin():
+        flash('Only administrators can view post history', 'error')
+        return redirect(url_for('index'))
+    
+    post = get_post(filename)
+    if not post:
+        flash('Post not found', 'error')
+        return redirect(url_for('index'))
+    
+    # Metadata only; revision bodies are rebuilt on demand
+    revisions = db.session.query(
+        PostRevision.number, PostRevision.is_snapshot, PostRevision.title,
+        PostRevision.created_at, User.username,
+        db.func.length(PostRevision.data).label('size')
+    ).outerjoin(User, User.id == PostRevision.user_id).filter(
+        PostRevision.post_filename == filename
+    ).order_by(PostRevision.number.desc()).all()
+    
+    return render_template('revisions.html', post=post, revisions=revisions)
+
+@app.route('/post/<filename>/revisions/<int:number>')
+def view_revision(filename, number):
+    """Show a revision and its diff against the previous one - admin only"""
+    if not is_admin():
+        flash('Only administrators can view post history', 'error')
+        return redirect(url_for('index'))
+    
+    revision = PostRevision.query.filter_by(post_filename=filename, number=number).first()
+    if not revision:
+        flash('Revision not found', 'error')
+        return redirect(url_for('post_revisions', filename=filename))
+    
+    content = get_revision_content(filename, number)
+    if content is None:
+        flash('Revision could not be rebuilt from its history', 'error')
+        return redirect(url_for('post_revisions', filename=filename))
+    previous = get_revision_content(filename, number - 1) if number > 1 else ''
+    diff = list(difflib.unified_diff(
+        (previous or '').splitlines(), content.splitlines(),
+        fromfile=f'revision {number - 1}', tofile=f'revision {number}', lineterm=''
+    ))
+    
+    return render_template('revision.html', filename=filename, revision=revision,
+                           content=content, diff=diff)
+
+@app.route('/post/<filename>/revisions/<int:number>/restore', methods=['POST'])
+def restore_revision(filename, number):
+    """Restore a post to an earlier revision - admin only"""
+    if not is_admin():
+        flash('Only administrators can restore posts', 'error')
+        return redirect(url_for('index'))
+    
+    filepath = os.path.join(POSTS_DIR, filename)
+    if not os.path.exists(filepath):
+        flash('Post not found', 'error')
+        return redirect(url_for('index'))
+    
+    content = get_revision_content(filename, number)
+    if content is None:
+        flash('Revision not found', 'error')
+        return redirect(url_for('post_revisions', filename=filename))
+    
+    try:
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write(content)
+        # Restoring is itself a new revision, so it can be undone too
+        revision = PostRevision.query.filter_by(post_filename=filename, number=number).first()
+        record_post_save(filename, content, revision.title if revision else None)
+        flash(f'Post restored to revision {number}', 'success')
+    except Exception as e:
+        flash(f'Error restoring post: {str(e)}', 'error')
+    
+    return redirect(url_for('post', filename=filename))
+
+@app.route('/post/<filename>/comments')
+def post_comments(filename):
+    """Page through a post's comments in thread order
+
+    Keyset pagination on (post_filename, path): ?after=<path of last comment>.
+    Authors come from the same query, so a page is a single indexed scan.
+    """
+    after = request.args.get('after', '')
+    limit = min(request.args.get('limit', COMMENTS_PER_PAGE, type=int), COMMENTS_PER_PAGE)
+    admin = is_admin()
+    
+    rows = db.session.query(Comment, User.username).outerjoin(
+        User, User.id == Comment.user_id
+    ).filter(
+        Comment.post_filename == filename,
+        Comment.path > after
+    ).order_by(Comment.path).limit(limit + 1).all()
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return jsonify({
+        'comments': [serialize_comment(comment, username, admin) for comment, username in rows],
+        'next': rows[-1][0].path if has_more else None,
+        'count': get_comment_count(filename)
+    })
+
+@app.route('/post/<filename>/comments', methods=['POST'])
+@rate_limit('comment')
+def add_comment(filename):
+    """Add a comment or reply to a post"""
+    if not session.get('user_id'):
+        return jsonify({'error': 'Please log in to comment'}), 401
+    
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    body = data.get('body') or ''
+    parent_id = data.get('parent_id')
+    if not isinstance(body, str):
+        return jsonify({'error': 'Invalid comment body'}), 400
+    if parent_id is not None and (not isinstance(parent_id, int) or isinstance(parent_id, bool)):
+        return jsonify({'error': 'Invalid parent comment'}), 400
+    body = body.strip()
+    if not body:
+        return jsonify({'error': 'Comment cannot be empty'}), 400
+    if len(body) > COMMENT_MAX_LENGTH:
+        return jsonify({'error': f'Comments are limited to {COMMENT_MAX_LENGTH} characters'}), 400
+    
+    if not os.path.exists(os.path.join(POSTS_DIR, filename)):
+        return jsonify({'error': 'Post not found'}), 404
+    
+    parent = None
+    if parent_id:
+        parent = db.session.get(Comment, parent_id)
+        if not parent or parent.post_filename != filename:
+            return jsonify({'error': 'Parent comment not found'}), 404
+    
+    try:
+        comment = Comment(post_filename=filename, user_id=session['user_id'], body=body,
+                          parent_id=parent.id if parent else None,
+                          depth=parent.depth + 1 if parent else 0)
+        db.session.add(comment)
+        db.session.flush()  # assigns the id the path is built from
+        segment = comment_path_segment(comment.id)
+        comment.path = f"{parent.path}.{segment}" if parent else segment
+        adjust_comment_count(filename, 1)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Comment error for {filename}: {str(e)}")
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+    
+    return jsonify({'comment': serialize_comment(comment, session.get('username'), is_admin()),
+                    'count': get_comment_count(filename)}), 201
+
+@app.route('/comments/<int:comment_id>/hide', methods=['POST'])
+def toggle_comment_hidden(comment_id):
+    """Hide or unhide a comment (admin only); replies stay visible"""
+    if not is_admin():
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    comment = db.session.get(Comment, comment_id)
+    if not comment:
+        return jsonify({'error': 'Comment not found'}), 404
+    
+    comment.is_hidden = not comment.is_hidden
+    adjust_comment_count(comment.post_filename, -1 if comment.is_hidden else 1)
+    db.session.commit()
+    return jsonify({'is_hidden': comment.is_hidden, 'count': get_comment_count(comment.post_filename)})
+
+@app.route('/comments/<int:comment_id>/delete', methods=['POST'])
+def delete_comment(comment_id):
+    """Delete a comment and all of its replies (admin only)"""
+    if not is_admin():
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    comment = db.session.get(Comment, comment_id)
+    if not comment:
+        return jsonify({'error': 'Comment not found'}), 404
+    
+    filename = comment.post_filename
+    # The subtree is the comment's path plus everything under "path."
+    subtree = Comment.query.filter(
+        Comment.post_filename == filename,
+        db.or_(Comment.path == comment.path, Comment.path.startswith(comment.path + '.'))
+    )
+    deleted = subtree.count()
+    visible = subtree.filter(Comment.is_hidden.is_(False)).count()
+    # Replies may also go through the parent_id cascade, so count them up front
+    subtree.delete(synchronize_session=False)
+    adjust_comment_count(filename, -visible)
+    db.session.commit()
+    return jsonify({'deleted': deleted, 'count': get_comment_count(filename)})
+
 @app.route('/search')
 def search():
     """Search posts by title"""
@@ -331,6 +1815,7 @@ def search():
     return render_template('search.html', posts=posts, query=query)
 
 @app.route('/register', methods=['GET', 'POST'])
+@rate_limit('register', template='register.html')
 def register():
     """User registration"""
     if session.get('user_id'):
@@ -355,28 +1840,19 @@ def register():
             flash('Password must be at least 6 characters long', 'error')
             return render_template('register.html')
         
-        # Check if username or email already exists
-        if User.query.filter_by(username=username).first():
-            flash('Username already exists', 'error')
-            return render_template('register.html')
-        
-        if User.query.filter_by(email=email).first():
-            flash('Email already exists', 'error')
+        # Create new user; duplicates are rejected by the unique indexes
+        user, error = create_user(username, email, password)
+        if error:
+            flash(error, 'error')
             return render_template('register.html')
         
-        # Create new user
-        user = User(username=username, email=email)
-        user.set_password(password)
-        
-        db.session.add(user)
-        db.session.commit()
-        
         flash('Registration successful! Please log in.', 'success')
         return redirect(url_for('login'))
     
     return render_template('register.html')
 
 @app.route('/login', methods=['GET', 'POST'])
+@rate_limit('login', template='login.html')
 def login():
     """User login"""
     if session.get('user_id'):
@@ -466,8 +1942,43 @@ def admin_users():
         flash('Access denied. Admin privileges required.', 'error')
         return redirect(url_for('index'))
     
-    users = User.query.all()
-    return render_template('admin_users.html', users=users)
+    page = request.args.get('page', 1, type=int)
+    query = request.args.get('q', '').strip()
+    
+    # Prefix search on the unique (indexed) username and email columns
+    users_query = db.select(User).order_by(User.id)
+    if query:
+        users_query = users_query.where(db.or_(
+            prefix_filter(User.username, query),
+            prefix_filter(User.email, query)
+        ))
+    pagination = db.paginate(users_query, page=page, per_page=ADMIN_USERS_PER_PAGE,
+                             error_out=False)
+    users = pagination.items
+    
+    # Like counts for the users on this page in one grouped query
+    user_ids = [user.id for user in users]
+    like_counts = {}
+    if user_ids:
+        like_counts = dict(db.session.query(Like.user_id, db.func.count(Like.id))
+                           .filter(Like.user_id.in_(user_ids))
+                           .group_by(Like.user_id).all())
+    post_counts = get_author_post_counts()
+    
+    # Totals for the whole table, not just this page
+    total_users, total_admins = db.session.query(
+        db.func.count(User.id),
+        db.func.coalesce(db.func.sum(db.case((User.is_admin.is_(True), 1), else_=0)), 0)
+    ).one()
+    
+    stats = {
+        'total_users': total_users,
+        'total_admins': total_admins,
+        'total_regular': total_users - total_admins
+    }
+    return render_template('admin_users.html', users=users, pagination=pagination,
+                           query=query, stats=stats, like_counts=like_counts,
+                           post_counts=post_counts)
 
 @app.route('/admin/user/<int:user_id>/toggle-admin', methods=['POST'])
 def toggle_admin_status(user_id):
@@ -481,14 +1992,14 @@ def toggle_admin_status(user_id):
     # Prevent admin from removing their own admin status
     if user.id == session['user_id']:
         flash('You cannot modify your own admin status', 'error')
-        return redirect(url_for('admin_users'))
+        return admin_users_redirect()
     
     user.is_admin = not user.is_admin
     db.session.commit()
     
     status = 'granted' if user.is_admin else 'revoked'
     flash(f'Admin privileges {status} for user {user.username}', 'success')
-    return redirect(url_for('admin_users'))
+    return admin_users_redirect()
 
 @app.route('/admin/user/<int:user_id>/delete', methods=['POST'])
 def delete_user(user_id):
@@ -502,16 +2013,25 @@ def delete_user(user_id):
     # Prevent admin from deleting themselves
     if user.id == session['user_id']:
         flash('You cannot delete your own account', 'error')
-        return redirect(url_for('admin_users'))
+        return admin_users_redirect()
     
     username = user.username
+    # Explicit bulk cleanup as well, since tables created before the
+    # ON DELETE clauses were added don't cascade
+    Like.query.filter_by(user_id=user.id).delete(synchronize_session=False)
+    Draft.query.filter_by(user_id=user.id).delete(synchronize_session=False)
+    PostRevision.query.filter_by(user_id=user.id).update(
+        {'user_id': None}, synchronize_session=False)
+    Comment.query.filter_by(user_id=user.id).update(
+        {'user_id': None}, synchronize_session=False)
     db.session.delete(user)
     db.session.commit()
     
     flash(f'User {username} has been deleted', 'success')
-    return redirect(url_for('admin_users'))
+    return admin_users_redirect()
 
 @app.route('/like/<filename>', methods=['POST'])
+@rate_limit('like')
 def like_post(filename):
     """Like a post"""
     if not session.get('user_id'):
@@ -537,7 +2057,9 @@ def like_post(filename):
             # Unlike the post
             db.session.delete(existing_like)
             db.session.commit()
-            return jsonify({'liked': False, 'message': 'Post unliked'})
+            like_count = Like.query.filter_by(post_filename=filename).count()
+            like_events.publish(filename, like_count)
+            return jsonify({'liked': False, 'likes': like_count, 'message': 'Post unliked'})
         else:
             # Like the post
             new_like = Like(
@@ -546,7 +2068,9 @@ def like_post(filename):
             )
             db.session.add(new_like)
             db.session.commit()
-            return jsonify({'liked': True, 'message': 'Post liked'})
+            like_count = Like.query.filter_by(post_filename=filename).count()
+            like_events.publish(filename, like_count)
+            return jsonify({'liked': True, 'likes': like_count, 'message': 'Post liked'})
             
     except Exception as e:
         db.session.rollback()
@@ -569,6 +2093,363 @@ def get_post_likes(filename):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/upload', methods=['POST'])
+@rate_limit('upload')
+def upload_file():
+    """Upload an image or attachment for use in posts"""
+    if not session.get('user_id'):
+        return jsonify({'error': 'Please log in to upload files'}), 401
+    
+    file = request.files.get('file')
+    if not file or not file.filename:
+        return jsonify({'error': 'No file uploaded'}), 400
+    
+    ext = file.filename.rsplit('.', 1)[-1].lower() if '.' in file.filename else ''
+    if ext not in UPLOAD_EXTENSIONS:
+        return jsonify({'error': 'Unsupported file type'}), 400
+    
+    try:
+        name, variants = store_upload(file)
+    except Exception as e:
+        print(f"Upload error for {file.filename}: {str(e)}")
+        return jsonify({'error': f'Upload failed: {str(e)}'}), 500
+    
+    return jsonify({
+        'url': url_for('uploaded_file', name=name),
+        'variants': {variant: url_for('uploaded_file', name=variant_name)
+                     for variant, variant_name in variants.items()},
+        'is_image': ext != 'pdf'
+    })
+
+@app.route('/uploads/<name>')
+def uploaded_file(name):
+    """Serve an upload; names are content hashes so responses never change"""
+    if not UPLOAD_NAME_RE.match(name):
+        return jsonify({'error': 'File not found'}), 404
+    
+    path = upload_path(name)
+    if not os.path.exists(path):
+        return jsonify({'error': 'File not found'}), 404
+    
+    # conditional=True streams the file and handles Range/If-None-Match requests
+    response = send_file(os.path.abspath(path), conditional=True, etag=name,
+                         max_age=UPLOAD_CACHE_SECONDS)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@app.route('/assets/<path:name>')
+def asset(name):
+    """Serve a fingerprinted static file, precompressed when possible"""
+    ensure_asset_manifest()
+    entry = _asset_files.get(name)
+    if entry is None:
+        return jsonify({'error': 'File not found'}), 404
+    
+    source, encoded = entry
+    encoding = preferred_encoding()
+    path = encoded.get(encoding, source) if encoding else source
+    
+    response = send_file(path, mimetype=mimetypes.guess_type(source)[0],
+                         conditional=True, max_age=ASSET_CACHE_SECONDS)
+    if path != source:
+        response.headers['Content-Encoding'] = encoding
+    if encoded:
+        response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+def list_post_entries():
+    """(ctime_ns, filename, stat) for every post, newest first, without reading files"""
+    entries = []
+    if not os.path.exists(POSTS_DIR):
+        return entries
+    with os.scandir(POSTS_DIR) as it:
+        for entry in it:
+            if entry.name.endswith('.md') and entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_ctime_ns, entry.name, stat))
+    # Same order as get_posts(), with the filename as a stable tie-breaker
+    entries.sort(key=lambda e: (-e[0], e[1]))
+    return entries
+
+def encode_api_cursor(ctime_ns, filename):
+    """Opaque cursor pointing just past a post in list order"""
+    return base64.urlsafe_b64encode(f"{ctime_ns}:{filename}".encode('utf-8')).decode('ascii')
+
+def decode_api_cursor(cursor):
+    """Decode a cursor into (ctime_ns, filename); raises ValueError if malformed"""
+    ctime_ns, _, filename = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').partition(':')
+    return int(ctime_ns), filename
+
+def parse_api_fields(default):
+    """Requested sparse fieldset; returns (fields, error message)"""
+    requested = request.args.get('fields')
+    if not requested:
+        return default, None
+    fields = tuple(f.strip() for f in requested.split(',') if f.strip())
+    unknown = [f for f in fields if f not in API_POST_FIELDS]
+    if unknown:
+        return None, f"Unknown fields: {', '.join(unknown)}"
+    return fields, None
+
+def get_api_counts(filenames, fields):
+    """Like/comment counts for a page of posts, one grouped query each"""
+    like_counts, comment_counts = {}, {}
+    if filenames and 'like_count' in fields:
+        like_counts = dict(db.session.query(Like.post_filename, db.func.count(Like.id))
+                           .filter(Like.post_filename.in_(filenames))
+                           .group_by(Like.post_filename).all())
+    if filenames and 'comment_count' in fields:
+        comment_counts = dict(db.session.query(CommentCount.post_filename, CommentCount.count)
+                              .filter(CommentCount.post_filename.in_(filenames)).all())
+    return like_counts, comment_counts
+
+def serialize_api_post(filename, stat, fields, like_counts, comment_counts):
+    """Build the requested fields of a post; the file is only read if needed"""
+    data = {}
+    if {'title', 'author', 'content', 'html'} & set(fields):
+        author, title, content = parse_post_content(filename, read_post_file(filename) or '')
+    for field in fields:
+        if field == 'slug':
+            data['slug'] = filename[:-3]
+        elif field == 'title':
+            data['title'] = title
+        elif field == 'author':
+            data['author'] = author
+        elif field == 'content':
+            data['content'] = content
+        elif field == 'html':
+            data['html'] = markdown.markdown(content)
+        elif field == 'like_count':
+            data['like_count'] = like_counts.get(filename, 0)
+        elif field == 'comment_count':
+            data['comment_count'] = comment_counts.get(filename, 0)
+        elif field == 'version':
+            data['version'] = f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+        elif field == 'created_at':
+            data['created_at'] = datetime.fromtimestamp(stat.st_ctime).isoformat()
+        elif field == 'url':
+            data['url'] = url_for('post', filename=filename)
+    return data
+
+def api_json(payload, status=200, etag=None):
+    """Compact JSON response; compressed by compress_response() like HTML
+
+    The ETag is weak: the same JSON is sent gzip-, brotli- or un-encoded
+    depending on Accept-Encoding, and a strong validator would have to
+    differ between those bodies.
+    """
+    response = app.response_class(json.dumps(payload, separators=(',', ':'), ensure_ascii=False),
+                                  status=status, mimetype='application/json')
+    if etag:
+        response.set_etag(etag, weak=True)
+        response.cache_control.no_cache = True
+    return response
+
+def api_etag(*parts):
+    """ETag over everything a response depends on, computed before building it"""
+    return hashlib.sha1(json.dumps(parts, default=str).encode('utf-8')).hexdigest()
+
+def not_modified(etag):
+    """304 for clients that already have this version"""
+    response = app.response_class(status=304)
+    response.set_etag(etag, weak=True)
+    response.vary.add('Accept-Encoding')
+    return response
+
+@app.route('/api/posts')
+def api_list_posts():
+    """List posts newest first: ?fields=a,b&limit=N&cursor=..."""
+    fields, error = parse_api_fields(API_LIST_FIELDS)
+    if error:
+        return api_json({'error': error}, 400)
+    limit = max(1, min(request.args.get('limit', API_PAGE_SIZE, type=int), API_MAX_PAGE_SIZE))
+    
+    entries = list_post_entries()
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            position = decode_api_cursor(cursor)
+        except (ValueError, UnicodeDecodeError):
+            return api_json({'error': 'Invalid cursor'}, 400)
+        entries = [e for e in entries if (-e[0], e[1]) > (-position[0], position[1])]
+    
+    page = entries[:limit]
+    filenames = [filename for _, filename, _ in page]
+    like_counts, comment_counts = get_api_counts(filenames, fields)
+    next_cursor = encode_api_cursor(page[-1][0], page[-1][1]) if len(entries) > limit else None
+    
+    # File versions and counts identify the page, so a match skips all file reads
+    etag = api_etag(fields, next_cursor, like_counts, comment_counts,
+                    [(filename, stat.st_mtime_ns, stat.st_size) for _, filename, stat in page])
+    if request.if_none_match.contains_weak(etag):
+        return not_modified(etag)
+    
+    posts = [serialize_api_post(filename, stat, fields, like_counts, comment_counts)
+             for _, filename, stat in page]
+    return api_json({'posts': posts, 'next_cursor': next_cursor}, etag=etag)
+
+@app.route('/api/posts/<slug>')
+def api_get_post(slug):
+    """Get one post: ?fields=a,b"""
+    fields, error = parse_api_fields(API_DETAIL_FIELDS)
+    if error:
+        return api_json({'error': error}, 400)
+    
+    filename = f"{slug}.md"
+    filepath = os.path.join(POSTS_DIR, filename)
+    if os.path.basename(filename) != filename or not os.path.isfile(filepath):
+        return api_json({'error': 'Post not found'}, 404)
+    
+    stat = os.stat(filepath)
+    like_counts, comment_counts = get_api_counts([filename], fields)
+    etag = api_etag(fields, filename, stat.st_mtime_ns, stat.st_size, like_counts, comment_counts)
+    if request.if_none_match.contains_weak(etag):
+        return not_modified(etag)
+    
+    return api_json(serialize_api_post(filename, stat, fields, like_counts, comment_counts), etag=etag)
+
+def is_api_post_body(data):
+    """Whether a JSON body is an object whose title/content, if given, are strings"""
+    return isinstance(data, dict) and all(
+        data.get(key) is None or isinstance(data[key], str) for key in ('title', 'content'))
+
+@app.route('/api/posts', methods=['POST'])
+def api_create_post():
+    """Create a post from {"title", "content"}"""
+    if not session.get('user_id'):
+        return api_json({'error': 'Please log in to create posts'}, 401)
+    
+    data = request.get_json(silent=True)
+    if not is_api_post_body(data):
+        return api_json({'error': 'Expected a JSON object with string title and content'}, 400)
+    title = (data.get('title') or '').strip()
+    content = (data.get('content') or '').strip()
+    if not title or not content:
+        return api_json({'error': 'Title and content are required'}, 400)
+    if os.path.exists(os.path.join(POSTS_DIR, sanitize_filename(title))):
+        return api_json({'error': 'A post with this title already exists'}, 409)
+    
+    try:
+        filename = save_new_post(title, content, session.get('username') or 'Unknown')
+    except Exception as e:
+        return api_json({'error': f'Error creating post: {str(e)}'}, 500)
+    
+    stat = os.stat(os.path.join(POSTS_DIR, filename))
+    response = api_json(serialize_api_post(filename, stat, API_DETAIL_FIELDS, {}, {}), 201)
+    response.headers['Location'] = url_for('api_get_post', slug=filename[:-3])
+    return response
+
+@app.route('/api/posts/<slug>', methods=['PATCH'])
+def api_update_post(slug):
+    """Update a post's title and/or content - admin only"""
+    if not is_admin():
+        return api_json({'error': 'Only administrators can edit posts'}, 403)
+    
+    filename = f"{slug}.md"
+    raw = read_post_file(filename) if os.path.basename(filename) == filename else None
+    if raw is None:
+        return api_json({'error': 'Post not found'}, 404)
+    
+    author, title, content = parse_post_content(filename, raw)
+    # Drop the "# Title" heading that save_post_edit() writes back
+    content = re.sub(r'^# .*\n*', '', content, count=1)
+    data = request.get_json(silent=True)
+    if not is_api_post_body(data):
+        return api_json({'error': 'Expected a JSON object with string title and content'}, 400)
+    title = (data.get('title') or title).strip()
+    content = (data.get('content') or content).strip()
+    new_filename = sanitize_filename(title)
+    if new_filename != filename and os.path.exists(os.path.join(POSTS_DIR, new_filename)):
+        return api_json({'error': 'A post with this title already exists'}, 409)
+    
+    try:
+        new_filename = save_post_edit(filename, title, content, author or 'Unknown')
+    except Exception as e:
+        return api_json({'error': f'Error updating post: {str(e)}'}, 500)
+    
+    stat = os.stat(os.path.join(POSTS_DIR, new_filename))
+    like_counts, comment_counts = get_api_counts([new_filename], API_DETAIL_FIELDS)
+    return api_json(serialize_api_post(new_filename, stat, API_DETAIL_FIELDS, like_counts, comment_counts))
+
+@app.route('/drafts/<draft_key>')
+def load_draft(draft_key):
+    """Get the current user's autosaved draft"""
+    if not session.get('user_id'):
+        return jsonify({'error': 'Please log in to load drafts'}), 401
+    
+    draft = get_draft(session['user_id'], draft_key)
+    if not draft:
+        return jsonify({'exists': False, 'version': 0, 'title': '', 'content': ''})
+    
+    return jsonify({
+        'exists': True,
+        'version': draft.version,
+        'title': draft.title or '',
+        'content': draft.content or '',
+        'updated_at': draft.updated_at.isoformat() if draft.updated_at else None
+    })
+
+@app.route('/drafts/<draft_key>/autosave', methods=['POST'])
+def autosave_draft(draft_key):
+    """Autosave a draft from incremental text deltas
+
+    The client debounces keystrokes and sends {"base_version", "ops", "title"}
+    where ops are replacements against the draft at base_version. If the
+    versions don't match the client gets a 409 and resends {"content": ...}.
+    """
+    if not session.get('user_id'):
+        return jsonify({'error': 'Please log in to save drafts'}), 401
+    
+    if draft_key != NEW_DRAFT_KEY and not draft_key.endswith('.md'):
+        return jsonify({'error': 'Invalid draft key'}), 400
+    
+    data = request.get_json(silent=True) or {}
+    
+    try:
+        draft = get_draft(session['user_id'], draft_key)
+        if not draft:
+            draft = Draft(user_id=session['user_id'], draft_key=draft_key,
+                          title='', content='', version=0)
+            db.session.add(draft)
+        
+        if 'content' in data:
+            # Full resync after a conflict or on first save
+            if not isinstance(data['content'], str):
+                return jsonify({'error': 'Invalid content'}), 400
+            draft.content = data['content']
+        else:
+            if data.get('base_version') != draft.version:
+                db.session.rollback()
+                return jsonify({'error': 'Draft version conflict', 'version': draft.version}), 409
+            try:
+                draft.content = apply_draft_delta(draft.content or '', data.get('ops') or [])
+            except ValueError as e:
+                db.session.rollback()
+                return jsonify({'error': str(e), 'version': draft.version}), 409
+        
+        if isinstance(data.get('title'), str):
+            draft.title = data['title']
+        
+        draft.version += 1
+        db.session.commit()
+        return jsonify({'saved': True, 'version': draft.version})
+    except Exception as e:
+        db.session.rollback()
+        print(f"Autosave error for {draft_key}: {str(e)}")
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+
+@app.route('/drafts/<draft_key>', methods=['DELETE'])
+def delete_draft(draft_key):
+    """Discard the current user's draft"""
+    if not session.get('user_id'):
+        return jsonify({'error': 'Please log in to discard drafts'}), 401
+    
+    discard_draft(session['user_id'], draft_key)
+    return jsonify({'deleted': True})
+
 @app.route('/debug/db')
 def debug_db():
     """Debug database status"""
@@ -605,61 +2486,437 @@ def debug_db():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def run_sql(*statements):
+    """Migration step that executes fixed SQL statements in order"""
+    def step(conn):
+        for statement in statements:
+            conn.exec_driver_sql(statement)
+    return step
+
+def rebuild_table(conn, table, create_sql, copy_sql, indexes=()):
+    """Recreate a SQLite table to change its constraints
+
+    SQLite can't ALTER constraints, so create_sql makes "<table>_new",
+    copy_sql fills it from the old table, and it then takes the old name.
+    """
+    conn.exec_driver_sql(f'DROP TABLE IF EXISTS "{table}_new"')
+    conn.exec_driver_sql(create_sql)
+    conn.exec_driver_sql(copy_sql)
+    conn.exec_driver_sql(f'DROP TABLE "{table}"')
+    conn.exec_driver_sql(f'ALTER TABLE "{table}_new" RENAME TO "{table}"')
+    for statement in indexes:
+        conn.exec_driver_sql(statement)
+
+def fk_on_delete(conn, table, column):
+    """ON DELETE action of a column's foreign key, or None without one"""
+    for row in conn.exec_driver_sql(f'PRAGMA foreign_key_list("{table}")'):
+        if row[3] == column:
+            return row[6]
+    return None
+
+def add_user_delete_actions(conn):
+    """Rebuild like/draft/post_revision tables created before their ON DELETE actions
+
+    Rows pointing at users deleted back then are dropped (likes, drafts) or
+    unlinked (revisions), as the actions would have done.
+    """
+    if fk_on_delete(conn, 'like', 'user_id') != 'CASCADE':
+        rebuild_table(conn, 'like', """
+            CREATE TABLE "like_new" (
+                id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                post_filename VARCHAR(255) NOT NULL,
+                created_at DATETIME,
+                PRIMARY KEY (id),
+                CONSTRAINT unique_user_post_like UNIQUE (user_id, post_filename),
+                FOREIGN KEY(user_id) REFERENCES user (id) ON DELETE CASCADE
+            )""", """
+            INSERT INTO "like_new" (id, user_id, post_filename, created_at)
+            SELECT id, user_id, post_filename, created_at FROM "like"
+            WHERE user_id IN (SELECT id FROM user)""",
+            ['CREATE INDEX ix_like_post_filename ON "like" (post_filename)'])
+    
+    if fk_on_delete(conn, 'draft', 'user_id') != 'CASCADE':
+        rebuild_table(conn, 'draft', """
+            CREATE TABLE "draft_new" (
+                id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                draft_key VARCHAR(255) NOT NULL,
+                title VARCHAR(255),
+                content TEXT,
+                version INTEGER NOT NULL,
+                updated_at DATETIME,
+                PRIMARY KEY (id),
+                CONSTRAINT unique_user_draft UNIQUE (user_id, draft_key),
+                FOREIGN KEY(user_id) REFERENCES user (id) ON DELETE CASCADE
+            )""", """
+            INSERT INTO "draft_new" (id, user_id, draft_key, title, content, version, updated_at)
+            SELECT id, user_id, draft_key, title, content, version, updated_at FROM draft
+            WHERE user_id IN (SELECT id FROM user)""")
+    
+    if fk_on_delete(conn, 'post_revision', 'user_id') != 'SET NULL':
+        rebuild_table(conn, 'post_revision', """
+            CREATE TABLE "post_revision_new" (
+                id INTEGER NOT NULL,
+                post_filename VARCHAR(255) NOT NULL,
+                number INTEGER NOT NULL,
+                is_snapshot BOOLEAN NOT NULL,
+                data BLOB NOT NULL,
+                title VARCHAR(255),
+                user_id INTEGER,
+                created_at DATETIME,
+                PRIMARY KEY (id),
+                CONSTRAINT unique_post_revision UNIQUE (post_filename, number),
+                FOREIGN KEY(user_id) REFERENCES user (id) ON DELETE SET NULL
+            )""", """
+            INSERT INTO "post_revision_new" (id, post_filename, number, is_snapshot, data, title, user_id, created_at)
+            SELECT id, post_filename, number, is_snapshot, data, title,
+                   CASE WHEN user_id IN (SELECT id FROM user) THEN user_id END, created_at
+            FROM post_revision""")
+
+# Schema migrations, applied in order and recorded in SchemaVersion. Each step
+# is the SQL as of its release, not the live models, so editing a model never
+# changes what an old step does; schema changes need a new step. Steps must
+# be safe to re-run: databases created before versioning may already have
+# some of these tables. Never edit a released step; append.
+MIGRATIONS = [
+    (1, 'Create user and like tables', run_sql("""
+        CREATE TABLE IF NOT EXISTS user (
+            id INTEGER NOT NULL,
+            username VARCHAR(80) NOT NULL,
+            email VARCHAR(120) NOT NULL,
+            password_hash VARCHAR(120) NOT NULL,
+            is_admin BOOLEAN,
+            created_at DATETIME,
+            PRIMARY KEY (id),
+            UNIQUE (username),
+            UNIQUE (email)
+        )""", """
+        CREATE TABLE IF NOT EXISTS "like" (
+            id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            post_filename VARCHAR(255) NOT NULL,
+            created_at DATETIME,
+            PRIMARY KEY (id),
+            CONSTRAINT unique_user_post_like UNIQUE (user_id, post_filename),
+            FOREIGN KEY(user_id) REFERENCES user (id)
+        )""")),
+    (2, 'Index likes by post', run_sql(
+        'CREATE INDEX IF NOT EXISTS ix_like_post_filename ON "like" (post_filename)')),
+    (3, 'Add drafts', run_sql("""
+        CREATE TABLE IF NOT EXISTS draft (
+            id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            draft_key VARCHAR(255) NOT NULL,
+            title VARCHAR(255),
+            content TEXT,
+            version INTEGER NOT NULL,
+            updated_at DATETIME,
+            PRIMARY KEY (id),
+            CONSTRAINT unique_user_draft UNIQUE (user_id, draft_key),
+            FOREIGN KEY(user_id) REFERENCES user (id) ON DELETE CASCADE
+        )""")),
+    (4, 'Add post revisions', run_sql("""
+        CREATE TABLE IF NOT EXISTS post_revision (
+            id INTEGER NOT NULL,
+            post_filename VARCHAR(255) NOT NULL,
+            number INTEGER NOT NULL,
+            is_snapshot BOOLEAN NOT NULL,
+            data BLOB NOT NULL,
+            title VARCHAR(255),
+            user_id INTEGER,
+            created_at DATETIME,
+            PRIMARY KEY (id),
+            CONSTRAINT unique_post_revision UNIQUE (post_filename, number),
+            FOREIGN KEY(user_id) REFERENCES user (id) ON DELETE SET NULL
+        )""")),
+    (5, 'Add comments and comment counts', run_sql("""
+        CREATE TABLE IF NOT EXISTS comment (
+            id INTEGER NOT NULL,
+            post_filename VARCHAR(255) NOT NULL,
+            user_id INTEGER,
+            parent_id INTEGER,
+            path VARCHAR(512) NOT NULL,
+            depth INTEGER NOT NULL,
+            body TEXT NOT NULL,
+            is_hidden BOOLEAN NOT NULL,
+            created_at DATETIME,
+            PRIMARY KEY (id),
+            FOREIGN KEY(user_id) REFERENCES user (id) ON DELETE SET NULL,
+            FOREIGN KEY(parent_id) REFERENCES comment (id) ON DELETE CASCADE
+        )""",
+        'CREATE INDEX IF NOT EXISTS ix_comment_post_path ON comment (post_filename, path)', """
+        CREATE TABLE IF NOT EXISTS comment_count (
+            post_filename VARCHAR(255) NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (post_filename)
+        )""")),
+    (6, 'Add related posts', run_sql("""
+        CREATE TABLE IF NOT EXISTS related_post (
+            post_filename VARCHAR(255) NOT NULL,
+            rank INTEGER NOT NULL,
+            related_filename VARCHAR(255) NOT NULL,
+            related_title VARCHAR(255),
+            score FLOAT NOT NULL,
+            PRIMARY KEY (post_filename, rank)
+        )""")),
+    (7, 'Cascade user deletes to likes, drafts and revisions', add_user_delete_actions),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def read_schema_version(conn):
+    """Get the applied schema version (0 for a new or pre-versioning database)"""
+    try:
+        version = conn.execute(db.select(SchemaVersion.version).where(SchemaVersion.id == 1)).scalar()
+    except OperationalError:
+        # No schema_version table yet
+        conn.rollback()
+        return 0
+    return version or 0
+
+def migrate_db():
+    """Apply pending migrations; returns the number of steps applied
+
+    An up-to-date database costs one single-row read. Otherwise the steps
+    run inside one BEGIN IMMEDIATE transaction, so if several processes
+    start at once only the first migrates and the rest see it done.
+    """
+    with db.engine.connect() as conn:
+        if read_schema_version(conn) >= SCHEMA_VERSION:
+            return 0
+        
+        conn.exec_driver_sql('BEGIN IMMEDIATE')
+        conn.exec_driver_sql("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                id INTEGER NOT NULL,
+                version INTEGER NOT NULL,
+                PRIMARY KEY (id)
+            )""")
+        current = read_schema_version(conn)
+        applied = 0
+        for version, description, step in MIGRATIONS:
+            if version > current:
+                step(conn)
+                print(f"Applied migration {version}: {description}")
+                applied += 1
+        
+        if applied:
+            conn.execute(db.text(
+                'INSERT INTO schema_version (id, version) VALUES (1, :version) '
+                'ON CONFLICT (id) DO UPDATE SET version = :version'
+            ), {'version': SCHEMA_VERSION})
+        conn.commit()
+        return applied
+
 def init_db():
-    """Initialize database and create admin user"""
+    """Apply pending migrations and create the admin user"""
     with app.app_context():
+        # Errors propagate: never fall back to recreating tables over real data
+        applied = migrate_db()
+        if applied:
+            print(f"Database migrated to version {SCHEMA_VERSION}")
+        
+        # Create admin user if it doesn't exist
+        admin = User.query.filter_by(username='admin').first()
+        if not admin:
+            admin = User(
+                username='admin',
+                email='admin@example.com',
+                is_admin=True
+            )
+            admin.set_password('admin123')
+            db.session.add(admin)
+            db.session.commit()
+            print("Admin user created: username=admin, password=admin123")
+        
+        print("Database initialized successfully!")
+
+def write_jsonl_member(archive, name, cursor, columns):
+    """Stream query rows as JSON lines into one archive member"""
+    # tar needs each member's size up front, so spool to a temp file first
+    with tempfile.TemporaryFile() as spool:
+        while True:
+            rows = cursor.fetchmany(ARCHIVE_BATCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                spool.write(json.dumps(dict(zip(columns, row))).encode('utf-8') + b'\n')
+        info = tarfile.TarInfo(name)
+        info.size = spool.tell()
+        info.mtime = int(time.time())
+        spool.seek(0)
+        archive.addfile(info, spool)
+
+def export_blog(archive_path):
+    """Write posts, users and likes to a .tar.gz archive
+
+    Users and likes are read from an SQLite online backup, so the export is
+    a consistent snapshot even while the app is serving writes.
+    """
+    db_path = db.engine.url.database
+    counts = {'posts': 0}
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        snapshot_path = os.path.join(tmp_dir, 'snapshot.db')
+        source = sqlite3.connect(db_path)
+        snapshot = sqlite3.connect(snapshot_path)
         try:
-            # Check if tables exist
-            inspector = db.inspect(db.engine)
-            existing_tables = inspector.get_table_names()
-            
-            if not existing_tables:
-                # Only create tables if they don't exist
-                db.create_all()
-                print("Tables created: User, Like")
-            else:
-                print(f"Tables already exist: {existing_tables}")
-            
-            # Create admin user if it doesn't exist
-            admin = User.query.filter_by(username='admin').first()
-            if not admin:
-                admin = User(
-                    username='admin',
-                    email='admin@example.com',
-                    is_admin=True
-                )
-                admin.set_password('admin123')
-                db.session.add(admin)
+            source.backup(snapshot)
+        finally:
+            source.close()
+        
+        try:
+            # Streaming mode: the archive is written sequentially, never seeked
+            with tarfile.open(archive_path, 'w|gz') as archive:
+                counts['users'] = snapshot.execute('SELECT COUNT(*) FROM user').fetchone()[0]
+                counts['likes'] = snapshot.execute('SELECT COUNT(*) FROM "like"').fetchone()[0]
+                
+                # Users before likes so the importer can resolve usernames in one pass
+                columns = ['username', 'email', 'password_hash', 'is_admin', 'created_at']
+                cursor = snapshot.execute(f'SELECT {", ".join(columns)} FROM user ORDER BY id')
+                write_jsonl_member(archive, 'users.jsonl', cursor, columns)
+                
+                # Likes reference users by name so ids don't have to match on import
+                columns = ['username', 'post_filename', 'created_at']
+                cursor = snapshot.execute(
+                    'SELECT user.username, "like".post_filename, "like".created_at '
+                    'FROM "like" JOIN user ON user.id = "like".user_id ORDER BY "like".id')
+                write_jsonl_member(archive, 'likes.jsonl', cursor, columns)
+                
+                if os.path.exists(POSTS_DIR):
+                    for filename in sorted(os.listdir(POSTS_DIR)):
+                        if filename.endswith('.md'):
+                            archive.add(os.path.join(POSTS_DIR, filename), arcname=f'posts/{filename}')
+                            counts['posts'] += 1
+        finally:
+            snapshot.close()
+    
+    return counts
+
+def parse_timestamp(value):
+    """Parse an exported timestamp back into a datetime"""
+    return datetime.fromisoformat(value) if value else None
+
+def insert_ignore_batches(model, rows):
+    """Bulk insert rows in batches, skipping rows that hit a unique constraint"""
+    statement = db.insert(model).prefix_with('OR IGNORE')
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= ARCHIVE_BATCH_SIZE:
+            db.session.execute(statement, batch)
+            batch = []
+    if batch:
+        db.session.execute(statement, batch)
+
+def import_blog(archive_path):
+    """Load an archive written by export_blog(); existing rows/posts are kept"""
+    counts = {'posts': 0, 'users': 0, 'likes': 0}
+    os.makedirs(POSTS_DIR, exist_ok=True)
+    
+    def read_jsonl(member_file, key):
+        for line in member_file:
+            if line.strip():
+                counts[key] += 1
+                yield json.loads(line)
+    
+    with tarfile.open(archive_path, 'r|gz') as archive:
+        for member in archive:
+            if member.name == 'users.jsonl':
+                insert_ignore_batches(User, (
+                    dict(row, created_at=parse_timestamp(row['created_at']))
+                    for row in read_jsonl(archive.extractfile(member), 'users')
+                ))
                 db.session.commit()
-                print("Admin user created: username=admin, password=admin123")
-            else:
-                print("Admin user already exists")
-            
-            print("Database initialized successfully!")
             
-        except Exception as e:
-            print(f"Database initialization error: {e}")
-            # If there's an error, try to recreate tables
-            try:
-                db.drop_all()
-                db.create_all()
-                print("Tables recreated due to error")
-                
-                # Create admin user
-                admin = User(
-                    username='admin',
-                    email='admin@example.com',
-                    is_admin=True
-                )
-                admin.set_password('admin123')
-                db.session.add(admin)
+            elif member.name == 'likes.jsonl':
+                user_ids = dict(db.session.query(User.username, User.id).all())
+                # Load without the secondary index and rebuild it once at the end
+                for index in Like.__table__.indexes:
+                    index.drop(db.engine, checkfirst=True)
+                insert_ignore_batches(Like, (
+                    {'user_id': user_ids[row['username']],
+                     'post_filename': row['post_filename'],
+                     'created_at': parse_timestamp(row['created_at'])}
+                    for row in read_jsonl(archive.extractfile(member), 'likes')
+                    if row['username'] in user_ids
+                ))
                 db.session.commit()
-                print("Admin user created: username=admin, password=admin123")
-                
-            except Exception as e2:
-                print(f"Failed to recreate tables: {e2}")
-                raise
+                for index in Like.__table__.indexes:
+                    index.create(db.engine, checkfirst=True)
+            
+            elif member.isfile() and member.name.startswith('posts/') and member.name.endswith('.md'):
+                filename = os.path.basename(member.name)
+                if filename != sanitize_filename(filename[:-3]):
+                    print(f"Skipping unsafe post name {member.name}")
+                    continue
+                target = os.path.join(POSTS_DIR, filename)
+                if os.path.exists(target):
+                    continue
+                with open(target, 'wb') as f:
+                    f.write(archive.extractfile(member).read())
+                counts['posts'] += 1
+    
+    # Refresh the query planner statistics after the bulk load
+    db.session.execute(db.text('ANALYZE'))
+    db.session.commit()
+    return counts
+
+@app.cli.command('export-blog')
+@click.argument('archive_path')
+def export_blog_command(archive_path):
+    """Export posts, users and likes to a .tar.gz archive"""
+    counts = export_blog(archive_path)
+    print(f"Exported {counts['posts']} posts, {counts['users']} users, {counts['likes']} likes to {archive_path}")
+
+@app.cli.command('import-blog')
+@click.argument('archive_path')
+def import_blog_command(archive_path):
+    """Import an archive created by export-blog"""
+    counts = import_blog(archive_path)
+    print(f"Read {counts['posts']} new posts, {counts['users']} users, {counts['likes']} likes from {archive_path}")
+
+@app.cli.command('provision-users')
+@click.argument('csv_path')
+def provision_users_command(csv_path):
+    """Create users from a CSV with username,email,password[,is_admin] columns"""
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        created, failures = provision_users(csv.DictReader(f))
+    for username, error in failures:
+        print(f"Skipped {username or '(blank)'}: {error}")
+    print(f"Created {created} users, skipped {len(failures)}")
+
+@app.cli.command('build-related')
+def build_related_command():
+    """Recompute the related posts shown under each post"""
+    rows = compute_related_posts()
+    print(f"Stored {rows} related post links")
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Fingerprint and precompress static files ahead of the first request"""
+    build_asset_manifest()
+    print(f"Prepared {len(ASSET_MANIFEST)} static assets in {ASSET_CACHE_DIR}")
+
+@app.cli.command('migrate-db')
+def migrate_db_command():
+    """Apply pending schema migrations (run once per deployment)"""
+    applied = migrate_db()
+    print(f"Applied {applied} migrations, schema is at version {SCHEMA_VERSION}")
+
+@app.cli.command('sweep-likes')
+def sweep_likes_command():
+    """Delete likes that point at posts which no longer exist"""
+    deleted = sweep_orphan_likes()
+    print(f"Removed {deleted} orphan likes")
 
 if __name__ == '__main__':
     init_db()
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    backend_port = app.config['LIKE_EVENTS_BACKEND_PORT']
+    # The reloader's parent only watches files; its child serves
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        like_events.start('0.0.0.0', 5000, backend_port)
+        # Rate limits key on the client address the front passes along
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=0)
+        print(' * Blog on http://0.0.0.0:5000')
+    app.run(debug=True, host='127.0.0.1', port=backend_port)
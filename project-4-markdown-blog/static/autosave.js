@@ -0,0 +1,129 @@
+// Draft autosave for the create/edit forms.
+// Keystrokes are debounced and only the changed range of the content is sent
+// to the server as a delta against the last saved draft version.
+(function() {
+    const form = document.querySelector('form[data-draft-key]');
+    if (!form) {
+        return;
+    }
+
+    const draftKey = form.dataset.draftKey;
+    const debounceMs = parseInt(form.dataset.debounceMs) || 2000;
+    const maxWaitMs = parseInt(form.dataset.maxWaitMs) || 10000;
+    const titleInput = form.querySelector('[name="title"]');
+    const contentInput = form.querySelector('[name="content"]');
+    const status = document.getElementById('autosave-status');
+    const baseUrl = `/drafts/${encodeURIComponent(draftKey)}`;
+
+    // Last state the server has acknowledged
+    let synced = { version: 0, title: '', content: '', exists: false };
+    let timer = null;
+    let firstPendingAt = null;
+    let saving = false;
+
+    function setStatus(text) {
+        if (status) {
+            status.textContent = text;
+        }
+    }
+
+    // Single replacement covering everything between the common prefix and suffix.
+    // Offsets are UTF-16 code units (JS string indexes); the server applies
+    // them the same way, so the text of an op may be half of a surrogate pair
+    function computeOps(oldText, newText) {
+        if (oldText === newText) {
+            return [];
+        }
+        let start = 0;
+        const minLen = Math.min(oldText.length, newText.length);
+        while (start < minLen && oldText[start] === newText[start]) {
+            start++;
+        }
+        let oldEnd = oldText.length;
+        let newEnd = newText.length;
+        while (oldEnd > start && newEnd > start && oldText[oldEnd - 1] === newText[newEnd - 1]) {
+            oldEnd--;
+            newEnd--;
+        }
+        return [{ start: start, end: oldEnd, text: newText.slice(start, newEnd) }];
+    }
+
+    function post(body) {
+        return fetch(`${baseUrl}/autosave`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(body)
+        });
+    }
+
+    function save() {
+        timer = null;
+        firstPendingAt = null;
+        if (saving) {
+            schedule();
+            return;
+        }
+
+        const title = titleInput.value;
+        const content = contentInput.value;
+        if (synced.exists && title === synced.title && content === synced.content) {
+            return;
+        }
+
+        const body = synced.exists
+            ? { base_version: synced.version, ops: computeOps(synced.content, content), title: title }
+            : { content: content, title: title };
+
+        saving = true;
+        setStatus('Saving draft...');
+        post(body)
+            .then(response => {
+                if (response.status === 409) {
+                    // Server draft moved on (another tab/worker); resend the full text
+                    return post({ content: content, title: title });
+                }
+                return response;
+            })
+            .then(response => response.json())
+            .then(data => {
+                if (data.error) {
+                    setStatus('Draft not saved: ' + data.error);
+                    return;
+                }
+                synced = { version: data.version, title: title, content: content, exists: true };
+                setStatus('Draft saved at ' + new Date().toLocaleTimeString());
+            })
+            .catch(() => setStatus('Draft not saved: network error'))
+            .finally(() => { saving = false; });
+    }
+
+    function schedule() {
+        const now = Date.now();
+        if (firstPendingAt === null) {
+            firstPendingAt = now;
+        }
+        clearTimeout(timer);
+        // Coalesce bursts of typing, but never wait longer than maxWaitMs
+        const wait = Math.max(0, Math.min(debounceMs, firstPendingAt + maxWaitMs - now));
+        timer = setTimeout(save, wait);
+    }
+
+    fetch(baseUrl)
+        .then(response => response.json())
+        .then(data => {
+            if (data.error || !data.exists) {
+                return;
+            }
+            synced = { version: data.version, title: data.title, content: data.content, exists: true };
+            if (data.content !== contentInput.value || data.title !== titleInput.value) {
+                titleInput.value = data.title;
+                contentInput.value = data.content;
+                setStatus('Restored your unsaved draft');
+            }
+        })
+        .catch(error => console.error('Draft load error:', error));
+
+    titleInput.addEventListener('input', schedule);
+    contentInput.addEventListener('input', schedule);
+    form.addEventListener('submit', () => clearTimeout(timer));
+})();
@@ -0,0 +1,134 @@
+// Threaded comments for the post page.
+// Comments arrive in thread order one page at a time; each is indented by its
+// depth, so appending pages never requires re-rendering earlier ones.
+(function() {
+    const section = document.getElementById('comments');
+    if (!section) {
+        return;
+    }
+
+    const filename = section.dataset.post;
+    const isAdmin = section.dataset.admin === 'true';
+    const list = document.getElementById('comment-list');
+    const loadMore = document.getElementById('comment-load-more');
+    const countLabel = document.getElementById('comment-count');
+    const form = document.getElementById('comment-form');
+    const replyNote = document.getElementById('comment-reply-note');
+    const baseUrl = `/post/${encodeURIComponent(filename)}/comments`;
+    let next = '';
+    let replyTo = null;
+
+    function setCount(count) {
+        countLabel.textContent = count;
+    }
+
+    function post(url, body) {
+        return fetch(url, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(body || {})
+        }).then(response => response.json());
+    }
+
+    function renderComment(comment) {
+        const item = document.createElement('div');
+        item.className = 'comment border-start ps-3 mb-3';
+        item.style.marginLeft = `${comment.depth * 1.5}rem`;
+        item.dataset.id = comment.id;
+
+        const meta = document.createElement('small');
+        meta.className = 'text-muted d-block mb-1';
+        meta.textContent = comment.author + (comment.created_at ? ' · ' + new Date(comment.created_at).toLocaleString() : '');
+        item.appendChild(meta);
+
+        const body = document.createElement('p');
+        body.className = 'mb-1' + (comment.is_hidden ? ' text-muted fst-italic' : '');
+        body.textContent = comment.body === null ? '[hidden by a moderator]' : comment.body;
+        item.appendChild(body);
+
+        const actions = document.createElement('div');
+        if (form) {
+            actions.appendChild(actionButton('Reply', () => {
+                replyTo = comment.id;
+                replyNote.textContent = `Replying to ${comment.author}`;
+                replyNote.classList.remove('d-none');
+                form.querySelector('textarea').focus();
+            }));
+        }
+        if (isAdmin) {
+            actions.appendChild(actionButton(comment.is_hidden ? 'Unhide' : 'Hide', () => {
+                post(`/comments/${comment.id}/hide`).then(data => {
+                    if (!data.error) {
+                        comment.is_hidden = data.is_hidden;
+                        item.replaceWith(renderComment(comment));
+                        setCount(data.count);
+                    }
+                });
+            }));
+            actions.appendChild(actionButton('Delete', () => {
+                if (!confirm('Delete this comment and all of its replies?')) {
+                    return;
+                }
+                post(`/comments/${comment.id}/delete`).then(data => {
+                    if (!data.error) {
+                        reload();
+                        setCount(data.count);
+                    }
+                });
+            }));
+        }
+        item.appendChild(actions);
+        return item;
+    }
+
+    function actionButton(label, onClick) {
+        const button = document.createElement('button');
+        button.type = 'button';
+        button.className = 'btn btn-link btn-sm p-0 me-3';
+        button.textContent = label;
+        button.addEventListener('click', onClick);
+        return button;
+    }
+
+    function loadPage() {
+        loadMore.disabled = true;
+        fetch(`${baseUrl}?after=${encodeURIComponent(next)}`)
+            .then(response => response.json())
+            .then(data => {
+                data.comments.forEach(comment => list.appendChild(renderComment(comment)));
+                setCount(data.count);
+                next = data.next;
+                loadMore.classList.toggle('d-none', !next);
+                loadMore.disabled = false;
+            })
+            .catch(error => console.error('Comment load error:', error));
+    }
+
+    function reload() {
+        list.innerHTML = '';
+        next = '';
+        loadPage();
+    }
+
+    if (form) {
+        form.addEventListener('submit', function(event) {
+            event.preventDefault();
+            const textarea = form.querySelector('textarea');
+            post(baseUrl, { body: textarea.value, parent_id: replyTo }).then(data => {
+                if (data.error) {
+                    alert('Error: ' + data.error);
+                    return;
+                }
+                textarea.value = '';
+                replyTo = null;
+                replyNote.classList.add('d-none');
+                setCount(data.count);
+                // Replies belong mid-thread, so reload from the top to keep order
+                reload();
+            });
+        });
+    }
+
+    loadMore.addEventListener('click', loadPage);
+    loadPage();
+})();
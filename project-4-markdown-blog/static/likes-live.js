@@ -0,0 +1,24 @@
+// Live like counts over Server-Sent Events.
+// Subscribes to every post on the page and overwrites the shown counts with the
+// absolute values pushed by the server, so pages never need to poll.
+(function() {
+    const url = document.body.dataset.likeEvents;
+    const sections = document.querySelectorAll('[data-like-post]');
+    if (!url || !sections.length || !window.EventSource) {
+        return;
+    }
+
+    const posts = Array.from(new Set(Array.from(sections, el => el.dataset.likePost)));
+    const source = new EventSource(`${url}?posts=${encodeURIComponent(posts.join(','))}`);
+
+    source.addEventListener('like', function(event) {
+        const data = JSON.parse(event.data);
+        sections.forEach(section => {
+            if (section.dataset.likePost === data.post) {
+                section.querySelectorAll('.like-count').forEach(count => {
+                    count.textContent = data.likes;
+                });
+            }
+        });
+    });
+})();
@@ -0,0 +1,58 @@
+// Image/attachment upload for the create/edit forms.
+// Uploaded files are inserted into the content textarea as Markdown, using the
+// pre-sized "medium" variant for images when the server generated one.
+(function() {
+    const input = document.querySelector('input[data-upload-target]');
+    if (!input) {
+        return;
+    }
+
+    const target = document.getElementById(input.dataset.uploadTarget);
+    const status = document.getElementById('upload-status');
+
+    function setStatus(text) {
+        if (status) {
+            status.textContent = text;
+        }
+    }
+
+    function insertAtCursor(text) {
+        const start = target.selectionStart;
+        const end = target.selectionEnd;
+        target.value = target.value.slice(0, start) + text + target.value.slice(end);
+        target.selectionStart = target.selectionEnd = start + text.length;
+        target.focus();
+        // Let the autosave pick up the change
+        target.dispatchEvent(new Event('input'));
+    }
+
+    input.addEventListener('change', function() {
+        const file = this.files[0];
+        if (!file) {
+            return;
+        }
+
+        const body = new FormData();
+        body.append('file', file);
+        setStatus('Uploading ' + file.name + '...');
+
+        fetch('/upload', { method: 'POST', body: body })
+            .then(response => response.json())
+            .then(data => {
+                if (data.error) {
+                    setStatus('Upload failed: ' + data.error);
+                    return;
+                }
+                const label = file.name.replace(/\.[^.]+$/, '');
+                if (data.is_image) {
+                    const src = data.variants.medium || data.url;
+                    insertAtCursor(`\n[![${label}](${src})](${data.url})\n`);
+                } else {
+                    insertAtCursor(`[${file.name}](${data.url})`);
+                }
+                setStatus('Uploaded ' + file.name);
+                input.value = '';
+            })
+            .catch(() => setStatus('Upload failed: network error'));
+    });
+})();
@@ -0,0 +1,821 @@
+import hashlib
+import http.client
+import io
+import os
+import shutil
+import socket
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from flask import session
+from sqlalchemy import event
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Point the app at a throwaway database before it is imported
+TEST_DIR = tempfile.mkdtemp(prefix='blog-tests-')
+TEST_DB = os.path.join(TEST_DIR, 'blog.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{TEST_DB}'
+
+import app as blog
+
+# Tests drive the like sweep directly, and keep generated assets out of instance/
+blog.app.config['LIKE_SWEEPER'] = False
+blog.ASSET_CACHE_DIR = os.path.join(TEST_DIR, 'assets')
+
+
+def tearDownModule():
+    shutil.rmtree(TEST_DIR, ignore_errors=True)
+
+
+class BlogTestCase(unittest.TestCase):
+    """Fresh database and posts directory for every test"""
+
+    def setUp(self):
+        self.posts_dir = tempfile.mkdtemp(dir=TEST_DIR)
+        self.original_posts_dir = blog.POSTS_DIR
+        blog.POSTS_DIR = self.posts_dir
+        self.context = blog.app.test_request_context()
+        self.context.push()
+        blog.db.drop_all()
+        blog.migrate_db()
+        blog.rate_limit_store = blog.MemoryTokenBucketStore()
+
+    def tearDown(self):
+        blog.db.session.remove()
+        self.context.pop()
+        blog.POSTS_DIR = self.original_posts_dir
+
+    def write_post(self, filename, text):
+        with open(os.path.join(self.posts_dir, filename), 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def read_post(self, filename):
+        with open(os.path.join(self.posts_dir, filename), encoding='utf-8') as f:
+            return f.read()
+
+    def add_users(self, count):
+        users = [blog.build_user(f'user{i}', f'user{i}@example.com', 'secret1') for i in range(count)]
+        blog.db.session.add_all(users)
+        blog.db.session.commit()
+        return users
+
+    def revision_numbers(self, filename):
+        return [r.number for r in blog.PostRevision.query.filter_by(
+            post_filename=filename).order_by(blog.PostRevision.number)]
+
+
+class DraftDeltaTests(unittest.TestCase):
+    def test_replaces_range(self):
+        ops = [{'start': 6, 'end': 11, 'text': 'there'}]
+        self.assertEqual(blog.apply_draft_delta('hello world', ops), 'hello there')
+
+    def test_offsets_are_utf16_code_units(self):
+        # What autosave.js sends for typing "X" between "a" and "b"
+        ops = [{'start': 3, 'end': 3, 'text': 'X'}]
+        self.assertEqual(blog.apply_draft_delta('😀ab', ops), '😀aXb')
+
+    def test_op_may_replace_half_of_a_surrogate_pair(self):
+        # computeOps keeps the shared high surrogate of 😀 -> 😁 as prefix
+        ops = [{'start': 1, 'end': 2, 'text': '\ude01'}]
+        self.assertEqual(blog.apply_draft_delta('😀!', ops), '😁!')
+
+    def test_rejects_split_character(self):
+        with self.assertRaises(ValueError):
+            blog.apply_draft_delta('😀', [{'start': 1, 'end': 1, 'text': 'x'}])
+
+    def test_rejects_out_of_range(self):
+        with self.assertRaises(ValueError):
+            blog.apply_draft_delta('😀', [{'start': 0, 'end': 3, 'text': ''}])
+
+
+class PostRevisionTests(BlogTestCase):
+    def test_rename_onto_existing_post_changes_nothing(self):
+        self.write_post('first.md', 'Author: a\n\n# First\n\nOne')
+        self.write_post('second.md', 'Author: b\n\n# Second\n\nTwo')
+        blog.record_revision('first.md', 'Author: a\n\n# First\n\nOne')
+        
+        with self.assertRaises(ValueError):
+            blog.save_post_edit('first.md', 'Second', 'Replaced', 'a')
+        
+        self.assertEqual(self.read_post('first.md'), 'Author: a\n\n# First\n\nOne')
+        self.assertEqual(self.read_post('second.md'), 'Author: b\n\n# Second\n\nTwo')
+        self.assertEqual(self.revision_numbers('first.md'), [1])
+
+    def test_rename_over_leftover_history(self):
+        self.write_post('old.md', 'Author: a\n\n# Old\n\nText')
+        blog.record_revision('old.md', 'Author: a\n\n# Old\n\nText')
+        # History of a post whose file was removed outside the app
+        blog.record_revision('new.md', 'stale')
+        
+        new_filename = blog.save_post_edit('old.md', 'New', 'Text', 'a')
+        
+        self.assertEqual(new_filename, 'new.md')
+        self.assertFalse(os.path.exists(os.path.join(self.posts_dir, 'old.md')))
+        self.assertEqual(self.revision_numbers('new.md'), [1, 2])
+        self.assertEqual(blog.get_revision_content('new.md', 2), self.read_post('new.md'))
+
+    def test_concurrent_revision_number_is_retried(self):
+        blog.record_revision('post.md', 'v1')
+        
+        raced = []
+        
+        def race(session, context, instances):
+            # Another worker commits revision 2 between our read and insert
+            if raced:
+                return
+            raced.append(True)
+            conn = sqlite3.connect(TEST_DB)
+            conn.execute("INSERT INTO post_revision (post_filename, number, is_snapshot, data) "
+                         "VALUES ('post.md', 2, 1, ?)", (blog.zlib.compress(b'v2'),))
+            conn.commit()
+            conn.close()
+        
+        event.listen(blog.db.session(), 'before_flush', race)
+        try:
+            revision = blog.record_revision('post.md', 'v3')
+        finally:
+            event.remove(blog.db.session(), 'before_flush', race)
+        
+        self.assertEqual(revision.number, 3)
+        self.assertEqual(blog.get_revision_content('post.md', 3), 'v3')
+
+
+    def test_broken_delta_chain_is_reported_not_rendered(self):
+        for text in ('v1', 'v2', 'v3'):
+            blog.record_revision('post.md', text)
+        blog.PostRevision.query.filter_by(post_filename='post.md', number=2).delete()
+        blog.db.session.commit()
+        admin = blog.build_user('admin', 'admin@example.com', 'secret1', is_admin=True)
+        blog.db.session.add(admin)
+        blog.db.session.commit()
+        client = blog.app.test_client()
+        with client.session_transaction() as client_session:
+            client_session['user_id'] = admin.id
+        
+        self.assertIsNone(blog.get_revision_content('post.md', 3))
+        response = client.get('/post/post.md/revisions/3')
+        
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.headers['Location'].endswith('/post/post.md/revisions'))
+        with client.session_transaction() as client_session:
+            self.assertIn(('error', 'Revision could not be rebuilt from its history'),
+                          client_session['_flashes'])
+
+
+class PostListingTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.users = self.add_users(2)
+
+    def count_queries(self, func):
+        statements = []
+        
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        
+        event.listen(blog.db.engine, 'before_cursor_execute', record)
+        try:
+            result = func()
+        finally:
+            event.remove(blog.db.engine, 'before_cursor_execute', record)
+        return result, len(statements)
+
+    def test_likes_take_two_queries_for_any_number_of_posts(self):
+        for i in range(6):
+            self.write_post(f'post-{i}.md', f'Author: user0\n\n# Post {i}\n\nBody')
+            blog.db.session.add(blog.Like(user_id=self.users[i % 2].id, post_filename=f'post-{i}.md'))
+        blog.db.session.commit()
+        session['user_id'] = self.users[0].id
+        
+        posts, queries = self.count_queries(blog.get_posts)
+        
+        self.assertEqual(queries, 2)
+        self.assertEqual(len(posts), 6)
+        self.assertTrue(all(post['like_count'] == 1 for post in posts))
+        self.assertEqual({post['filename'] for post in posts if post['user_liked']},
+                         {'post-0.md', 'post-2.md', 'post-4.md'})
+
+    def test_unchanged_files_are_parsed_once(self):
+        self.write_post('cached.md', 'Author: user0\n\n# Cached\n\nBody')
+        with mock.patch.object(blog, 'parse_post_content', wraps=blog.parse_post_content) as parse:
+            blog.get_posts()
+            blog.get_posts()
+            self.assertEqual(parse.call_count, 1)
+            
+            self.write_post('cached.md', 'Author: user0\n\n# Cached\n\nEdited body')
+            self.assertEqual(blog.get_post('cached.md')['content'], '# Cached\n\nEdited body')
+            self.assertEqual(parse.call_count, 2)
+
+    def test_request_fields_do_not_leak_into_cache(self):
+        self.write_post('post.md', 'Author: user0\n\n# Post\n\nBody')
+        blog.db.session.add(blog.Like(user_id=self.users[0].id, post_filename='post.md'))
+        blog.db.session.commit()
+        session['user_id'] = self.users[0].id
+        self.assertTrue(blog.get_post('post.md')['user_liked'])
+        
+        session.pop('user_id')
+        self.assertFalse(blog.get_posts()[0]['user_liked'])
+
+
+class LikeEventTests(BlogTestCase):
+    """The like event front, over real sockets, with the app served behind it"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.backend = make_server('127.0.0.1', 0, ProxyFix(blog.app.wsgi_app, x_for=1, x_proto=0), threaded=True)
+        threading.Thread(target=cls.backend.serve_forever, daemon=True).start()
+        cls.broker = blog.LikeEventBroker()
+        cls.port = cls.broker.start('127.0.0.1', 0, cls.backend.server_port)
+
+    @classmethod
+    def tearDownClass(cls):
+        # Streams end as soon as their sockets close
+        deadline = time.monotonic() + 5
+        while cls.broker.subscribers and time.monotonic() < deadline:
+            time.sleep(0.01)
+        cls.broker.loop.call_soon_threadsafe(cls.broker.loop.stop)
+        cls.backend.shutdown()
+
+    def setUp(self):
+        super().setUp()
+        self.users = self.add_users(2)
+        self.write_post('post.md', 'Author: user0\n\n# Post\n\nBody')
+        patcher = mock.patch.object(blog, 'like_events', self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def open_stream(self, posts):
+        sock = socket.create_connection(('127.0.0.1', self.port), timeout=5)
+        self.addCleanup(sock.close)
+        sock.sendall(f'GET /events/likes?posts={posts} HTTP/1.1\r\nHost: localhost\r\n\r\n'.encode())
+        return sock
+
+    def read_until(self, sock, marker, data=b''):
+        while marker not in data:
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+        return data
+
+    def test_other_requests_are_relayed_to_the_app(self):
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=5)
+        conn.request('GET', '/post/post.md', headers={'X-Forwarded-For': '203.0.113.9'})
+        response = conn.getresponse()
+        body = response.read().decode()
+        conn.close()
+        
+        self.assertEqual(response.status, 200)
+        self.assertIn('Post', body)
+        self.assertIn('data-like-events="/events/likes"', body)
+
+    def test_stream_sends_counts_then_likes(self):
+        sock = self.open_stream('post.md,../x')
+        head = self.read_until(sock, b'"likes": 0}')
+        self.assertIn(b'Content-Type: text/event-stream', head)
+        self.assertNotIn(b'Access-Control-Allow-Origin', head)
+        self.assertNotIn(b'../x', head)
+        
+        client = blog.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = self.users[1].id
+        self.assertEqual(client.post('/like/post.md').get_json()['likes'], 1)
+        
+        self.assertIn(b'data: {"post": "post.md", "likes": 1}', self.read_until(sock, b'"likes": 1}'))
+
+    def test_idle_streams_share_the_event_loop_thread(self):
+        self.read_until(self.open_stream('post.md'), b'"likes": 0}')
+        threads = threading.active_count()
+        streams = [self.open_stream('post.md') for _ in range(50)]
+        for sock in streams:
+            self.assertIn(b'"likes": 0}', self.read_until(sock, b'"likes": 0}'))
+        
+        self.assertEqual(threading.active_count(), threads)
+        self.assertEqual(len(self.broker.subscribers.get('post.md', ())), 51)
+        
+        for sock in streams:
+            sock.close()
+        deadline = time.monotonic() + 5
+        while len(self.broker.subscribers.get('post.md', ())) > 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(self.broker.subscribers.get('post.md', ())), 1)
+
+    def test_stream_needs_posts(self):
+        head = self.read_until(self.open_stream('../x'), b'}')
+        self.assertTrue(head.startswith(b'HTTP/1.1 400'))
+
+    def test_no_stream_url_without_the_front(self):
+        with mock.patch.object(blog, 'like_events', blog.LikeEventBroker()):
+            self.assertIsNone(blog.like_events_url())
+
+
+class CommentTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.add_users(1)[0]
+        self.write_post('post.md', 'Author: user0\n\n# Post\n\nBody')
+        self.client = blog.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = self.user.id
+
+    def test_malformed_comments_are_rejected(self):
+        for data in ({'body': 5}, ['hello'], 'hello', {'body': 'hi', 'parent_id': 'x'},
+                     {'body': 'hi', 'parent_id': [1]}):
+            with self.subTest(data=data):
+                self.assertEqual(self.client.post('/post/post.md/comments', json=data).status_code, 400)
+        self.assertEqual(blog.Comment.query.count(), 0)
+
+    def test_reply_is_nested_under_its_parent(self):
+        parent = self.client.post('/post/post.md/comments', json={'body': ' First '}).get_json()['comment']
+        response = self.client.post('/post/post.md/comments', json={'body': 'Reply', 'parent_id': parent['id']})
+        
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.get_json()['count'], 2)
+        reply = blog.db.session.get(blog.Comment, response.get_json()['comment']['id'])
+        self.assertEqual((reply.parent_id, reply.depth), (parent['id'], 1))
+        self.assertEqual(blog.db.session.get(blog.Comment, parent['id']).body, 'First')
+
+
+@unittest.skipIf(blog.np is None or blog.sparse is None, 'numpy and scipy are not installed')
+class RelatedPostTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write_post('tomatoes.md', 'Author: user0\n\n# Growing tomatoes\n\nTomatoes need sun, compost and steady watering in the garden.')
+        self.write_post('compost.md', 'Author: user0\n\n# Garden compost\n\nCompost feeds the garden soil; tomatoes and beans love it.')
+        self.write_post('indexes.md', 'Author: user0\n\n# Database indexes\n\nAn index lets the database skip scanning every table row.')
+        self.write_post('queries.md', 'Author: user0\n\n# Slow queries\n\nSlow database queries usually scan a table without an index.')
+
+    def related(self, filename):
+        return [r.related_filename for r in blog.get_related_posts(filename)]
+
+    def test_tfidf_rows_are_unit_length(self):
+        matrix = blog.build_tfidf_matrix(['garden tomatoes tomatoes', 'database index', 'the and'])
+        norms = blog.np.sqrt(blog.np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        
+        self.assertTrue(blog.np.allclose(norms, [1, 1, 0]))
+
+    def test_posts_are_related_by_text_across_blocks(self):
+        with mock.patch.object(blog, 'RELATED_BLOCK_SIZE', 3):
+            rows = blog.compute_related_posts(top_k=2, like_weight=0)
+        
+        self.assertEqual(self.related('tomatoes.md')[0], 'compost.md')
+        self.assertEqual(self.related('compost.md')[0], 'tomatoes.md')
+        self.assertEqual(self.related('indexes.md')[0], 'queries.md')
+        self.assertEqual(self.related('queries.md')[0], 'indexes.md')
+        self.assertEqual(rows, blog.RelatedPost.query.count())
+        self.assertFalse(blog.RelatedPost.query.filter(
+            blog.RelatedPost.post_filename == blog.RelatedPost.related_filename).count())
+
+    def test_co_likes_pull_posts_together(self):
+        users = self.add_users(2)
+        blog.db.session.add_all([blog.Like(user_id=user.id, post_filename=filename)
+                                 for user in users for filename in ('tomatoes.md', 'indexes.md')])
+        blog.db.session.commit()
+        
+        blog.compute_related_posts(top_k=1, like_weight=0.9)
+        
+        self.assertEqual(self.related('tomatoes.md'), ['indexes.md'])
+        self.assertEqual(self.related('compost.md'), ['tomatoes.md'])
+
+
+class MigrationTests(BlogTestCase):
+    def foreign_key_actions(self):
+        conn = sqlite3.connect(TEST_DB)
+        try:
+            return {table: {row[3]: row[6] for row in conn.execute(f'PRAGMA foreign_key_list("{table}")')}
+                    for table in ('like', 'draft', 'post_revision', 'comment')}
+        finally:
+            conn.close()
+
+    def test_fresh_database_matches_models(self):
+        conn = sqlite3.connect(TEST_DB)
+        try:
+            for table in blog.db.metadata.sorted_tables:
+                columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{table.name}")')]
+                self.assertEqual(columns, [column.name for column in table.columns], table.name)
+        finally:
+            conn.close()
+        self.assertEqual(self.foreign_key_actions(), {
+            'like': {'user_id': 'CASCADE'},
+            'draft': {'user_id': 'CASCADE'},
+            'post_revision': {'user_id': 'SET NULL'},
+            'comment': {'user_id': 'SET NULL', 'parent_id': 'CASCADE'},
+        })
+
+    def test_tables_from_before_cascades_are_rebuilt(self):
+        blog.db.session.remove()
+        blog.db.drop_all()
+        conn = sqlite3.connect(TEST_DB)
+        # Schema version 6 as created by a release without ON DELETE actions
+        conn.executescript("""
+            CREATE TABLE schema_version (id INTEGER NOT NULL, version INTEGER NOT NULL, PRIMARY KEY (id));
+            INSERT INTO schema_version VALUES (1, 6);
+            CREATE TABLE user (id INTEGER NOT NULL, username VARCHAR(80) NOT NULL, email VARCHAR(120) NOT NULL,
+                password_hash VARCHAR(120) NOT NULL, is_admin BOOLEAN, created_at DATETIME,
+                PRIMARY KEY (id), UNIQUE (username), UNIQUE (email));
+            CREATE TABLE "like" (id INTEGER NOT NULL, user_id INTEGER NOT NULL, post_filename VARCHAR(255) NOT NULL,
+                created_at DATETIME, PRIMARY KEY (id),
+                CONSTRAINT unique_user_post_like UNIQUE (user_id, post_filename),
+                FOREIGN KEY(user_id) REFERENCES user (id));
+            CREATE TABLE draft (id INTEGER NOT NULL, user_id INTEGER NOT NULL, draft_key VARCHAR(255) NOT NULL,
+                title VARCHAR(255), content TEXT, version INTEGER NOT NULL, updated_at DATETIME, PRIMARY KEY (id),
+                CONSTRAINT unique_user_draft UNIQUE (user_id, draft_key), FOREIGN KEY(user_id) REFERENCES user (id));
+            CREATE TABLE post_revision (id INTEGER NOT NULL, post_filename VARCHAR(255) NOT NULL,
+                number INTEGER NOT NULL, is_snapshot BOOLEAN NOT NULL, data BLOB NOT NULL, title VARCHAR(255),
+                user_id INTEGER, created_at DATETIME, PRIMARY KEY (id),
+                CONSTRAINT unique_post_revision UNIQUE (post_filename, number),
+                FOREIGN KEY(user_id) REFERENCES user (id));
+            INSERT INTO user VALUES (1, 'kept', 'kept@example.com', 'x', 0, NULL);
+            INSERT INTO user VALUES (2, 'leaving', 'leaving@example.com', 'x', 0, NULL);
+            INSERT INTO "like" VALUES (1, 1, 'a.md', NULL), (2, 2, 'a.md', NULL), (3, 99, 'a.md', NULL);
+            INSERT INTO draft VALUES (1, 2, 'new', '', '', 1, NULL), (2, 99, 'new', '', '', 1, NULL);
+            INSERT INTO post_revision VALUES (1, 'a.md', 1, 1, x'00', NULL, 2, NULL), (2, 'a.md', 2, 0, x'00', NULL, 99, NULL);
+        """)
+        conn.close()
+        
+        self.assertEqual(blog.migrate_db(), 1)
+        
+        self.assertEqual(self.foreign_key_actions()['like'], {'user_id': 'CASCADE'})
+        # Rows of users deleted before the cascades existed are cleaned up
+        self.assertEqual(sorted(like.id for like in blog.Like.query), [1, 2])
+        self.assertEqual([draft.id for draft in blog.Draft.query], [1])
+        self.assertEqual({r.id: r.user_id for r in blog.PostRevision.query}, {1: 2, 2: None})
+        
+        blog.db.session.delete(blog.db.session.get(blog.User, 2))
+        blog.db.session.commit()
+        self.assertEqual([like.id for like in blog.Like.query], [1])
+        self.assertEqual(blog.Draft.query.count(), 0)
+        self.assertIsNone(blog.db.session.get(blog.PostRevision, 1).user_id)
+        
+        conn = sqlite3.connect(TEST_DB)
+        indexes = [row[1] for row in conn.execute('PRAGMA index_list("like")')]
+        conn.close()
+        self.assertIn('ix_like_post_filename', indexes)
+        self.assertEqual(blog.migrate_db(), 0)
+
+
+class LikeSweepTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.users = self.add_users(2)
+
+    def like(self, *filenames):
+        for filename in filenames:
+            for user in self.users:
+                blog.db.session.add(blog.Like(user_id=user.id, post_filename=filename))
+        blog.db.session.commit()
+
+    def liked_posts(self):
+        return sorted({like.post_filename for like in blog.Like.query.all()})
+
+    def test_removes_likes_of_missing_posts_in_batches(self):
+        self.write_post('b.md', 'Author: a\n\n# B\n\nBody')
+        self.like('a.md', 'b.md', 'c.md')
+        
+        self.assertEqual(blog.sweep_orphan_likes(batch_size=1), 4)
+        self.assertEqual(self.liked_posts(), ['b.md'])
+
+    def test_post_created_during_the_sweep_keeps_its_likes(self):
+        self.like('a.md', 'b.md')
+        
+        def publish_b(session):
+            # b.md is published after the sweep started, before its batch
+            if not os.path.exists(os.path.join(self.posts_dir, 'b.md')):
+                self.write_post('b.md', 'Author: a\n\n# B\n\nBody')
+        
+        event.listen(blog.db.session(), 'after_commit', publish_b)
+        try:
+            blog.sweep_orphan_likes(batch_size=1)
+        finally:
+            event.remove(blog.db.session(), 'after_commit', publish_b)
+        
+        self.assertEqual(self.liked_posts(), ['b.md'])
+
+    def test_missing_posts_dir_deletes_nothing(self):
+        self.like('a.md')
+        blog.POSTS_DIR = os.path.join(self.posts_dir, 'gone')
+        
+        self.assertEqual(blog.sweep_orphan_likes(), 0)
+        self.assertEqual(self.liked_posts(), ['a.md'])
+
+    def test_sweeper_starts_once_per_serving_process(self):
+        client = blog.app.test_client()
+        with mock.patch.object(blog, 'start_like_sweeper') as start, \
+                mock.patch.dict(blog._like_sweeper, pid=None), \
+                mock.patch.dict(blog.app.config, LIKE_SWEEPER=True):
+            client.get('/login')
+            client.get('/login')
+            self.assertEqual(start.call_count, 1)
+            
+            # A worker forked after the first start runs its own sweeper
+            blog._like_sweeper['pid'] = -1
+            client.get('/login')
+            self.assertEqual(start.call_count, 2)
+
+
+@unittest.skipIf(blog.Image is None, 'Pillow is not installed')
+class UploadTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.original_uploads_dir = blog.UPLOADS_DIR
+        blog.UPLOADS_DIR = tempfile.mkdtemp(dir=TEST_DIR)
+        user = self.add_users(1)[0]
+        self.client = blog.app.test_client()
+        with self.client.session_transaction() as client_session:
+            client_session['user_id'] = user.id
+
+    def tearDown(self):
+        blog.UPLOADS_DIR = self.original_uploads_dir
+        super().tearDown()
+
+    def upload(self, data, filename='photo.png'):
+        response = self.client.post('/upload', data={'file': (io.BytesIO(data), filename)},
+                                    content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    def test_images_are_stored_by_hash_with_downscaled_variants(self):
+        buffer = io.BytesIO()
+        blog.Image.new('RGB', (1000, 500), 'red').save(buffer, format='PNG')
+        data = buffer.getvalue()
+        
+        first = self.upload(data)
+        again = self.upload(data, filename='copy.png')
+        
+        digest = hashlib.sha256(data).hexdigest()
+        self.assertEqual(first['url'], f'/uploads/{digest}.png')
+        self.assertEqual(again, first)
+        # Never upscaled: the 1600px variant would be larger than the original
+        self.assertEqual(sorted(first['variants']), ['medium', 'thumb'])
+        with blog.Image.open(blog.upload_path(f'{digest}-thumb.png')) as thumb:
+            self.assertEqual(thumb.size, (320, 160))
+        
+        response = self.client.get(first['url'])
+        self.assertEqual(response.data, data)
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        revalidated = self.client.get(first['url'], headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(revalidated.status_code, 304)
+
+
+class ArchiveTests(BlogTestCase):
+    def test_export_import_round_trip(self):
+        users = self.add_users(2)
+        blog.db.session.add_all([blog.Like(user_id=users[1].id, post_filename='hello.md'),
+                                 blog.Like(user_id=users[0].id, post_filename='hello.md')])
+        blog.db.session.commit()
+        self.write_post('hello.md', 'Author: user0\n\n# Hello\n\nWorld')
+        archive_path = os.path.join(self.posts_dir, 'backup.tar.gz')
+        runner = blog.app.test_cli_runner()
+        
+        result = runner.invoke(args=['export-blog', archive_path])
+        self.assertIn('Exported 1 posts, 2 users, 2 likes', result.output)
+        
+        # Restore into an empty database and posts folder; user ids differ
+        blog.db.session.remove()
+        blog.db.drop_all()
+        blog.migrate_db()
+        blog.db.session.add(blog.build_user('someone', 'someone@example.com', 'secret1'))
+        blog.db.session.commit()
+        self.posts_dir = blog.POSTS_DIR = tempfile.mkdtemp(dir=TEST_DIR)
+        
+        result = runner.invoke(args=['import-blog', archive_path])
+        self.assertIn('Read 1 new posts, 2 users, 2 likes', result.output)
+        self.assertEqual(self.read_post('hello.md'), 'Author: user0\n\n# Hello\n\nWorld')
+        likes = blog.db.session.query(blog.User.username).join(
+            blog.Like, blog.Like.user_id == blog.User.id).order_by(blog.User.username).all()
+        self.assertEqual([row[0] for row in likes], ['user0', 'user1'])
+        self.assertTrue(blog.User.query.filter_by(username='user1').one().check_password('secret1'))
+        
+        # Importing again keeps what is already there
+        result = runner.invoke(args=['import-blog', archive_path])
+        self.assertIn('Read 0 new posts', result.output)
+        self.assertEqual(blog.User.query.count(), 3)
+        self.assertEqual(blog.Like.query.count(), 2)
+
+
+class AssetTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache_dir = tempfile.mkdtemp(dir=TEST_DIR)
+        patches = [mock.patch.object(blog, 'ASSET_CACHE_DIR', self.cache_dir),
+                   mock.patch.dict(blog._asset_manifest_state, built=False)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.addCleanup(blog.build_asset_manifest)
+
+    def test_manifest_is_built_on_first_use(self):
+        blog.ASSET_MANIFEST.clear()
+        self.assertEqual(os.listdir(self.cache_dir), [])
+        
+        url = blog.asset_url('style.css')
+        
+        with open(os.path.join(blog.app.static_folder, 'style.css'), 'rb') as f:
+            source = f.read()
+        digest = hashlib.sha256(source).hexdigest()[:12]
+        self.assertEqual(url, f'/assets/style.{digest}.css')
+        self.assertIn(f'style.{digest}.css.gz', os.listdir(self.cache_dir))
+
+    def test_fingerprinted_assets_are_served_precompressed(self):
+        client = blog.app.test_client()
+        url = blog.asset_url('style.css')
+        
+        gzipped = client.get(url, headers={'Accept-Encoding': 'gzip'})
+        plain = client.get(url, headers={'Accept-Encoding': 'identity'})
+        
+        self.assertEqual(gzipped.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(blog.gzip.decompress(gzipped.data), plain.data)
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertIn('immutable', gzipped.headers['Cache-Control'])
+        self.assertEqual(client.get('/assets/style.000000000000.css').status_code, 404)
+
+    def test_large_html_responses_are_compressed(self):
+        for i in range(20):
+            self.write_post(f'post-{i}.md', f'Author: a\n\n# Post number {i}\n\nBody')
+        client = blog.app.test_client()
+        
+        response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+        
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn(b'Post number 7', blog.gzip.decompress(response.data))
+
+
+class RegistrationTests(BlogTestCase):
+    def register(self, username, email):
+        client = blog.app.test_client()
+        response = client.post('/register', data={'username': username, 'email': email,
+                                                  'password': 'secret1', 'confirm_password': 'secret1'})
+        return response, client
+
+    def test_duplicates_are_reported_by_field(self):
+        self.add_users(1)
+        
+        response, _ = self.register('user0', 'new@example.com')
+        self.assertIn(b'Username already exists', response.data)
+        response, _ = self.register('newname', 'user0@example.com')
+        self.assertIn(b'Email already exists', response.data)
+        response, _ = self.register('newname', 'new@example.com')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(blog.User.query.count(), 2)
+
+    def test_provisioning_skips_only_the_conflicting_rows(self):
+        self.add_users(1)
+        rows = [{'username': f'bulk{i}', 'email': f'bulk{i}@example.com', 'password': 'secret1'}
+                for i in range(5)]
+        rows[2]['username'] = 'user0'
+        rows.append({'username': 'short', 'email': 'short@example.com', 'password': '123'})
+        
+        created, failures = blog.provision_users(rows, batch_size=3)
+        
+        self.assertEqual(created, 4)
+        self.assertEqual(failures, [('user0', 'Username already exists'),
+                                    ('short', 'Missing username/email or password shorter than 6 characters')])
+        self.assertEqual(sorted(u.username for u in blog.User.query.all()),
+                         ['bulk0', 'bulk1', 'bulk3', 'bulk4', 'user0'])
+
+
+class AdminUsersTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        admin = blog.build_user('admin', 'admin@example.com', 'secret1', is_admin=True)
+        blog.db.session.add(admin)
+        blog.db.session.commit()
+        self.users = self.add_users(5)
+        self.client = blog.app.test_client()
+        with self.client.session_transaction() as client_session:
+            client_session['user_id'] = admin.id
+
+    def render_context(self, url):
+        """GET an admin page and return the template context instead of HTML"""
+        context = {}
+        
+        def render(template, **kwargs):
+            context.update(kwargs)
+            return ''
+        
+        with mock.patch.object(blog, 'render_template', side_effect=render):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return context
+
+    def test_pages_prefix_search_and_grouped_counts(self):
+        for user in self.users[:2]:
+            blog.db.session.add(blog.Like(user_id=user.id, post_filename='post.md'))
+        blog.db.session.add(blog.Like(user_id=self.users[0].id, post_filename='other.md'))
+        blog.db.session.commit()
+        self.write_post('post.md', 'Author: user0\n\n# Post\n\nBody')
+        self.write_post('other.md', 'Author: user0\n\n# Other\n\nBody')
+        blog._author_post_counts.update(mtime=None, counts={})
+        
+        with mock.patch.object(blog, 'ADMIN_USERS_PER_PAGE', 2):
+            first = self.render_context('/admin/users')
+            searched = self.render_context('/admin/users?q=user')
+            last = self.render_context('/admin/users?q=user&page=3')
+        
+        self.assertEqual([user.username for user in first['users']], ['admin', 'user0'])
+        self.assertEqual(first['pagination'].pages, 3)
+        self.assertEqual(first['stats'], {'total_users': 6, 'total_admins': 1, 'total_regular': 5})
+        self.assertEqual(first['like_counts'], {self.users[0].id: 2})
+        self.assertEqual(first['post_counts'], {'user0': 2})
+        self.assertEqual([user.username for user in searched['users']], ['user0', 'user1'])
+        self.assertEqual(searched['like_counts'], {self.users[0].id: 2, self.users[1].id: 1})
+        self.assertEqual([user.username for user in last['users']], ['user4'])
+
+
+class ApiTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        admin = blog.build_user('admin', 'admin@example.com', 'secret1', is_admin=True)
+        blog.db.session.add(admin)
+        blog.db.session.commit()
+        self.client = blog.app.test_client()
+        with self.client.session_transaction() as client_session:
+            client_session['user_id'] = admin.id
+
+    def test_patch_refuses_to_rename_onto_another_post(self):
+        self.write_post('first.md', 'Author: a\n\n# First\n\nOne')
+        self.write_post('second.md', 'Author: b\n\n# Second\n\nTwo')
+        
+        response = self.client.patch('/api/posts/first', json={'title': 'Second'})
+        
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.read_post('first.md'), 'Author: a\n\n# First\n\nOne')
+        self.assertEqual(self.read_post('second.md'), 'Author: b\n\n# Second\n\nTwo')
+
+    def test_etag_is_weak_across_encodings(self):
+        for i in range(10):
+            self.write_post(f'post-{i}.md', f'Author: a\n\n# Post number {i}\n\nBody')
+        
+        gzipped = self.client.get('/api/posts', headers={'Accept-Encoding': 'gzip'})
+        plain = self.client.get('/api/posts', headers={'Accept-Encoding': 'identity'})
+        
+        self.assertEqual(gzipped.headers['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertIn('Accept-Encoding', gzipped.headers['Vary'])
+        self.assertTrue(gzipped.headers['ETag'].startswith('W/'))
+        self.assertEqual(gzipped.headers['ETag'], plain.headers['ETag'])
+        for encoding in ('gzip', 'identity'):
+            revalidated = self.client.get('/api/posts', headers={
+                'Accept-Encoding': encoding, 'If-None-Match': plain.headers['ETag']})
+            self.assertEqual(revalidated.status_code, 304)
+
+    def test_patch_renames_post(self):
+        self.write_post('first.md', 'Author: a\n\n# First\n\nOne')
+        
+        response = self.client.patch('/api/posts/first', json={'title': 'Renamed'})
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['slug'], 'renamed')
+        self.assertEqual(self.read_post('renamed.md'), 'Author: a\n\n# Renamed\n\nOne')
+
+    def test_malformed_bodies_are_rejected(self):
+        self.write_post('first.md', 'Author: a\n\n# First\n\nOne')
+        bodies = ({'title': 5, 'content': 'Body'}, {'title': 'Title', 'content': ['Body']},
+                  ['Title', 'Body'], 'Title')
+        
+        for body in bodies:
+            with self.subTest(body=body):
+                created = self.client.post('/api/posts', json=body)
+                self.assertEqual(created.status_code, 400)
+                self.assertIn('error', created.get_json())
+                self.assertEqual(self.client.patch('/api/posts/first', json=body).status_code, 400)
+        self.assertEqual(sorted(os.listdir(self.posts_dir)), ['first.md'])
+        self.assertEqual(self.read_post('first.md'), 'Author: a\n\n# First\n\nOne')
+
+
+class RateLimitTests(BlogTestCase):
+    def client(self, address):
+        client = blog.app.test_client()
+        client.environ_base['REMOTE_ADDR'] = address
+        return client
+
+    def login(self, client, username='victim'):
+        return client.post('/login', data={'username': username, 'password': 'wrong'})
+
+    def test_failed_logins_from_one_address_do_not_lock_out_others(self):
+        attacker = self.client('10.0.0.1')
+        victim = self.client('10.0.0.2')
+        
+        statuses = [self.login(attacker).status_code for _ in range(6)]
+        
+        self.assertEqual(statuses[-1], 429)
+        self.assertEqual(self.login(victim).status_code, 200)
+
+    def test_other_usernames_from_same_address_have_own_bucket(self):
+        client = self.client('10.0.0.1')
+        for _ in range(5):
+            self.login(client)
+        
+        self.assertEqual(self.login(client).status_code, 429)
+        self.assertEqual(self.login(client, 'someone-else').status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,24 +7,1157 @@ Features:
 - Monthly salary income management
 - Category-based expense tracking
 - Advanced filtering and visualization
-- CSV data persistence
+- Journaled data persistence with CSV import/export
+- Compact columnar transaction storage
+- Optional SQLite backend: python main.py --sqlite expenses.db
+- Streaming background CSV import (vectorized with pandas when installed)
+- Loading, saving, export and SQLite aggregation run on background workers
+- Income vs expenses by day, week, month, quarter or year (vectorized with NumPy when installed)
 - Sample data for 1 year of transactions
 
-Usage: python main.py
+Usage: python main.py [--sqlite expenses.db]
 """
 
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
+import argparse
 import csv
+import io
+import json
+import math
 import os
-from datetime import datetime, timedelta
+import queue
+import sqlite3
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from collections import defaultdict
 import calendar
+from bisect import bisect_left, insort
+from itertools import compress
+from heapq import merge
+
+# pandas speeds up CSV imports; the csv module is used when it is missing
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+# NumPy (installed along with pandas) vectorizes period totals
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+class RunningTotals:
+    """Totals by type, by category and by month, adjusted as rows change.
+
+    Every mutation costs O(1), so the summary cards and charts read their
+    numbers from here instead of rescanning all transactions.
+    """
+    
+    def __init__(self):
+        self.clear()
+        
+    def clear(self):
+        self.by_type = defaultdict(float)         # type_code -> total
+        self.by_category = defaultdict(float)     # (type_code, category_code) -> total
+        self.by_month = defaultdict(float)        # (type_code, month_key) -> total
+        # Rows behind each key above, so empty buckets can be dropped
+        self.counts = {id(self.by_type): defaultdict(int),
+                       id(self.by_category): defaultdict(int),
+                       id(self.by_month): defaultdict(int)}
+        
+    @staticmethod
+    def month_key(date_ordinal):
+        """Months since year 0, so keys sort chronologically"""
+        day = date.fromordinal(date_ordinal)
+        return day.year * 12 + day.month - 1
+    
+    @staticmethod
+    def month_label(month_key):
+        year, month = divmod(month_key, 12)
+        return f"{calendar.month_abbr[month + 1]} {year}"
+    
+    def _adjust(self, totals, key, amount, step):
+        counts = self.counts[id(totals)]
+        totals[key] += amount
+        counts[key] += step
+        if counts[key] == 0:
+            # Drop empty buckets so deleted categories/months leave the charts
+            del totals[key]
+            del counts[key]
+            
+    def add(self, date_ordinal, amount, category_code, type_code, sign=1):
+        """Count a row in (sign=1) or out of (sign=-1) every total"""
+        self._adjust(self.by_type, type_code, sign * amount, sign)
+        self._adjust(self.by_category, (type_code, category_code), sign * amount, sign)
+        self._adjust(self.by_month, (type_code, self.month_key(date_ordinal)), sign * amount, sign)
+        
+    def remove(self, date_ordinal, amount, category_code, type_code):
+        self.add(date_ordinal, amount, category_code, type_code, sign=-1)
+        
+    def add_many(self, dates, amounts, category_codes, type_codes):
+        """Count a batch of new rows in, touching each bucket once"""
+        month_keys = {}
+        type_totals, category_totals, month_totals = defaultdict(float), defaultdict(float), defaultdict(float)
+        type_counts, category_counts, month_counts = defaultdict(int), defaultdict(int), defaultdict(int)
+        for date_ordinal, amount, category_code, type_code in zip(dates, amounts, category_codes, type_codes):
+            month_key = month_keys.get(date_ordinal)
+            if month_key is None:
+                month_key = month_keys[date_ordinal] = self.month_key(date_ordinal)
+            type_totals[type_code] += amount
+            type_counts[type_code] += 1
+            category_totals[(type_code, category_code)] += amount
+            category_counts[(type_code, category_code)] += 1
+            month_totals[(type_code, month_key)] += amount
+            month_counts[(type_code, month_key)] += 1
+            
+        for totals, batch_totals, batch_counts in ((self.by_type, type_totals, type_counts),
+                                                   (self.by_category, category_totals, category_counts),
+                                                   (self.by_month, month_totals, month_counts)):
+            counts = self.counts[id(totals)]
+            for key, amount in batch_totals.items():
+                totals[key] += amount
+                counts[key] += batch_counts[key]
+
+class PeriodTotals:
+    """Groups amounts by transaction type and period (day, week, month, quarter or year).
+
+    Period keys are integers that sort chronologically: the date ordinal for
+    days, the ordinal of the Monday for weeks, and the RunningTotals month key
+    (or that divided by 3) for months and quarters. With NumPy the date and
+    amount columns are grouped without a Python loop.
+    """
+    
+    PERIODS = ["day", "week", "month", "quarter", "year"]
+    TYPE_BITS = 8   # grouping keys are (period_key << TYPE_BITS) | type_code
+    
+    @staticmethod
+    def key(period, date_ordinal):
+        """Period key of one date ordinal"""
+        if period == "day":
+            return date_ordinal
+        if period == "week":
+            return date_ordinal - (date_ordinal - 1) % 7   # ordinal 1 is a Monday
+        day = date.fromordinal(date_ordinal)
+        if period == "month":
+            return day.year * 12 + day.month - 1
+        if period == "quarter":
+            return day.year * 4 + (day.month - 1) // 3
+        if period == "year":
+            return day.year
+        raise ValueError(f"Unknown period: {period}")
+    
+    @staticmethod
+    def label(period, key):
+        """Short axis/report label for a period key"""
+        if period == "day":
+            return date.fromordinal(key).isoformat()
+        if period == "week":
+            year, week, _ = date.fromordinal(key).isocalendar()
+            return f"W{week:02d} {year}"
+        if period == "month":
+            return RunningTotals.month_label(key)
+        if period == "quarter":
+            year, quarter = divmod(key, 4)
+            return f"Q{quarter + 1} {year}"
+        return str(key)
+    
+    @classmethod
+    def _vector_keys(cls, period, ordinals):
+        if period == "day":
+            return ordinals
+        if period == "week":
+            return ordinals - (ordinals - 1) % 7
+        days = (ordinals - CSVImporter.EPOCH_ORDINAL).astype("datetime64[D]")
+        if period == "year":
+            return days.astype("datetime64[Y]").astype(np.int64) + 1970
+        months = days.astype("datetime64[M]").astype(np.int64) + 1970 * 12
+        if period == "month":
+            return months
+        if period == "quarter":
+            return months // 3
+        raise ValueError(f"Unknown period: {period}")
+    
+    @classmethod
+    def from_columns(cls, period, dates, amounts, type_codes, live):
+        """(type_code, period_key) -> total over the live rows of TransactionStore columns"""
+        if not live:
+            return {}
+        if np is None:
+            return cls._from_columns_loop(period, dates, amounts, type_codes, live)
+        
+        # Zero-copy views over the stdlib arrays
+        mask = np.frombuffer(live, dtype=np.uint8).astype(bool)
+        ordinals = np.frombuffer(dates, dtype=np.intc)[mask].astype(np.int64)
+        values = np.frombuffer(amounts, dtype=np.float64)[mask]
+        codes = np.frombuffer(type_codes, dtype=np.uint8)[mask]
+        
+        groups = (cls._vector_keys(period, ordinals) << cls.TYPE_BITS) | codes
+        unique, inverse = np.unique(groups, return_inverse=True)
+        sums = np.bincount(inverse.ravel(), weights=values, minlength=len(unique))
+        type_mask = (1 << cls.TYPE_BITS) - 1
+        return {(group & type_mask, group >> cls.TYPE_BITS): total
+                for group, total in zip(unique.tolist(), sums.tolist())}
+    
+    @classmethod
+    def _from_columns_loop(cls, period, dates, amounts, type_codes, live):
+        totals = defaultdict(float)
+        keys = {}
+        for date_ordinal, amount, type_code, alive in zip(dates, amounts, type_codes, live):
+            if alive:
+                key = keys.get(date_ordinal)
+                if key is None:
+                    key = keys[date_ordinal] = cls.key(period, date_ordinal)
+                totals[(type_code, key)] += amount
+        return dict(totals)
+
+class TransactionStore:
+    """Columnar transaction storage: one typed array per field instead of a dict per row.
+
+    Dates are kept as date ordinals, amounts as float64, and category/type as
+    small integer codes into dictionary tables. Row ids are stable: deleting a
+    row only clears its live flag, so ids handed to the UI stay valid until
+    compact() drops the deleted rows when the journal writes a snapshot.
+    The columns are stdlib arrays so the store itself works without NumPy;
+    when NumPy is installed (it is in requirements.txt) period totals view
+    them zero-copy.
+    """
+    
+    FIELDS = ["date", "description", "amount", "category", "type"]
+    AGGREGATE_IN_BACKGROUND = False   # totals are kept running, so they are instant
+    
+    ROW_BITS = 32   # date index keys are (date_ordinal << ROW_BITS) | row_id
+    
+    def __init__(self):
+        self.clear()
+        
+    def clear(self):
+        """Remove every transaction"""
+        self.dates = array('i')           # date.toordinal()
+        self.amounts = array('d')
+        self.category_codes = array('H')
+        self.type_codes = array('B')
+        self.live = array('B')            # 0 once the row has been deleted
+        self.descriptions = []
+        self.category_names = []          # code -> name
+        self.category_lookup = {}         # name -> code
+        self.type_names = []
+        self.type_lookup = {}
+        self._interned = {}               # repeated descriptions share one string
+        self.live_count = 0
+        self.totals = RunningTotals()
+        # Filter indexes: category code -> live row ids, and live rows sorted by date
+        self.category_rows = defaultdict(set)
+        self.date_index = array('q')
+        # Bumped on every change; period totals are cached against it
+        self.version = 0
+        self.period_cache = {}            # period -> (version, totals)
+        
+    def __len__(self):
+        return self.live_count
+        
+    def __iter__(self):
+        """Live transactions as dicts, in insertion order (for CSV and reports)"""
+        for row_id in self.row_ids():
+            yield self.get(row_id)
+            
+    def row_ids(self):
+        """Ids of all live rows, in insertion order"""
+        live = self.live
+        return [row_id for row_id in range(len(live)) if live[row_id]]
+    
+    @staticmethod
+    def parse_date(value):
+        """'YYYY-MM-DD' -> date ordinal"""
+        return datetime.strptime(str(value).strip(), "%Y-%m-%d").toordinal()
+    
+    def _code(self, names, lookup, value):
+        """Dictionary-encode a category or type name"""
+        code = lookup.get(value)
+        if code is None:
+            code = len(names)
+            names.append(value)
+            lookup[value] = code
+        return code
+    
+    def category_code(self, name):
+        return self._code(self.category_names, self.category_lookup, name)
+    
+    def type_code(self, name):
+        return self._code(self.type_names, self.type_lookup, name)
+    
+    def _date_key(self, row_id):
+        return (self.dates[row_id] << self.ROW_BITS) | row_id
+    
+    def _index_row(self, row_id):
+        self.category_rows[self.category_codes[row_id]].add(row_id)
+        key = self._date_key(row_id)
+        if not self.date_index or self.date_index[-1] < key:
+            self.date_index.append(key)    # the usual case: newest date last
+        else:
+            insort(self.date_index, key)
+            
+    def _unindex_row(self, row_id):
+        self.category_rows[self.category_codes[row_id]].discard(row_id)
+        del self.date_index[bisect_left(self.date_index, self._date_key(row_id))]
+        
+    def _row_totals_key(self, row_id):
+        return (self.dates[row_id], self.amounts[row_id], self.category_codes[row_id], self.type_codes[row_id])
+    
+    def _encode(self, transaction):
+        description = str(transaction["description"])
+        return (
+            self.parse_date(transaction["date"]),
+            self._interned.setdefault(description, description),
+            float(transaction["amount"]),
+            self.category_code(transaction["category"]),
+            self.type_code(transaction["type"])
+        )
+        
+    def append(self, transaction):
+        """Add a transaction given as a dict of field -> value; returns its row id"""
+        date_ordinal, description, amount, category_code, type_code = self._encode(transaction)
+        self.dates.append(date_ordinal)
+        self.descriptions.append(description)
+        self.amounts.append(amount)
+        self.category_codes.append(category_code)
+        self.type_codes.append(type_code)
+        self.live.append(1)
+        self.live_count += 1
+        self.version += 1
+        row_id = len(self.live) - 1
+        self.totals.add(date_ordinal, amount, category_code, type_code)
+        self._index_row(row_id)
+        return row_id
+    
+    def extend_columns(self, columns):
+        """Bulk append a validated chunk from CSVImporter (dates as ordinals)"""
+        dates = columns["date"]
+        if not dates:
+            return
+        start = len(self.live)
+        category_codes = [self.category_code(name) for name in columns["category"]]
+        type_codes = [self.type_code(name) for name in columns["type"]]
+        interned = self._interned
+        
+        self.dates.extend(dates)
+        self.descriptions.extend([interned.setdefault(text, text) for text in columns["description"]])
+        self.amounts.extend(columns["amount"])
+        self.category_codes.extend(category_codes)
+        self.type_codes.extend(type_codes)
+        self.live.frombytes(b"\x01" * len(dates))
+        self.live_count += len(dates)
+        self.version += 1
+        self.totals.add_many(dates, columns["amount"], category_codes, type_codes)
+        
+        for row_id, code in enumerate(category_codes, start):
+            self.category_rows[code].add(row_id)
+        keys = sorted((date_ordinal << self.ROW_BITS) | row_id for row_id, date_ordinal in enumerate(dates, start))
+        if not self.date_index or self.date_index[-1] < keys[0]:
+            self.date_index.extend(keys)
+        else:
+            self.date_index = array('q', merge(self.date_index, keys))
+            
+    def extend(self, transactions):
+        """Bulk append transaction dicts, building the indexes once rather than per row"""
+        transactions = list(transactions)
+        self.extend_columns({
+            "date": [self.parse_date(transaction["date"]) for transaction in transactions],
+            "description": [str(transaction["description"]) for transaction in transactions],
+            "amount": [float(transaction["amount"]) for transaction in transactions],
+            "category": [transaction["category"] for transaction in transactions],
+            "type": [transaction["type"] for transaction in transactions]
+        })
+        
+    def replace_from_chunks(self, chunks):
+        """Build replacement data from CSVImporter chunks; safe to run off the UI thread.
+
+        Returns (finish, discard). The current data is untouched until finish()
+        is called (on the UI thread), so a failed import leaves it intact;
+        discard() drops the new data of an import cancelled after building it.
+        """
+        fresh = TransactionStore()
+        for columns in chunks:
+            fresh.extend_columns(columns)
+        return (lambda: self.adopt(fresh)), (lambda: None)
+    
+    def adopt(self, other):
+        """Take over another store's data (built off the UI thread)"""
+        self.__dict__.update(other.__dict__)
+        
+    def open_reader(self):
+        """A view for worker threads; it keeps the current arrays even if adopt() or compact() swaps them.
+
+        The arrays are shared, not copied, so the UI refuses edits while a
+        reader job runs (see ExpenseTracker.data_busy).
+        """
+        reader = TransactionStore.__new__(TransactionStore)
+        reader.__dict__.update(self.__dict__)
+        return reader
+    
+
+    def compact(self):
+        """Drop deleted rows and renumber the rest; returns old id -> new id (-1 if deleted).
+
+        Returns None when nothing was deleted. Fresh arrays are built rather
+        than shrinking the current ones, so open readers keep their view.
+        """
+        live = self.live
+        if self.live_count == len(live):
+            return None
+        remap = array('q', [-1]) * len(live)
+        for new_id, old_id in enumerate(compress(range(len(live)), live)):
+            remap[old_id] = new_id
+            
+        self.dates = array('i', compress(self.dates, live))
+        self.amounts = array('d', compress(self.amounts, live))
+        self.category_codes = array('H', compress(self.category_codes, live))
+        self.type_codes = array('B', compress(self.type_codes, live))
+        self.descriptions = list(compress(self.descriptions, live))
+        self.live = array('B', b"\x01" * self.live_count)
+        self._interned = {text: text for text in self.descriptions}
+        self.category_rows = defaultdict(set)
+        for row_id, code in enumerate(self.category_codes):
+            self.category_rows[code].add(row_id)
+        self.date_index = array('q', sorted((date_ordinal << self.ROW_BITS) | row_id
+                                            for row_id, date_ordinal in enumerate(self.dates)))
+        self.version += 1
+        return remap
+    
+    def update(self, row_id, transaction):
+        """Replace the fields of an existing row"""
+        if not self.live[row_id]:
+            raise KeyError(row_id)
+        encoded = self._encode(transaction)
+        self.totals.remove(*self._row_totals_key(row_id))
+        self._unindex_row(row_id)
+        (self.dates[row_id], self.descriptions[row_id], self.amounts[row_id],
+         self.category_codes[row_id], self.type_codes[row_id]) = encoded
+        self.version += 1
+        self.totals.add(*self._row_totals_key(row_id))
+        self._index_row(row_id)
+        
+    def delete(self, row_id):
+        """Delete a row, keeping the ids of the others unchanged"""
+        if not self.live[row_id]:
+            raise KeyError(row_id)
+        self.totals.remove(*self._row_totals_key(row_id))
+        self._unindex_row(row_id)
+        self.live[row_id] = 0
+        self.descriptions[row_id] = ""
+        self.live_count -= 1
+        self.version += 1
+        
+    def get(self, row_id):
+        """Decode one row back into a transaction dict"""
+        return {
+            "date": date.fromordinal(self.dates[row_id]).isoformat(),
+            "description": self.descriptions[row_id],
+            "amount": self.amounts[row_id],
+            "category": self.category_names[self.category_codes[row_id]],
+            "type": self.type_names[self.type_codes[row_id]]
+        }
+    
+    def date_span(self):
+        """(first, last) date ordinal of the live rows, or None when empty"""
+        if not self.date_index:
+            return None
+        return self.date_index[0] >> self.ROW_BITS, self.date_index[-1] >> self.ROW_BITS
+    
+    def rows_between(self, start, end):
+        """Row ids dated start <= date < end (ordinals), found by binary search"""
+        lo = bisect_left(self.date_index, start << self.ROW_BITS)
+        hi = bisect_left(self.date_index, end << self.ROW_BITS)
+        mask = (1 << self.ROW_BITS) - 1
+        return [key & mask for key in self.date_index[lo:hi]]
+    
+    def query(self, category=None, date_ranges=None, min_amount=None, max_amount=None, text=None):
+        """Row ids matching every given filter, in insertion order.
+
+        date_ranges is a list of (start, end) ordinal pairs, end exclusive.
+        Category and date resolve through the indexes; amount and description
+        are then checked on the remaining candidates only.
+        """
+        candidates = None
+        if date_ranges is not None:
+            candidates = set()
+            for start, end in date_ranges:
+                candidates.update(self.rows_between(start, end))
+        if category is not None:
+            rows = self.category_rows.get(self.category_lookup.get(category), set())
+            candidates = set(rows) if candidates is None else candidates & rows
+        if candidates is None:
+            candidates = self.row_ids()
+            
+        if min_amount is not None or max_amount is not None or text:
+            amounts = self.amounts
+            low = float("-inf") if min_amount is None else min_amount
+            high = float("inf") if max_amount is None else max_amount
+            needle = text.casefold() if text else None
+            candidates = [row_id for row_id in candidates
+                          if low <= amounts[row_id] <= high
+                          and (needle is None or needle in self.descriptions[row_id].casefold())]
+        return sorted(candidates)
+    
+    def get_many(self, row_ids):
+        """row id -> transaction dict for a batch of rows (the visible table window)"""
+        return {row_id: self.get(row_id) for row_id in row_ids}
+    
+    def type_totals(self):
+        """type name -> total amount"""
+        return {self.type_names[code]: total for code, total in self.totals.by_type.items()}
+    
+    def category_totals(self, transaction_type):
+        """category name -> total amount for one transaction type"""
+        type_code = self.type_lookup.get(transaction_type)
+        return {self.category_names[category_code]: total
+                for (code, category_code), total in self.totals.by_category.items()
+                if code == type_code}
+    
+    def period_totals(self, period):
+        """(type name, period key) -> total amount; see PeriodTotals for the keys.
+
+        Months come from the running totals. Other periods are grouped over the
+        columns and cached until the next change. Treat the result as read-only.
+        """
+        version = self.version
+        cached = self.period_cache.get(period)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        if period == "month":
+            totals = self.totals.by_month
+        else:
+            totals = PeriodTotals.from_columns(period, self.dates, self.amounts, self.type_codes, self.live)
+        result = {(self.type_names[code], key): total for (code, key), total in totals.items()}
+        self.period_cache[period] = (version, result)
+        return result
+    
+    def summary(self, period="month"):
+        """Everything the summary cards and charts need, in one call"""
+        return {"types": self.type_totals(),
+                "expense_categories": self.category_totals("Expense"),
+                "period": period,
+                "periods": self.period_totals(period)}
+    
+    def close(self):
+        """Nothing to release; persistence is handled by TransactionJournal"""
+
+class SQLiteTransactionStore:
+    """Transactions kept in an SQLite database instead of in memory.
+
+    Offers the methods the UI uses on TransactionStore, but filters and totals
+    run as indexed SQL queries (WHERE / GROUP BY), so a large ledger opens
+    without loading its rows into Python. Every change is committed at once,
+    so this backend needs no journal.
+    """
+    
+    FIELDS = TransactionStore.FIELDS
+    AGGREGATE_IN_BACKGROUND = True    # GROUP BY scans the table
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY,
+            date TEXT NOT NULL,
+            description TEXT NOT NULL,
+            amount REAL NOT NULL,
+            category TEXT NOT NULL,
+            type TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS ix_transactions_date ON transactions (date);
+        CREATE INDEX IF NOT EXISTS ix_transactions_category ON transactions (category, date);
+        CREATE INDEX IF NOT EXISTS ix_transactions_type ON transactions (type, date);
+    """
+    # SQL for the PeriodTotals key of each row's date
+    PERIOD_KEYS = {
+        "day": "date",
+        "week": "date(date, 'weekday 0', '-6 days')",   # the Monday of its ISO week
+        "month": "CAST(strftime('%Y', date) AS INTEGER) * 12 + CAST(strftime('%m', date) AS INTEGER) - 1",
+        "quarter": "CAST(strftime('%Y', date) AS INTEGER) * 4 + (CAST(strftime('%m', date) AS INTEGER) - 1) / 3",
+        "year": "CAST(strftime('%Y', date) AS INTEGER)",
+    }
+    
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(self.SCHEMA)
+        
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+    
+    def __iter__(self):
+        for row in self.conn.execute("SELECT date, description, amount, category, type FROM transactions ORDER BY id"):
+            yield dict(zip(self.FIELDS, row))
+            
+    def row_ids(self):
+        return [row[0] for row in self.conn.execute("SELECT id FROM transactions ORDER BY id")]
+    
+    def _values(self, transaction):
+        """Validate and normalize a transaction into column values"""
+        return (
+            date.fromordinal(TransactionStore.parse_date(transaction["date"])).isoformat(),
+            str(transaction["description"]),
+            float(transaction["amount"]),
+            str(transaction["category"]),
+            str(transaction["type"])
+        )
+    
+    def append(self, transaction):
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO transactions (date, description, amount, category, type) VALUES (?, ?, ?, ?, ?)",
+                self._values(transaction))
+        return cursor.lastrowid
+    
+    def replace_from_chunks(self, chunks):
+        """Replace every row from CSVImporter chunks; safe to run off the UI thread.
+
+        Writes through its own connection in a single SQL transaction and
+        returns (finish, discard) like TransactionStore: finish() commits on
+        the UI thread, so a cancel that lands before then leaves the old rows,
+        and discard() rolls the new ones back. The UI's connection sees either
+        the old rows or all of the new ones.
+        """
+        # Handed to the UI thread to commit or roll back
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        
+        def finish():
+            try:
+                conn.commit()
+            finally:
+                conn.close()
+                
+        def discard():
+            conn.rollback()
+            conn.close()
+            
+        try:
+            conn.execute("DELETE FROM transactions")
+            iso_dates = {}
+            for columns in chunks:
+                dates = [iso_dates.get(ordinal) or iso_dates.setdefault(ordinal, date.fromordinal(ordinal).isoformat())
+                         for ordinal in columns["date"]]
+                conn.executemany(
+                    "INSERT INTO transactions (date, description, amount, category, type) VALUES (?, ?, ?, ?, ?)",
+                    zip(dates, columns["description"], columns["amount"], columns["category"], columns["type"]))
+        except BaseException:
+            discard()
+            raise
+        return finish, discard
+    
+
+    def update(self, row_id, transaction):
+        with self.conn:
+            cursor = self.conn.execute(
+                "UPDATE transactions SET date = ?, description = ?, amount = ?, category = ?, type = ? WHERE id = ?",
+                self._values(transaction) + (row_id,))
+        if cursor.rowcount == 0:
+            raise KeyError(row_id)
+        
+    def delete(self, row_id):
+        with self.conn:
+            cursor = self.conn.execute("DELETE FROM transactions WHERE id = ?", (row_id,))
+        if cursor.rowcount == 0:
+            raise KeyError(row_id)
+        
+    def clear(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM transactions")
+            
+    def get(self, row_id):
+        row = self.conn.execute(
+            "SELECT date, description, amount, category, type FROM transactions WHERE id = ?", (row_id,)).fetchone()
+        if row is None:
+            raise KeyError(row_id)
+        return dict(zip(self.FIELDS, row))
+    
+    def get_many(self, row_ids):
+        row_ids = list(row_ids)
+        result = {}
+        # Stay under SQLite's bound-parameter limit
+        for i in range(0, len(row_ids), 500):
+            chunk = row_ids[i:i + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            for row in self.conn.execute(
+                    f"SELECT id, date, description, amount, category, type FROM transactions WHERE id IN ({placeholders})",
+                    chunk):
+                result[row[0]] = dict(zip(self.FIELDS, row[1:]))
+        return result
+    
+    def date_span(self):
+        first, last = self.conn.execute("SELECT MIN(date), MAX(date) FROM transactions").fetchone()
+        if first is None:
+            return None
+        return TransactionStore.parse_date(first), TransactionStore.parse_date(last)
+    
+    def query(self, category=None, date_ranges=None, min_amount=None, max_amount=None, text=None):
+        """Same filters as TransactionStore.query(), as one indexed SQL query"""
+        clauses, params = [], []
+        if date_ranges is not None:
+            if not date_ranges:
+                return []
+            ranges = []
+            for start, end in date_ranges:
+                ranges.append("(date >= ? AND date < ?)")
+                # An open-ended range runs past date.max; any date sorts below "9999-99-99"
+                end_text = date.fromordinal(end).isoformat() if end <= date.max.toordinal() else "9999-99-99"
+                params.extend([date.fromordinal(start).isoformat(), end_text])
+            clauses.append("(" + " OR ".join(ranges) + ")")
+        if category is not None:
+            clauses.append("category = ?")
+            params.append(category)
+        if min_amount is not None:
+            clauses.append("amount >= ?")
+            params.append(min_amount)
+        if max_amount is not None:
+            clauses.append("amount <= ?")
+            params.append(max_amount)
+        if text:
+            clauses.append("description LIKE ? ESCAPE '\\'")
+            escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            params.append(f"%{escaped}%")
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        return [row[0] for row in self.conn.execute(f"SELECT id FROM transactions{where} ORDER BY id", params)]
+    
+    def type_totals(self):
+        return dict(self.conn.execute("SELECT type, SUM(amount) FROM transactions GROUP BY type"))
+    
+    def category_totals(self, transaction_type):
+        return dict(self.conn.execute(
+            "SELECT category, SUM(amount) FROM transactions WHERE type = ? GROUP BY category", (transaction_type,)))
+    
+    def period_totals(self, period):
+        """GROUP BY the period key in SQL; runs on a worker"""
+        if period not in self.PERIOD_KEYS:
+            raise ValueError(f"Unknown period: {period}")
+        rows = self.conn.execute(
+            f"SELECT type, {self.PERIOD_KEYS[period]} AS period_key, SUM(amount) FROM transactions "
+            "GROUP BY type, period_key")
+        if period in ("day", "week"):
+            # Days and weeks come back as ISO dates; their keys are date ordinals
+            return {(transaction_type, date.fromisoformat(day).toordinal()): total
+                    for transaction_type, day, total in rows}
+        return {(transaction_type, key): total for transaction_type, key, total in rows}
+    
+    def summary(self, period="month"):
+        return {"types": self.type_totals(),
+                "expense_categories": self.category_totals("Expense"),
+                "period": period,
+                "periods": self.period_totals(period)}
+    
+    def open_reader(self):
+        """A separate connection for worker threads (sqlite3 connections are per thread)"""
+        return SQLiteTransactionStore(self.path)
+    
+    def close(self):
+        self.conn.close()
+
+class TransactionJournal:
+    """Append-only persistence: a snapshot of all rows plus a journal of changes since.
+
+    Each add/edit/delete appends one JSON line that is flushed right away and
+    fsynced in batches. Once the journal outgrows the ledger it is compacted
+    into a fresh snapshot. A generation number ties the journal to its
+    snapshot, so a crash during compaction never replays records twice.
+    """
+    
+    def __init__(self, base_path, fsync_every=50, fsync_interval=1.0, min_compact_records=1000):
+        self.snapshot_path = base_path + ".snapshot"
+        self.journal_path = base_path + ".journal"
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.min_compact_records = min_compact_records
+        self.generation = 0
+        self.records = 0          # journal records since the last snapshot
+        self.pending = 0          # records written but not yet fsynced
+        self.last_sync = time.monotonic()
+        self.file = None
+        self.load_error = None    # set when load() fails; writes are then refused
+        
+    def exists(self):
+        return os.path.exists(self.snapshot_path)
+    
+    def load(self, store):
+        """Rebuild the store and open the journal for writing; False if there is no snapshot yet"""
+        needs_snapshot = self.replay(store)
+        if needs_snapshot is None:
+            return False
+        self.open(store, needs_snapshot)
+        return True
+    
+    def replay(self, store):
+        """Rebuild the store from the snapshot and journal without writing anything.
+
+        Safe to run off the UI thread. Returns None if there is no snapshot
+        yet, otherwise whether open() has to write a fresh snapshot. If the
+        files cannot be read, the error is re-raised and the journal refuses
+        every later write, so a partial store never replaces them.
+        """
+        try:
+            return self._replay(store)
+        except Exception as e:
+            self.load_error = e
+            raise
+        
+    def open(self, store, needs_snapshot):
+        """Start appending after replay(): compact first if the replay asked for it"""
+        try:
+            if needs_snapshot:
+                self.compact(store)
+            else:
+                self._check_writable()
+                self._open_journal()
+        except Exception as e:
+            self.load_error = self.load_error or e
+            raise
+        
+    def _check_writable(self):
+        if self.load_error is not None:
+            raise RuntimeError(f"transactions could not be loaded ({self.load_error}), "
+                               "so the saved files are left untouched")
+        
+    def _replay(self, store):
+        if not self.exists():
+            return None
+        
+        # Replay into a dict first and build the store in one pass: appending
+        # row by row would insort every out-of-order date into the index
+        rows = {}   # row id in the files -> transaction, in insertion order
+        with open(self.snapshot_path, 'r', encoding='utf-8') as file:
+            header = json.loads(file.readline())
+            self.generation = header["generation"]
+            for line in file:
+                row = json.loads(line)
+                rows[row[0]] = dict(zip(TransactionStore.FIELDS, row[1:]))
+                
+        replayed = 0
+        torn = False
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'r', encoding='utf-8') as file:
+                header_line = file.readline()
+                # A journal from another generation is already folded into the snapshot
+                if header_line and json.loads(header_line)["generation"] == self.generation:
+                    for line in file:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            torn = True   # last write was cut short by a crash
+                            break
+                        if record["op"] == "add":
+                            rows[record["row"]] = record["transaction"]
+                        elif record["op"] == "edit":
+                            if record["row"] not in rows:
+                                raise KeyError(record["row"])
+                            rows[record["row"]] = record["transaction"]
+                        elif record["op"] == "delete":
+                            del rows[record["row"]]
+                        replayed += 1
+                        
+        store.clear()
+        store.extend(rows.values())
+        
+        # Journal records use store row ids, so start each session from a snapshot
+        # whose ids match this store exactly
+        return bool(replayed or torn or any(file_id != row_id for row_id, file_id in enumerate(rows)))
+    
+    def _write_atomic(self, path, lines):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            file.writelines(lines)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+        
+    def compact(self, store):
+        """Write every live row to a new snapshot and start an empty journal.
+
+        Deleted rows are dropped from the store first, so it does not grow
+        with churn. Returns the old id -> new id map from store.compact(),
+        or None when row ids did not change.
+        """
+        self._check_writable()
+        self.close()
+        remap = store.compact()
+        generation = self.generation + 1
+        
+        def snapshot_lines():
+            yield json.dumps({"generation": generation, "fields": TransactionStore.FIELDS}) + "\n"
+            for row_id in store.row_ids():
+                transaction = store.get(row_id)
+                yield json.dumps([row_id] + [transaction[field] for field in TransactionStore.FIELDS],
+                                 ensure_ascii=False) + "\n"
+                
+        self._write_atomic(self.snapshot_path, snapshot_lines())
+        self.generation = generation
+        self._write_atomic(self.journal_path, [json.dumps({"generation": generation}) + "\n"])
+        self.records = 0
+        self._open_journal()
+        return remap
+        
+    def _open_journal(self):
+        self.file = open(self.journal_path, 'a', encoding='utf-8')
+        
+    def append(self, op, row_id, transaction=None):
+        """Record one 'add', 'edit' or 'delete' of a store row"""
+        self._check_writable()
+        record = {"op": op, "row": row_id}
+        if transaction is not None:
+            record["transaction"] = transaction
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+        self.records += 1
+        self.pending += 1
+        if self.pending >= self.fsync_every or time.monotonic() - self.last_sync >= self.fsync_interval:
+            self.sync()
+            
+    def needs_compaction(self, live_rows):
+        return self.records >= max(self.min_compact_records, live_rows)
+    
+    def sync(self):
+        """fsync records written since the last sync"""
+        if self.file and self.pending:
+            os.fsync(self.file.fileno())
+        self.pending = 0
+        self.last_sync = time.monotonic()
+        
+    def close(self):
+        if self.file:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+class JobCancelled(Exception):
+    """Raised inside a job once it has been cancelled"""
+
+class Job:
+    """Handle for one background job: lets it report progress and notice cancellation"""
+    
+    def __init__(self, worker, key, on_done, on_error, on_progress, on_discard=None):
+        self.worker = worker
+        self.key = key
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.on_discard = on_discard
+        self._cancelled = threading.Event()
+        
+    def cancel(self):
+        self._cancelled.set()
+        
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+    
+    def check(self):
+        """Call between steps of long work; stops the job if it was cancelled"""
+        if self._cancelled.is_set():
+            raise JobCancelled()
+        
+    def progress(self, *values):
+        """Report progress; on_progress(*values) runs on the Tk thread"""
+        self.worker.results.put((self, "progress", values))
+
+class BackgroundWorker:
+    """Runs jobs on a thread pool and delivers their results on the Tk thread.
+
+    Jobs never touch Tk: progress, results and errors go through a queue that
+    root.after drains every poll_ms. Submitting a job with the key of one
+    still pending cancels the older job, so bursts of identical refresh
+    requests coalesce and only the newest result is delivered.
+    """
+    
+    def __init__(self, root, max_workers=2, poll_ms=50):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="expense-worker")
+        self.results = queue.Queue()
+        self.pending = {}   # key -> newest Job submitted under it
+        self.root.after(self.poll_ms, self._poll)
+        
+    def submit(self, func, *args, key=None, on_done=None, on_error=None, on_progress=None, on_discard=None):
+        """Run func(job, *args) on a worker thread; callbacks run on the Tk thread.
+
+        A job cancelled after it already returned gets its result passed to
+        on_discard instead of on_done, so it can release what it built.
+        """
+        if key is not None and key in self.pending:
+            self.pending[key].cancel()
+        job = Job(self, key, on_done, on_error, on_progress, on_discard)
+        if key is not None:
+            self.pending[key] = job
+        self.executor.submit(self._run, job, func, args)
+        return job
+    
+    def is_pending(self, key):
+        return key in self.pending
+    
+    def cancel(self, key):
+        if key in self.pending:
+            self.pending[key].cancel()
+            
+    def _run(self, job, func, args):
+        try:
+            job.check()   # superseded while still queued
+            self.results.put((job, "done", func(job, *args)))
+        except JobCancelled:
+            self.results.put((job, "cancelled", None))
+        except Exception as e:
+            self.results.put((job, "error", e))
+            
+    def _poll(self):
+        try:
+            while True:
+                job, kind, value = self.results.get_nowait()
+                if kind == "progress":
+                    if job.on_progress and not job.cancelled:
+                        job.on_progress(*value)
+                    continue
+                    
+                if job.key is not None and self.pending.get(job.key) is job:
+                    del self.pending[job.key]
+                if job.cancelled:
+                    if kind == "done" and job.on_discard:
+                        job.on_discard(value)
+                    continue
+                if kind == "done" and job.on_done:
+                    job.on_done(value)
+                elif kind == "error":
+                    if job.on_error:
+                        job.on_error(value)
+                    else:
+                        messagebox.showerror("Error", str(value))
+        except queue.Empty:
+            pass
+        self.root.after(self.poll_ms, self._poll)
+        
+    def shutdown(self):
+        for job in self.pending.values():
+            job.cancel()
+        self.executor.shutdown(wait=False)
+
+class CSVImporter:
+    """Streams a transactions CSV in chunks with bulk parsing, validation and dedupe.
+
+    With pandas, dates and amounts are converted a whole chunk at a time;
+    otherwise the csv module is used row by row. Rows with a bad date or
+    amount (including nan and inf) are skipped, exact duplicate rows are
+    dropped only when dedupe is set, and progress(fraction, rows_read) is
+    called after every chunk.
+    """
+    
+    CHUNK_ROWS = 100000
+    EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+    
+    def __init__(self, path, progress=None, chunk_rows=CHUNK_ROWS, dedupe=False):
+        self.path = path
+        self.progress = progress
+        self.chunk_rows = chunk_rows
+        self.dedupe = dedupe   # repeated rows can be real, e.g. two identical purchases a day
+        self.rows_read = 0
+        self.imported = 0
+        self.invalid = 0
+        self.duplicates = 0
+        self._seen = set()   # hashes of rows already imported
+        
+    def summary(self):
+        skipped = []
+        if self.invalid:
+            skipped.append(f"{self.invalid:,} invalid")
+        if self.duplicates:
+            skipped.append(f"{self.duplicates:,} exact duplicate")
+        return f"{self.imported:,} transactions" + (f" (skipped {' and '.join(skipped)} rows)" if skipped else "")
+    
+    def chunks(self):
+        """Yield dicts of column lists: date ordinals, descriptions, amounts, categories, types"""
+        size = os.path.getsize(self.path) or 1
+        # Binary handle: its position is the progress, whichever parser reads it
+        with open(self.path, 'rb') as file:
+            parse = self._pandas_chunks if pd is not None else self._csv_chunks
+            for columns in parse(file):
+                self.imported += len(columns["date"])
+                if self.progress:
+                    self.progress(min(1.0, file.tell() / size), self.rows_read)
+                yield columns
+                
+    @staticmethod
+    def parse_amount(value):
+        """Amount text -> finite float, accepting the same text as pd.to_numeric"""
+        amount = float(value)
+        if not math.isfinite(amount) or "_" in value:
+            raise ValueError(f"invalid amount: {value!r}")
+        return amount
+    
+    def _check_columns(self, names):
+        missing = [field for field in TransactionStore.FIELDS if field not in names]
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(missing)}")
+        
+    def _unseen(self, keys):
+        """Keep-mask for a chunk: False for rows seen earlier in the file"""
+        seen = self._seen
+        keep = []
+        for key in keys:
+            if key in seen:
+                keep.append(False)
+            else:
+                seen.add(key)
+                keep.append(True)
+        self.duplicates += keep.count(False)
+        return keep
+    
+    def _pandas_chunks(self, file):
+        reader = pd.read_csv(file, encoding='utf-8', dtype=str, keep_default_na=False, chunksize=self.chunk_rows)
+        for frame in reader:
+            self._check_columns(frame.columns)
+            self.rows_read += len(frame)
+            
+            dates = pd.to_datetime(frame["date"].str.strip(), format="%Y-%m-%d", errors="coerce")
+            amounts = pd.to_numeric(frame["amount"], errors="coerce")
+            valid = dates.notna().to_numpy() & np.isfinite(amounts.to_numpy(dtype="float64"))
+            self.invalid += int((~valid).sum())
+            
+            frame = pd.DataFrame({
+                "date": dates[valid].to_numpy().astype("datetime64[D]").astype("int64") + self.EPOCH_ORDINAL,
+                "description": frame["description"].to_numpy()[valid],
+                "amount": amounts[valid].to_numpy(dtype="float64"),
+                "category": frame["category"].to_numpy()[valid],
+                "type": frame["type"].to_numpy()[valid]
+            })
+            if self.dedupe:
+                # A boolean array, so a chunk with no valid rows is not read as a column list
+                keep = self._unseen(pd.util.hash_pandas_object(frame, index=False).tolist())
+                frame = frame[np.array(keep, dtype=bool)]
+            yield {field: frame[field].tolist() for field in TransactionStore.FIELDS}
+            
+    def _csv_chunks(self, file):
+        reader = csv.DictReader(io.TextIOWrapper(file, encoding='utf-8', newline=''))
+        self._check_columns(reader.fieldnames or [])
+        columns = {field: [] for field in TransactionStore.FIELDS}
+        for row in reader:
+            self.rows_read += 1
+            try:
+                values = (TransactionStore.parse_date(row["date"]), row["description"],
+                          self.parse_amount(row["amount"]), row["category"], row["type"])
+            except (ValueError, TypeError):
+                self.invalid += 1
+                continue
+            if self.dedupe and not self._unseen([hash(values)])[0]:
+                continue
+            for field, value in zip(TransactionStore.FIELDS, values):
+                columns[field].append(value)
+            if len(columns["date"]) >= self.chunk_rows:
+                yield columns
+                columns = {field: [] for field in TransactionStore.FIELDS}
+        if columns["date"]:
+            yield columns
 
 class ExpenseTracker:
-    def __init__(self, root):
+    def __init__(self, root, db_path=None):
         self.root = root
         self.root.title("💰 Expense Tracker")
         self.root.geometry("1600x1000")
@@ -40,8 +1173,14 @@ class ExpenseTracker:
         plt.rcParams['axes.labelsize'] = 10
         
         # Data storage
-        self.transactions = []
         self.csv_file = "transactions.csv"
+        if db_path:
+            # SQLite commits every change itself
+            self.transactions = SQLiteTransactionStore(db_path)
+            self.journal = None
+        else:
+            self.transactions = TransactionStore()
+            self.journal = TransactionJournal("transactions")
         self.categories = [
             "Groceries", "Rent", "School Fees", "Electricity", "Travel", 
             "Savings", "Entertainment", "Healthcare", "Shopping", "Bills",
@@ -54,13 +1193,20 @@ class ExpenseTracker:
         # Monthly salary (fixed)
         self.monthly_salary = 50000
         
-        # Load existing transactions
-        self.load_transactions()
+        # Heavy work (loading, import, export, SQLite aggregates) runs here
+        self.worker = BackgroundWorker(self.root)
         
         # Create GUI
         self.create_widgets()
         self.update_display()
         
+        # Load existing transactions behind the (empty) window
+        self.load_transactions()
+        
+        # Flush batched journal writes to disk periodically and on exit
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.after(1000, self._sync_journal)
+        
     def create_widgets(self):
         # Create main scrollable canvas
         self.main_canvas = tk.Canvas(self.root, bg="#f0f8ff")  # Cooler light blue background
@@ -328,6 +1474,25 @@ class ExpenseTracker:
         )
         clear_filter_button.pack(side="left", padx=10)
         
+        # Date range, amount range and description search
+        filter_ranges = tk.Frame(filter_frame, bg="#ffffff")
+        filter_ranges.pack(pady=(0, 15))
+        
+        self.filter_from_var = tk.StringVar()
+        self.filter_to_var = tk.StringVar()
+        self.filter_min_var = tk.StringVar()
+        self.filter_max_var = tk.StringVar()
+        self.filter_text_var = tk.StringVar()
+        for label, var, width in [("From (YYYY-MM-DD):", self.filter_from_var, 12),
+                                  ("To:", self.filter_to_var, 12),
+                                  ("Min ₹:", self.filter_min_var, 10),
+                                  ("Max ₹:", self.filter_max_var, 10),
+                                  ("Description:", self.filter_text_var, 20)]:
+            tk.Label(filter_ranges, text=label, bg="#ffffff", font=("Segoe UI", 11, "bold"), fg="#374151").pack(side="left", padx=10)
+            entry = tk.Entry(filter_ranges, textvariable=var, width=width, font=("Segoe UI", 11), relief="flat", bd=2, bg="#f1f5f9", fg="#1f2937")
+            entry.pack(side="left", padx=5)
+            entry.bind("<Return>", lambda e: self.apply_filter())
+        
         # Bind hover effects
         apply_filter_button.bind("<Enter>", lambda e: apply_filter_button.configure(bg="#d97706"))
         apply_filter_button.bind("<Leave>", lambda e: apply_filter_button.configure(bg="#f59e0b"))
@@ -371,17 +1536,37 @@ class ExpenseTracker:
             else:
                 self.tree.column(col, width=130, anchor="center")
         
+        # Virtual scrolling: only the visible window of view_rows (plus a few
+        # overscan rows) exists as Treeview items; the scrollbar maps onto offsets
+        self.view_rows = []          # store row ids in display order
+        self.view_offset = 0         # index in view_rows of the top visible row
+        self.view_window_start = 0   # index in view_rows of the first materialized item
+        self.table_values = {}       # item id -> (values, tag) last written to Tk
+        self.table_overscan = 5
+        self.table_page = int(self.tree.cget("height"))   # rows that fit; resized on <Configure>
+        self.table_row_metrics = None                     # (row height, heading height) in pixels
+        self.view_filters = None     # query() arguments of the filtered view, None for all rows
+        
         # Scrollbar
-        scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.table_scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=self.on_table_scroll)
         
         # Pack treeview and scrollbar
         self.tree.pack(side="left", fill="both", expand=True)
-        scrollbar.pack(side="right", fill="y")
+        self.table_scrollbar.pack(side="right", fill="y")
         
         # Bind double-click to edit
         self.tree.bind("<Double-1>", self.edit_transaction)
         
+        # The window holds as many rows as the tree's current height fits
+        self.tree.bind("<Configure>", lambda e: self.update_table_page())
+        
+        # Wheel and arrow keys move the virtual window instead of Tk's own view
+        self.tree.bind("<MouseWheel>", self._on_table_mousewheel)
+        self.tree.bind("<Button-4>", self._on_table_mousewheel)
+        self.tree.bind("<Button-5>", self._on_table_mousewheel)
+        self.tree.bind("<Up>", lambda e: self._move_table_selection(-1))
+        self.tree.bind("<Down>", lambda e: self._move_table_selection(1))
+        
         # Configure alternating row colors with cooler colors
         self.tree.tag_configure("oddrow", background="#f8fafc")
         self.tree.tag_configure("evenrow", background="#ffffff")
@@ -421,14 +1606,41 @@ class ExpenseTracker:
         bar_frame = tk.Frame(charts_container, bg="#ffffff")
         bar_frame.pack(side="right", padx=20)
         
-        bar_title = tk.Label(bar_frame, text="Monthly Income vs Expenses", font=("Segoe UI", 14, "bold"), bg="#ffffff", fg="#1e3a8a")
-        bar_title.pack(pady=(0, 15))
+        bar_header = tk.Frame(bar_frame, bg="#ffffff")
+        bar_header.pack(pady=(0, 15))
+        
+        self.bar_title = tk.Label(bar_header, text="Monthly Income vs Expenses", font=("Segoe UI", 14, "bold"), bg="#ffffff", fg="#1e3a8a")
+        self.bar_title.pack(side="left")
+        
+        # Period the bars are grouped by (also used for the report's period totals)
+        self.chart_periods = {"day": "Daily", "week": "Weekly", "month": "Monthly", "quarter": "Quarterly", "year": "Yearly"}
+        self.chart_period = "month"
+        self.chart_period_var = tk.StringVar(value=self.chart_periods[self.chart_period])
+        period_combo = ttk.Combobox(bar_header, textvariable=self.chart_period_var, values=list(self.chart_periods.values()), width=12, state="readonly")
+        period_combo.pack(side="left", padx=10)
+        period_combo.bind("<<ComboboxSelected>>", self.on_chart_period_change)
         
         # Create matplotlib figure for bar chart with better styling
         self.fig_bar, self.ax_bar = plt.subplots(figsize=(10, 6), facecolor='#ffffff')
         self.canvas_bar = FigureCanvasTkAgg(self.fig_bar, bar_frame)
         self.canvas_bar.get_tk_widget().pack()
         
+        # Chart refreshes are coalesced per frame and reuse the existing artists
+        self.chart_refresh_ms = 100
+        self.chart_refresh_id = None
+        self.pending_chart_data = None
+        self.drawn_expense_data = None
+        self.drawn_period_totals = None
+        self.pie_artists = None    # (categories, wedges, labels, percentage texts)
+        self.bar_artists = None    # ((period, keys), income bars, expense bars, income labels, expense labels)
+        self.max_bar_labels = 24   # more bars than this: thin the ticks and hide value labels
+        
+    def on_chart_period_change(self, event=None):
+        name = self.chart_period_var.get()
+        self.chart_period = next(period for period, label in self.chart_periods.items() if label == name)
+        self.bar_title.config(text=f"{name} Income vs Expenses")
+        self.update_summary()
+        
     def create_buttons_frame(self):
         """Create buttons frame with better organization and center alignment"""
         buttons_frame = tk.Frame(self.scrollable_frame, bg="#f0f8ff")
@@ -498,6 +1710,26 @@ class ExpenseTracker:
         )
         sample_button.pack(side="left", padx=8)
         
+        # Background task status (e.g. CSV import progress)
+        self.status_var = tk.StringVar()
+        status_label = tk.Label(left_buttons, textvariable=self.status_var, bg="#f0f8ff", font=("Segoe UI", 11), fg="#475569")
+        status_label.pack(side="left", padx=15)
+        
+        # Cancel button, shown only while a cancellable job runs
+        self.cancel_button = tk.Button(
+            left_buttons,
+            text="✖ Cancel",
+            command=self.cancel_background_job,
+            bg="#94a3b8",
+            fg="white",
+            font=("Segoe UI", 10, "bold"),
+            relief="flat",
+            padx=12,
+            pady=4,
+            cursor="hand2"
+        )
+        self.cancel_key = None
+        
         # Right side button with better styling
         clear_all_button = tk.Button(
             buttons_frame, 
@@ -530,7 +1762,22 @@ class ExpenseTracker:
         }
         return color_map.get(original_color, original_color)
 
+    def data_busy(self):
+        """Warn and return True while a job is replacing or reading the data, or after a failed load"""
+        # Save and export iterate the live arrays through open_reader(), so edits wait for them too
+        for key, action in (("load", "loading"), ("import", "importing"), ("save", "saving"), ("export", "exporting")):
+            if self.worker.is_pending(key):
+                messagebox.showwarning("Warning", f"Please wait until {action} finishes")
+                return True
+        if self.journal is not None and self.journal.load_error is not None:
+            messagebox.showerror("Error", f"Transactions could not be loaded, so editing is disabled "
+                                          f"to keep the saved files intact: {str(self.journal.load_error)}")
+            return True
+        return False
+    
     def add_transaction(self):
+        if self.data_busy():
+            return
         description = self.description_entry.get().strip()
         amount_str = self.amount_entry.get().strip()
         category = self.category_var.get()
@@ -566,15 +1813,16 @@ class ExpenseTracker:
             "type": transaction_type
         }
         
-        self.transactions.append(transaction)
+        row_id = self.transactions.append(transaction)
         
         # Clear input fields
         self.description_entry.delete(0, tk.END)
         self.amount_entry.delete(0, tk.END)
         
-        # Update display
-        self.update_display()
-        self.save_transactions()
+        # Update display: one new table row plus the totals
+        self.append_table_row(row_id)
+        self.update_summary()
+        self.journal_change("add", row_id)
         
         messagebox.showinfo("Success", "Transaction added successfully!")
         
@@ -652,22 +1900,34 @@ class ExpenseTracker:
         
         # Save button with better styling
         def save_changes():
+            if self.data_busy():
+                return
             try:
                 new_amount = float(amount_entry.get())
                 if new_amount <= 0:
                     messagebox.showerror("Error", "Amount must be greater than 0")
                     return
                     
-                # Update transaction
-                index = self.tree.index(selection[0])
-                self.transactions[index]["description"] = desc_entry.get()
-                self.transactions[index]["amount"] = new_amount
-                self.transactions[index]["category"] = cat_var.get()
-                self.transactions[index]["type"] = type_var.get()
-                self.transactions[index]["date"] = date_entry.get()
+                try:
+                    TransactionStore.parse_date(date_entry.get())
+                except ValueError:
+                    messagebox.showerror("Error", "Please enter a valid date (YYYY-MM-DD)")
+                    return
+                    
+                # Update transaction (tree item ids are store row ids)
+                row_id = int(selection[0])
+                self.transactions.update(row_id, {
+                    "date": date_entry.get(),
+                    "description": desc_entry.get(),
+                    "amount": new_amount,
+                    "category": cat_var.get(),
+                    "type": type_var.get()
+                })
                 
-                self.update_display()
-                self.save_transactions()
+                # Only the edited row's item is rewritten
+                self.render_table_window()
+                self.update_summary()
+                self.journal_change("edit", row_id)
                 edit_window.destroy()
                 messagebox.showinfo("Success", "Transaction updated successfully!")
                 
@@ -714,63 +1974,237 @@ class ExpenseTracker:
         month_filter = self.filter_month_var.get()
         year_filter = self.filter_year_var.get()
         
-        # Clear current display
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        # Parse the free-form filters
+        try:
+            start = TransactionStore.parse_date(self.filter_from_var.get()) if self.filter_from_var.get().strip() else None
+            end = TransactionStore.parse_date(self.filter_to_var.get()) + 1 if self.filter_to_var.get().strip() else None
+        except ValueError:
+            messagebox.showerror("Error", "Please enter a valid date (YYYY-MM-DD)")
+            return
+        try:
+            min_amount = float(self.filter_min_var.get()) if self.filter_min_var.get().strip() else None
+            max_amount = float(self.filter_max_var.get()) if self.filter_max_var.get().strip() else None
+        except ValueError:
+            messagebox.showerror("Error", "Please enter a valid amount")
+            return
         
-        # Apply filters
-        filtered_transactions = []
-        for transaction in self.transactions:
-            # Category filter
-            if category_filter != "All" and transaction["category"] != category_filter:
-                continue
-                
-            # Month filter
-            if month_filter != "All":
-                transaction_date = datetime.strptime(transaction["date"], "%Y-%m-%d")
-                if calendar.month_name[transaction_date.month] != month_filter:
-                    continue
-                    
-            # Year filter
+        # Month/year/date filters become date ranges over the date index
+        date_ranges = self.filter_date_ranges(month_filter, year_filter, start, end)
+        
+        # Display filtered transactions; new rows are checked against the same filters
+        self.view_filters = {
+            "category": None if category_filter == "All" else category_filter,
+            "date_ranges": date_ranges,
+            "min_amount": min_amount,
+            "max_amount": max_amount,
+            "text": self.filter_text_var.get().strip()
+        }
+        self.display_transactions(self.transactions.query(**self.view_filters))
+        
+    def filter_date_ranges(self, month_filter, year_filter, start=None, end=None):
+        """(start, end) ordinal ranges selected by the month/year combos and date entries"""
+        ranges = None
+        if month_filter != "All" or year_filter != "All":
+            span = self.transactions.date_span()
+            if span is None:
+                return []
             if year_filter != "All":
-                transaction_date = datetime.strptime(transaction["date"], "%Y-%m-%d")
-                if str(transaction_date.year) != year_filter:
-                    continue
+                years = [int(year_filter)]
+            else:
+                years = range(date.fromordinal(span[0]).year, date.fromordinal(span[1]).year + 1)
             
-            filtered_transactions.append(transaction)
-        
-        # Display filtered transactions
-        self.display_transactions(filtered_transactions)
+            if month_filter != "All":
+                # One range per year for a month like "March" of any year
+                month = list(calendar.month_name).index(month_filter)
+                ranges = []
+                for year in years:
+                    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+                    ranges.append((date(year, month, 1).toordinal(), date(next_year, next_month, 1).toordinal()))
+            else:
+                ranges = [(date(years[0], 1, 1).toordinal(), date(years[0] + 1, 1, 1).toordinal())]
+                
+        if start is not None or end is not None:
+            start = 1 if start is None else start
+            end = date.max.toordinal() + 1 if end is None else end
+            if ranges is None:
+                ranges = [(start, end)]
+            else:
+                ranges = [(max(lo, start), min(hi, end)) for lo, hi in ranges if max(lo, start) < min(hi, end)]
+        return ranges
         
     def clear_filter(self):
         self.filter_category_var.set("All")
         self.filter_month_var.set("All")
         self.filter_year_var.set("All")
+        for var in (self.filter_from_var, self.filter_to_var, self.filter_min_var,
+                    self.filter_max_var, self.filter_text_var):
+            var.set("")
         self.update_display()
         
-    def display_transactions(self, transactions):
-        # Clear current display
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+    def display_transactions(self, row_ids):
+        """Show the given store rows from the top of the table"""
+        self.view_rows = list(row_ids)
+        self.view_offset = 0
+        self.render_table_window()
         
-        # Add transactions with alternating colors
-        for i, transaction in enumerate(transactions):
-            tag = "evenrow" if i % 2 == 0 else "oddrow"
-            self.tree.insert("", "end", values=(
+    def append_table_row(self, row_id):
+        """Show a new row: appended to an unfiltered view, otherwise the filter is re-run"""
+        if self.view_filters is None:
+            self.view_rows.append(row_id)
+        else:
+            self.view_rows = self.transactions.query(**self.view_filters)
+        self.render_table_window()
+        
+    def measure_table_rows(self):
+        """(row height, heading height) taken from a visible item, or None before one is drawn"""
+        if self.table_row_metrics is None:
+            # The first item with a bounding box is the top visible row, just below the headings
+            for iid in self.tree.get_children():
+                bbox = self.tree.bbox(iid)
+                if bbox:
+                    self.table_row_metrics = (bbox[3], bbox[1])
+                    break
+        return self.table_row_metrics
+    
+    def update_table_page(self):
+        """Fit the virtual window to the tree's height, which grows with the window"""
+        metrics = self.measure_table_rows()
+        height = self.tree.winfo_height()
+        if metrics is None or height <= 1:
+            return
+        row_height, heading_height = metrics
+        page = max(1, (height - heading_height) // row_height)
+        if page != self.table_page:
+            self.table_page = page
+            self.render_table_window()
+        
+    def remap_table_rows(self, remap):
+        """Follow a store compaction: renumber the view and rebuild its items"""
+        if remap is None:
+            return
+        self.view_rows = [remap[row_id] for row_id in self.view_rows if remap[row_id] >= 0]
+        self.tree.delete(*self.tree.get_children())
+        self.table_values = {}
+        self.render_table_window()
+        
+    def render_table_window(self):
+        """Materialize the visible slice of view_rows, touching only items that changed"""
+        store = self.transactions
+        total = len(self.view_rows)
+        page = self.table_page
+        self.view_offset = max(0, min(self.view_offset, total - page))
+        start = max(0, self.view_offset - self.table_overscan)
+        end = min(total, self.view_offset + page + self.table_overscan)
+        self.view_window_start = start
+        wanted = [str(row_id) for row_id in self.view_rows[start:end]]
+        wanted_set = set(wanted)
+        
+        # Drop items that scrolled out of the window
+        current = self.tree.get_children()
+        stale = [iid for iid in current if iid not in wanted_set]
+        if stale:
+            self.tree.delete(*stale)
+            for iid in stale:
+                self.table_values.pop(iid, None)
+        kept = [iid for iid in wanted if iid in self.table_values]
+        reorder = [iid for iid in current if iid in wanted_set] != kept
+        
+        # Insert new items and rewrite only rows whose text or stripe changed
+        rows = store.get_many(self.view_rows[start:end])
+        for position, iid in enumerate(wanted):
+            transaction = rows[int(iid)]
+            values = (
                 transaction["date"],
                 transaction["description"],
                 f"₹{transaction['amount']:,.2f}",
                 transaction["category"],
                 transaction["type"]
-            ), tags=(tag,))
+            )
+            tag = "evenrow" if (start + position) % 2 == 0 else "oddrow"
+            cached = self.table_values.get(iid)
+            if cached is None:
+                self.tree.insert("", position, iid=iid, values=values, tags=(tag,))
+            else:
+                if cached != (values, tag):
+                    self.tree.item(iid, values=values, tags=(tag,))
+                if reorder:
+                    self.tree.move(iid, "", position)
+            self.table_values[iid] = (values, tag)
+            
+        # Line Tk's view up with the top visible row and size the scrollbar thumb
+        self.tree.yview_moveto(0)
+        if self.view_offset > start:
+            self.tree.yview_scroll(self.view_offset - start, "units")
+        if total:
+            self.table_scrollbar.set(self.view_offset / total, min(1.0, (self.view_offset + page) / total))
+        else:
+            self.table_scrollbar.set(0.0, 1.0)
+        # Row height is only known once an item is drawn; fit the page then
+        if self.table_row_metrics is None and wanted:
+            self.tree.after_idle(self.update_table_page)
+            
+    def on_table_scroll(self, action, amount, unit=None):
+        """Scrollbar callback: map 'moveto'/'scroll' onto a row offset"""
+        if action == "moveto":
+            self.view_offset = int(float(amount) * len(self.view_rows))
+        elif action == "scroll":
+            step = self.table_page if unit == "pages" else 1
+            self.view_offset += int(amount) * step
+        self.render_table_window()
+        
+    def _on_table_mousewheel(self, event):
+        direction = -1 if event.num == 4 or event.delta > 0 else 1
+        self.on_table_scroll("scroll", direction * 3, "units")
+        return "break"
+    
+    def _move_table_selection(self, step):
+        """Move the selection with the arrow keys, scrolling the window to follow it"""
+        if not self.view_rows:
+            return "break"
+        focus = self.tree.focus()
+        if focus and self.tree.exists(focus):
+            index = self.view_window_start + self.tree.index(focus) + step
+        else:
+            index = self.view_offset
+        index = max(0, min(index, len(self.view_rows) - 1))
+        
+        page = self.table_page
+        if index < self.view_offset:
+            self.view_offset = index
+        elif index >= self.view_offset + page:
+            self.view_offset = index - page + 1
+        self.render_table_window()
+        
+        iid = str(self.view_rows[index])
+        self.tree.selection_set(iid)
+        self.tree.focus(iid)
+        return "break"
             
     def update_display(self):
         # Update transactions table
-        self.display_transactions(self.transactions)
-        
+        self.view_filters = None
+        self.display_transactions(self.transactions.row_ids())
+        self.update_summary()
+        
+    def update_summary(self):
+        """Refresh the summary cards and charts; SQLite totals are computed on a worker"""
+        if self.transactions.AGGREGATE_IN_BACKGROUND:
+            # Coalesced: a newer request cancels one that has not finished
+            self.worker.submit(self._summary_job, self.chart_period, key="summary", on_done=self.show_summary)
+        else:
+            self.show_summary(self.transactions.summary(self.chart_period))
+            
+    def _summary_job(self, job, period):
+        reader = self.transactions.open_reader()
+        try:
+            return reader.summary(period)
+        finally:
+            reader.close()
+            
+    def show_summary(self, summary):
         # Update summary
-        total_income = sum(t["amount"] for t in self.transactions if t["type"] == "Income")
-        total_expenses = sum(t["amount"] for t in self.transactions if t["type"] == "Expense")
+        total_income = summary["types"].get("Income", 0.0)
+        total_expenses = summary["types"].get("Expense", 0.0)
         balance = total_income - total_expenses
         
         self.income_label.config(text=f"Total Income: ₹{total_income:,.2f}")
@@ -778,19 +2212,39 @@ class ExpenseTracker:
         self.balance_label.config(text=f"Balance: ₹{balance:,.2f}")
         
         # Update charts
-        self.update_pie_chart()
-        self.update_bar_chart()
+        self.schedule_chart_refresh(summary["expense_categories"], (summary["period"], summary["periods"]))
+        
+    def schedule_chart_refresh(self, expense_data, period_totals):
+        """Redraw the charts at most once per chart_refresh_ms, with the latest data"""
+        self.pending_chart_data = (expense_data, period_totals)
+        if self.chart_refresh_id is None:
+            self.chart_refresh_id = self.root.after(self.chart_refresh_ms, self._refresh_charts)
+            
+    def _refresh_charts(self):
+        self.chart_refresh_id = None
+        expense_data, (period, period_totals) = self.pending_chart_data
+        self.pending_chart_data = None
+        
+        # Charts whose numbers did not change are left alone
+        if expense_data != self.drawn_expense_data:
+            self.update_pie_chart(expense_data)
+            self.drawn_expense_data = dict(expense_data)
+        if (period, period_totals) != self.drawn_period_totals:
+            self.update_bar_chart(period_totals, period)
+            self.drawn_period_totals = (period, dict(period_totals))
+            
+    def update_pie_chart(self, expense_data):
+        # Same categories as the drawn chart: move the existing wedges and labels
+        categories = list(expense_data.keys())
+        if self.pie_artists is not None and self.pie_artists[0] == categories and sum(expense_data.values()) > 0:
+            self._move_pie_wedges(list(expense_data.values()))
+            self.canvas_pie.draw_idle()
+            return
+        self.pie_artists = None
         
-    def update_pie_chart(self):
         # Clear previous chart
         self.ax_pie.clear()
         
-        # Get expense data by category
-        expense_data = defaultdict(float)
-        for transaction in self.transactions:
-            if transaction["type"] == "Expense":
-                expense_data[transaction["category"]] += transaction["amount"]
-        
         if not expense_data:
             self.ax_pie.text(0.5, 0.5, "No expense data", ha="center", va="center", 
                             transform=self.ax_pie.transAxes, fontsize=16, color='#1e3a8a')
@@ -830,42 +2284,68 @@ class ExpenseTracker:
                 text.set_color('#1e3a8a')
                 text.set_fontsize(10)
                 text.set_fontweight('bold')
+                
+            self.pie_artists = (categories, wedges, texts, autotexts)
         
         # Set background color
         self.ax_pie.set_facecolor('#ffffff')
         self.fig_pie.patch.set_facecolor('#ffffff')
         
-        self.canvas_pie.draw()
+        self.canvas_pie.draw_idle()
+        
+    def _move_pie_wedges(self, amounts):
+        """Recompute wedge angles and label positions in place, as Axes.pie lays them out"""
+        _, wedges, texts, autotexts = self.pie_artists
+        total = sum(amounts)
+        theta1 = 90.0   # startangle
+        for amount, wedge, text, autotext in zip(amounts, wedges, texts, autotexts):
+            theta2 = theta1 + 360.0 * amount / total
+            wedge.set_theta1(theta1)
+            wedge.set_theta2(theta2)
+            
+            angle = math.radians((theta1 + theta2) / 2)
+            x, y = math.cos(angle), math.sin(angle)
+            text.set_position((1.1 * x, 1.1 * y))
+            text.set_horizontalalignment('left' if x > 0 else 'right')
+            autotext.set_position((0.6 * x, 0.6 * y))
+            autotext.set_text(f"{100.0 * amount / total:.1f}%")
+            theta1 = theta2
+            
+    def update_bar_chart(self, period_totals, period="month"):
+        # Get per-period data (keys from PeriodTotals)
+        period_data = defaultdict(lambda: {"income": 0, "expenses": 0})
+        
+        for (transaction_type, period_key), total in period_totals.items():
+            if transaction_type == "Income":
+                period_data[period_key]["income"] += total
+            else:
+                period_data[period_key]["expenses"] += total
+                
+        # Same periods as the drawn chart: just change bar heights and labels
+        sorted_keys = sorted(period_data.keys())
+        if self.bar_artists is not None and self.bar_artists[0] == (period, sorted_keys):
+            self._set_bar_heights([period_data[k]["income"] for k in sorted_keys],
+                                  [period_data[k]["expenses"] for k in sorted_keys])
+            self.canvas_bar.draw_idle()
+            return
+        self.bar_artists = None
         
-    def update_bar_chart(self):
         # Clear previous chart
         self.ax_bar.clear()
+        title = f"{self.chart_periods[period]} Income vs Expenses"
         
-        # Get monthly data
-        monthly_data = defaultdict(lambda: {"income": 0, "expenses": 0})
-        
-        for transaction in self.transactions:
-            date_obj = datetime.strptime(transaction["date"], "%Y-%m-%d")
-            month_key = f"{date_obj.year}-{date_obj.month:02d}"
-            
-            if transaction["type"] == "Income":
-                monthly_data[month_key]["income"] += transaction["amount"]
-            else:
-                monthly_data[month_key]["expenses"] += transaction["amount"]
-        
-        if not monthly_data:
+        if not period_data:
             self.ax_bar.text(0.5, 0.5, "No data available", ha="center", va="center", 
                             transform=self.ax_bar.transAxes, fontsize=16, color='#1e3a8a')
-            self.ax_bar.set_title("Monthly Income vs Expenses", color='#1e3a8a', fontsize=16, pad=25)
+            self.ax_bar.set_title(title, color='#1e3a8a', fontsize=16, pad=25)
         else:
-            # Sort months
-            sorted_months = sorted(monthly_data.keys())
-            months = [f"{datetime.strptime(m, '%Y-%m').strftime('%b %Y')}" for m in sorted_months]
-            income_values = [monthly_data[m]["income"] for m in sorted_months]
-            expense_values = [monthly_data[m]["expenses"] for m in sorted_months]
+            # Sorted period labels
+            labels = [PeriodTotals.label(period, k) for k in sorted_keys]
+            income_values = [period_data[k]["income"] for k in sorted_keys]
+            expense_values = [period_data[k]["expenses"] for k in sorted_keys]
             
             # Create bar chart with better styling
-            x = range(len(months))
+            x = range(len(labels))
             width = 0.35
             
             # Create bars with cooler colors and styling
@@ -877,11 +2357,13 @@ class ExpenseTracker:
                                          edgecolor='#ffffff', linewidth=2)
             
             # Style the chart
-            self.ax_bar.set_xlabel('Month', color='#1e3a8a', fontsize=12)
+            self.ax_bar.set_xlabel(period.title(), color='#1e3a8a', fontsize=12)
             self.ax_bar.set_ylabel('Amount (₹)', color='#1e3a8a', fontsize=12)
-            self.ax_bar.set_title('Monthly Income vs Expenses', color='#1e3a8a', fontsize=16, pad=25)
-            self.ax_bar.set_xticks(x)
-            self.ax_bar.set_xticklabels(months, rotation=45, ha='right', color='#1e3a8a', fontsize=10)
+            self.ax_bar.set_title(title, color='#1e3a8a', fontsize=16, pad=25)
+            # Label every nth bar when there are too many to read (e.g. daily)
+            step = max(1, math.ceil(len(labels) / self.max_bar_labels))
+            self.ax_bar.set_xticks(list(x)[::step])
+            self.ax_bar.set_xticklabels(labels[::step], rotation=45, ha='right', color='#1e3a8a', fontsize=10)
             
             # Add legend with better styling
             legend = self.ax_bar.legend(loc='upper right', frameon=True, 
@@ -899,35 +2381,48 @@ class ExpenseTracker:
             # Style y-axis labels
             self.ax_bar.tick_params(axis='y', colors='#1e3a8a', labelsize=10)
             
-            # Add value labels on bars for better readability
-            for i, (income_bar, expense_bar) in enumerate(zip(income_bars, expense_bars)):
-                # Income value label
-                if income_values[i] > 0:
-                    height = income_bar.get_height()
-                    self.ax_bar.text(income_bar.get_x() + income_bar.get_width()/2., height + 1000,
-                                   f'₹{income_values[i]:,.0f}', ha="center", va="bottom",
-                                   fontsize=9, color='#1e3a8a')
-                
-                # Expense value label
-                if expense_values[i] > 0:
-                    height = expense_bar.get_height()
-                    self.ax_bar.text(expense_bar.get_x() + expense_bar.get_width()/2., height + 1000,
-                                   f'₹{expense_values[i]:,.0f}', ha="center", va="bottom",
-                                   fontsize=9, color='#1e3a8a')
+            # Add value labels on bars for better readability (hidden for empty bars,
+            # kept so later updates can reuse them)
+            income_labels, expense_labels = [], []
+            for bars, values, labels in ((income_bars, income_values, income_labels),
+                                         (expense_bars, expense_values, expense_labels)):
+                for bar, value in zip(bars, values):
+                    label = self.ax_bar.text(bar.get_x() + bar.get_width()/2., bar.get_height() + 1000,
+                                             f'₹{value:,.0f}', ha="center", va="bottom",
+                                             fontsize=9, color='#1e3a8a')
+                    label.set_visible(value > 0 and len(bars) <= self.max_bar_labels)
+                    labels.append(label)
             
             # Adjust layout to prevent label cutoff
             self.fig_bar.tight_layout()
+            
+            self.bar_artists = ((period, sorted_keys), income_bars, expense_bars, income_labels, expense_labels)
         
         # Set background color
         self.ax_bar.set_facecolor('#ffffff')
         self.fig_bar.patch.set_facecolor('#ffffff')
         
-        self.canvas_bar.draw()
+        self.canvas_bar.draw_idle()
+        
+    def _set_bar_heights(self, income_values, expense_values):
+        """Update the existing bars and value labels, then rescale the y axis"""
+        _, income_bars, expense_bars, income_labels, expense_labels = self.bar_artists
+        for bars, labels, values in ((income_bars, income_labels, income_values),
+                                     (expense_bars, expense_labels, expense_values)):
+            for bar, label, value in zip(bars, labels, values):
+                bar.set_height(value)
+                label.set_position((bar.get_x() + bar.get_width()/2., value + 1000))
+                label.set_text(f'₹{value:,.0f}')
+                label.set_visible(value > 0 and len(bars) <= self.max_bar_labels)
+        self.ax_bar.relim()
+        self.ax_bar.autoscale_view(scalex=False)
         
     def generate_sample_data(self):
         """Generate 1 year of sample data"""
+        if self.data_busy():
+            return
         if messagebox.askyesno("Confirm", "This will replace all existing data with 1 year of sample transactions. Continue?"):
-            self.transactions = []
+            self.transactions.clear()
             
             # Generate data for the past 12 months
             end_date = datetime.now()
@@ -966,7 +2461,7 @@ class ExpenseTracker:
                 current_date += timedelta(days=1)
             
             self.update_display()
-            self.save_transactions()
+            self.save_all_transactions()
             messagebox.showinfo("Success", f"Generated {len(self.transactions)} sample transactions for 1 year!")
     
     def add_regular_expenses(self, date):
@@ -1032,29 +2527,132 @@ class ExpenseTracker:
             "type": "Expense"
         })
         
-    def save_transactions(self):
+    def journal_change(self, op, row_id):
+        """Persist a single add/edit/delete as one journal record"""
+        if self.journal is None:
+            return
         try:
-            with open(self.csv_file, 'w', newline='', encoding='utf-8') as file:
-                writer = csv.DictWriter(file, fieldnames=["date", "description", "amount", "category", "type"])
-                writer.writeheader()
-                writer.writerows(self.transactions)
+            transaction = None if op == "delete" else self.transactions.get(row_id)
+            self.journal.append(op, row_id, transaction)
+            if self.journal.needs_compaction(len(self.transactions)):
+                self.remap_table_rows(self.journal.compact(self.transactions))
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to save transactions: {str(e)}")
+            
+    def save_all_transactions(self):
+        """Persist a bulk change by writing a fresh snapshot"""
+        if self.journal is None:
+            return
+        try:
+            self.remap_table_rows(self.journal.compact(self.transactions))
         except Exception as e:
             messagebox.showerror("Error", f"Failed to save transactions: {str(e)}")
             
+    def _sync_journal(self):
+        if self.journal is None:
+            return
+        try:
+            self.journal.sync()
+        finally:
+            # Keep syncing even if one fsync fails
+            self.root.after(1000, self._sync_journal)
+        
+    def on_close(self):
+        self.worker.shutdown()
+        if self.journal is not None:
+            self.journal.close()
+        self.transactions.close()
+        self.root.destroy()
+        
+    def start_background_job(self, key, func, *args, status, on_done, error_message, cancellable=False, on_discard=None):
+        """Submit a job that shows its progress in the status bar"""
+        def finished():
+            self.status_var.set("")
+            if self.cancel_key == key:
+                self.cancel_key = None
+                self.cancel_button.pack_forget()
+                
+        def done(result):
+            finished()
+            on_done(result)
+            
+        def failed(error):
+            finished()
+            messagebox.showerror("Error", f"{error_message}: {str(error)}")
+            
+        self.status_var.set(status)
+        if cancellable:
+            self.cancel_key = key
+            self.cancel_button.pack(side="left", padx=5)
+        self.worker.submit(func, *args, key=key, on_done=done, on_error=failed, on_discard=on_discard,
+                           on_progress=lambda fraction, rows: self.status_var.set(f"{status} {fraction:.0%} ({rows:,} rows)"))
+        
+    def cancel_background_job(self):
+        if self.cancel_key:
+            self.worker.cancel(self.cancel_key)
+            self.status_var.set("Cancelled")
+            self.cancel_button.pack_forget()
+            self.cancel_key = None
+            
+    def _write_csv_job(self, job, filename):
+        reader = self.transactions.open_reader()
+        try:
+            count = 0
+            with open(filename, 'w', newline='', encoding='utf-8') as file:
+                writer = csv.DictWriter(file, fieldnames=TransactionStore.FIELDS)
+                writer.writeheader()
+                for transaction in reader:
+                    writer.writerow(transaction)
+                    count += 1
+            return count
+        finally:
+            reader.close()
+            
+    def save_transactions(self):
+        """Export all transactions to the CSV file"""
+        if self.data_busy():
+            return
+        self.start_background_job(
+            "save", self._write_csv_job, self.csv_file,
+            status="Saving...",
+            on_done=lambda count: messagebox.showinfo("Success", f"Saved {count} transactions to {self.csv_file}"),
+            error_message="Failed to save transactions")
+        
     def load_transactions(self):
-        if os.path.exists(self.csv_file):
-            try:
-                with open(self.csv_file, 'r', newline='', encoding='utf-8') as file:
-                    reader = csv.DictReader(file)
-                    self.transactions = []
-                    for row in reader:
-                        row["amount"] = float(row["amount"])
-                        self.transactions.append(row)
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to load transactions: {str(e)}")
-                self.transactions = []
+        if self.journal is None:
+            # SQLite: rows stay in the database; import the CSV into a new one
+            if len(self.transactions) == 0 and os.path.exists(self.csv_file):
+                self.import_csv_in_background(self.csv_file, announce=False)
+            return
+        
+        if self.journal.exists():
+            self.start_background_job(
+                "load", self._load_journal_job,
+                status="Loading transactions...",
+                on_done=self._loaded_journal,
+                error_message="Failed to load transactions")
+        elif os.path.exists(self.csv_file):
+            # First run: import the CSV once, then keep it in the journal
+            self.import_csv_in_background(self.csv_file, announce=False)
         else:
-            self.transactions = []
+            self.save_all_transactions()
+            
+    def _load_journal_job(self, job):
+        # Only reads the files; the journal is reopened on the UI thread, where
+        # _sync_journal and every edit also touch it
+        fresh = TransactionStore()
+        needs_snapshot = self.journal.replay(fresh)
+        return fresh, needs_snapshot
+    
+    def _loaded_journal(self, result):
+        fresh, needs_snapshot = result
+        self.transactions.adopt(fresh)
+        try:
+            # Before the table is drawn: compaction may renumber rows
+            self.journal.open(self.transactions, needs_snapshot)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to load transactions: {str(e)}")
+        self.update_display()
             
     def load_from_file(self):
         filename = filedialog.askopenfilename(
@@ -1063,20 +2661,49 @@ class ExpenseTracker:
         )
         
         if filename:
-            try:
-                with open(filename, 'r', newline='', encoding='utf-8') as file:
-                    reader = csv.DictReader(file)
-                    self.transactions = []
-                    for row in reader:
-                        row["amount"] = float(row["amount"])
-                        self.transactions.append(row)
-                    
-                self.update_display()
-                messagebox.showinfo("Success", f"Loaded {len(self.transactions)} transactions from {filename}")
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to load file: {str(e)}")
+            # Dedupe is opt-in: identical rows can be real, separate transactions
+            dedupe = messagebox.askyesno(
+                "Duplicates",
+                "Skip rows that exactly repeat an earlier row (same date, description, amount, category and type)?\n\n"
+                "Choose No if the file can hold genuinely repeated transactions.")
+            self.import_csv_in_background(filename, dedupe=dedupe)
+            
+    def import_csv_in_background(self, filename, announce=True, dedupe=False):
+        """Replace all transactions from a CSV on a worker thread, keeping the UI responsive"""
+        if self.data_busy():
+            return
+        
+        def imported(result):
+            importer, finish, _ = result
+            # Swap the new data in on the UI thread
+            finish()
+            self.save_all_transactions()
+            self.update_display()
+            if announce:
+                messagebox.showinfo("Success", f"Loaded {importer.summary()} from {filename}")
+                
+        self.start_background_job(
+            "import", self._import_job, filename, dedupe,
+            status="Importing...",
+            on_done=imported,
+            error_message="Failed to load file",
+            cancellable=True,
+            on_discard=lambda result: result[2]())
+        
+    def _import_job(self, job, filename, dedupe):
+        importer = CSVImporter(filename, progress=job.progress, dedupe=dedupe)
+        
+        def chunks():
+            for columns in importer.chunks():
+                job.check()
+                yield columns
                 
+        finish, discard = self.transactions.replace_from_chunks(chunks())
+        return importer, finish, discard
+    
     def export_report(self):
+        if self.data_busy():
+            return
         if not self.transactions:
             messagebox.showwarning("Warning", "No transactions to export")
             return
@@ -1088,24 +2715,40 @@ class ExpenseTracker:
         )
         
         if filename:
-            try:
-                # Create detailed report
-                report_data = []
-                for transaction in self.transactions:
-                    report_data.append({
+            self.start_background_job(
+                "export", self._export_report_job, filename, self.chart_period, self.chart_periods[self.chart_period],
+                status="Exporting report...",
+                on_done=lambda result: messagebox.showinfo("Success", f"Report exported to {filename}"),
+                error_message="Failed to export report",
+                cancellable=True)
+            
+    def _export_report_job(self, job, filename, period, period_name):
+        reader = self.transactions.open_reader()
+        try:
+            fieldnames = ["Date", "Description", "Amount (₹)", "Category", "Type"]
+            with open(filename, 'w', newline='', encoding='utf-8') as file:
+                writer = csv.DictWriter(file, fieldnames=fieldnames)
+                writer.writeheader()
+                
+                # Detailed rows, streamed rather than collected in memory
+                for count, transaction in enumerate(reader):
+                    if count % 10000 == 0:
+                        job.check()
+                    writer.writerow({
                         "Date": transaction["date"],
                         "Description": transaction["description"],
                         "Amount (₹)": transaction["amount"],
                         "Category": transaction["category"],
                         "Type": transaction["type"]
                     })
-                
+                    
                 # Add summary rows
-                total_income = sum(t["amount"] for t in self.transactions if t["type"] == "Income")
-                total_expenses = sum(t["amount"] for t in self.transactions if t["type"] == "Expense")
+                type_totals = reader.type_totals()
+                total_income = type_totals.get("Income", 0.0)
+                total_expenses = type_totals.get("Expense", 0.0)
                 balance = total_income - total_expenses
                 
-                report_data.extend([
+                writer.writerows([
                     {},
                     {"Date": "", "Description": "SUMMARY", "Amount (₹)": "", "Category": "", "Type": ""},
                     {"Date": "", "Description": "Total Income", "Amount (₹)": total_income, "Category": "", "Type": ""},
@@ -1113,27 +2756,32 @@ class ExpenseTracker:
                     {"Date": "", "Description": "Balance", "Amount (₹)": balance, "Category": "", "Type": ""}
                 ])
                 
-                # Save report
-                with open(filename, 'w', newline='', encoding='utf-8') as file:
-                    if report_data:
-                        writer = csv.DictWriter(file, fieldnames=report_data[0].keys())
-                        writer.writeheader()
-                        writer.writerows(report_data)
-                
-                messagebox.showinfo("Success", f"Report exported to {filename}")
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to export report: {str(e)}")
-                
+                # Totals per period, grouped the same way as the bar chart
+                period_totals = reader.period_totals(period)
+                writer.writerows([{}, {"Date": "", "Description": f"{period_name.upper()} TOTALS", "Amount (₹)": "", "Category": "", "Type": ""}])
+                writer.writerows({"Date": PeriodTotals.label(period, period_key), "Description": f"{transaction_type} total",
+                                  "Amount (₹)": total, "Category": "", "Type": transaction_type}
+                                 for (transaction_type, period_key), total in sorted(period_totals.items(), key=lambda item: (item[0][1], item[0][0])))
+        finally:
+            reader.close()
+            
+
     def clear_all_transactions(self):
+        if self.data_busy():
+            return
         if messagebox.askyesno("Confirm", "Are you sure you want to clear all transactions? This action cannot be undone."):
-            self.transactions = []
+            self.transactions.clear()
             self.update_display()
-            self.save_transactions()
+            self.save_all_transactions()
             messagebox.showinfo("Success", "All transactions cleared")
 
 def main():
+    parser = argparse.ArgumentParser(description="Expense Tracker")
+    parser.add_argument("--sqlite", metavar="PATH", help="store transactions in this SQLite database instead of the journal")
+    args = parser.parse_args()
+    
     root = tk.Tk()
-    app = ExpenseTracker(root)
+    app = ExpenseTracker(root, db_path=args.sqlite)
     root.mainloop()
 
 if __name__ == "__main__":
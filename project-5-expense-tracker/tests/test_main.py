@@ -0,0 +1,726 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from matplotlib.figure import Figure
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+
+def transaction(day, description="Tea", amount=10.0, category="Groceries", kind="Expense"):
+    return {"date": f"2024-01-{day:02d}", "description": description,
+            "amount": amount, "category": category, "type": kind}
+
+
+class RunningTotalsTests(unittest.TestCase):
+    ROWS = [
+        (main.date(2024, 1, 31).toordinal(), 10.5, 0, 0),
+        (main.date(2024, 2, 1).toordinal(), 20.0, 0, 0),
+        (main.date(2024, 2, 14).toordinal(), 4.25, 1, 0),
+        (main.date(2024, 2, 29).toordinal(), 500.0, 2, 1),
+        (main.date(2025, 1, 1).toordinal(), 7.75, 1, 0),
+    ]
+
+    def state(self, totals):
+        return ({name: dict(getattr(totals, name)) for name in ("by_type", "by_category", "by_month")},
+                {key: dict(counts) for key, counts in
+                 zip(("by_type", "by_category", "by_month"),
+                     (totals.counts[id(totals.by_type)], totals.counts[id(totals.by_category)],
+                      totals.counts[id(totals.by_month)]))})
+
+    def test_add_many_matches_adding_rows_one_by_one(self):
+        one_by_one = main.RunningTotals()
+        for row in self.ROWS:
+            one_by_one.add(*row)
+        batched = main.RunningTotals()
+        batched.add_many(*zip(*self.ROWS))
+
+        self.assertEqual(self.state(batched), self.state(one_by_one))
+        self.assertEqual(dict(batched.by_type), {0: 42.5, 1: 500.0})
+        self.assertEqual(dict(batched.by_month), {(0, 24288): 10.5, (0, 24289): 24.25,
+                                                  (1, 24289): 500.0, (0, 24300): 7.75})
+        self.assertEqual(main.RunningTotals.month_label(24289), "Feb 2024")
+
+    def test_removed_rows_leave_no_empty_buckets(self):
+        totals = main.RunningTotals()
+        totals.add_many(*zip(*self.ROWS))
+        for row in self.ROWS[2:]:
+            totals.remove(*row)
+        expected = main.RunningTotals()
+        for row in self.ROWS[:2]:
+            expected.add(*row)
+
+        self.assertEqual(self.state(totals), self.state(expected))
+        self.assertEqual(dict(totals.by_category), {(0, 0): 30.5})
+
+    def test_store_edits_move_amounts_between_buckets(self):
+        store = main.TransactionStore()
+        store.extend([transaction(1), transaction(2, amount=5.0, category="Fuel")])
+        row_id = store.append(transaction(3, amount=100.0, category="Salary", kind="Income"))
+
+        store.update(row_id, dict(transaction(3, amount=2.5, category="Fuel"), date="2024-02-03"))
+        store.delete(0)
+
+        self.assertEqual(store.type_totals(), {"Expense": 7.5})
+        self.assertEqual(store.category_totals("Expense"), {"Fuel": 7.5})
+        self.assertEqual(store.period_totals("month"), {("Expense", 24288): 5.0, ("Expense", 24289): 2.5})
+
+
+@unittest.skipIf(main.np is None, "NumPy is not installed")
+class PeriodTotalsTests(unittest.TestCase):
+    def columns(self):
+        """Live and deleted rows across week, month, quarter and leap-year boundaries"""
+        store = main.TransactionStore()
+        start = main.date(2019, 12, 25).toordinal()
+        for offset in range(0, 1600, 3):
+            day = main.date.fromordinal(start + offset).isoformat()
+            store.append(dict(transaction(1, amount=offset * 0.5 + 1, kind="Income" if offset % 2 else "Expense"),
+                              date=day))
+        for row_id in range(0, len(store.live), 7):
+            store.delete(row_id)
+        return store.dates, store.amounts, store.type_codes, store.live
+
+    def test_vector_keys_match_the_scalar_keys(self):
+        ordinals = main.np.arange(main.date(1999, 12, 20).toordinal(), main.date(2030, 1, 10).toordinal(),
+                                  dtype=main.np.int64)
+        for period in main.PeriodTotals.PERIODS:
+            with self.subTest(period=period):
+                self.assertEqual(main.PeriodTotals._vector_keys(period, ordinals).tolist(),
+                                 [main.PeriodTotals.key(period, ordinal) for ordinal in ordinals.tolist()])
+
+    def test_vectorized_totals_match_the_loop(self):
+        columns = self.columns()
+        for period in main.PeriodTotals.PERIODS:
+            with self.subTest(period=period):
+                vectorized = main.PeriodTotals.from_columns(period, *columns)
+                looped = main.PeriodTotals._from_columns_loop(period, *columns)
+                self.assertEqual(vectorized.keys(), looped.keys())
+                for key, total in looped.items():
+                    self.assertAlmostEqual(vectorized[key], total)
+                with mock.patch.object(main, "np", None):
+                    self.assertEqual(main.PeriodTotals.from_columns(period, *columns), looped)
+
+
+class TransactionStoreTests(unittest.TestCase):
+    def test_compact_drops_deleted_rows_and_renumbers(self):
+        store = main.TransactionStore()
+        for day in range(1, 6):
+            store.append(transaction(day, description=f"Row {day}"))
+        store.delete(1)
+        store.delete(3)
+
+        remap = store.compact()
+
+        self.assertEqual(list(remap), [0, -1, 1, -1, 2])
+        self.assertEqual(len(store.live), 3)
+        self.assertEqual([store.get(row_id)["description"] for row_id in store.row_ids()],
+                         ["Row 1", "Row 3", "Row 5"])
+        self.assertEqual(store.query(category="Groceries"), [0, 1, 2])
+        start = main.TransactionStore.parse_date("2024-01-03")
+        self.assertEqual(store.rows_between(start, start + 3), [1, 2])
+        self.assertEqual(store.type_totals(), {"Expense": 30.0})
+        self.assertIsNone(store.compact())
+
+    def test_compact_leaves_open_readers_alone(self):
+        store = main.TransactionStore()
+        store.append(transaction(1))
+        store.append(transaction(2))
+        store.delete(0)
+        reader = store.open_reader()
+
+        store.compact()
+
+        self.assertEqual(len(reader.live), 2)
+        self.assertEqual([row["date"] for row in reader], ["2024-01-02"])
+
+
+class SQLiteTransactionStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="expense-tests-")
+        self.store = main.SQLiteTransactionStore(os.path.join(self.directory, "expenses.db"))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def columns(self, transactions):
+        return {"date": [main.TransactionStore.parse_date(t["date"]) for t in transactions],
+                "description": [t["description"] for t in transactions],
+                "amount": [t["amount"] for t in transactions],
+                "category": [t["category"] for t in transactions],
+                "type": [t["type"] for t in transactions]}
+
+    def test_query_matches_date_ranges_and_literal_text(self):
+        for day, description in ((1, "50% off"), (2, "500 off"), (3, "a_b"), (4, "axb"), (31, "Rent")):
+            self.store.append(transaction(day, description=description))
+        parse = main.TransactionStore.parse_date
+
+        self.assertEqual(self.store.query(text="0%"), [1])
+        self.assertEqual(self.store.query(text="A_B"), [3])
+        self.assertEqual(self.store.query(date_ranges=[(parse("2024-01-02"), parse("2024-01-04")),
+                                                       (parse("2024-01-31"), main.date.max.toordinal() + 1)]),
+                         [2, 3, 5])
+        self.assertEqual(self.store.query(date_ranges=[]), [])
+        self.assertEqual(self.store.query(category="Groceries", min_amount=10, max_amount=10, text="off"), [1, 2])
+
+    def test_get_many_spans_several_chunks(self):
+        self.store.replace_from_chunks([self.columns([transaction(day % 28 + 1, description=f"Row {day}")
+                                                      for day in range(1200)])])[0]()
+        row_ids = self.store.row_ids()[::-1] + [999999]
+
+        rows = self.store.get_many(row_ids)
+
+        self.assertEqual(len(rows), 1200)
+        self.assertEqual(rows[row_ids[0]]["description"], "Row 1199")
+
+    def test_period_totals_match_the_in_memory_store(self):
+        memory = main.TransactionStore()
+        for year in (2023, 2024):
+            for month in range(1, 13):
+                for day, kind in ((1, "Income"), (7, "Expense"), (28, "Expense")):
+                    row = dict(transaction(day, amount=month * 10.0 + day, kind=kind),
+                               date=f"{year}-{month:02d}-{day:02d}")
+                    memory.append(row)
+                    self.store.append(row)
+
+        for period in main.PeriodTotals.PERIODS:
+            with self.subTest(period=period):
+                self.assertEqual(self.store.period_totals(period), memory.period_totals(period))
+
+    def test_import_commits_only_when_finished(self):
+        self.store.append(transaction(1, description="Old"))
+
+        finish, discard = self.store.replace_from_chunks([self.columns([transaction(2, description="New")])])
+        self.assertEqual([row["description"] for row in self.store], ["Old"])
+        finish()
+        self.assertEqual([row["description"] for row in self.store], ["New"])
+
+        finish, discard = self.store.replace_from_chunks([self.columns([transaction(3, description="Dropped")])])
+        discard()
+        self.assertEqual([row["description"] for row in self.store], ["New"])
+
+    def test_cancelled_import_rolls_back(self):
+        self.store.append(transaction(1, description="Old"))
+
+        def chunks():
+            yield self.columns([transaction(2, description="New")])
+            raise main.JobCancelled()
+
+        with self.assertRaises(main.JobCancelled):
+            self.store.replace_from_chunks(chunks())
+
+        self.assertEqual([row["description"] for row in self.store], ["Old"])
+        # No write lock is left behind
+        self.store.append(transaction(3))
+        self.assertEqual(len(self.store), 2)
+
+
+class TransactionJournalTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="expense-tests-")
+        self.base_path = os.path.join(self.directory, "transactions")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write_lines(self, path, lines):
+        with open(path, 'w', encoding='utf-8') as file:
+            file.writelines(line + "\n" for line in lines)
+
+    def read(self, path):
+        with open(path, encoding='utf-8') as file:
+            return file.read()
+
+    def write_ledger(self, journal_generation=1):
+        """Snapshot rows 0 and 1 plus a journal that adds row 2 and edits row 0"""
+        self.write_lines(self.base_path + ".snapshot", [
+            '{"generation": 1, "fields": ["date", "description", "amount", "category", "type"]}',
+            '[0, "2024-01-01", "Rent", 12000.0, "Rent", "Expense"]',
+            '[1, "2024-01-02", "Salary", 50000.0, "Salary Income", "Income"]'
+        ])
+        self.write_lines(self.base_path + ".journal", [
+            '{"generation": %d}' % journal_generation,
+            '{"op": "add", "row": 2, "transaction": {"date": "2024-01-03", "description": "Milk", '
+            '"amount": 60.0, "category": "Groceries", "type": "Expense"}}',
+            '{"op": "edit", "row": 0, "transaction": {"date": "2024-01-01", "description": "Rent", '
+            '"amount": 13000.0, "category": "Rent", "type": "Expense"}}'
+        ])
+
+    def reload(self):
+        journal = main.TransactionJournal(self.base_path)
+        store = main.TransactionStore()
+        self.assertTrue(journal.load(store))
+        journal.close()
+        return store
+
+    def test_compaction_renumbers_ids_for_later_records(self):
+        journal = main.TransactionJournal(self.base_path)
+        store = main.TransactionStore()
+        journal.compact(store)
+        for day in range(1, 5):
+            row = transaction(day, description=f"Row {day}")
+            journal.append("add", store.append(row), row)
+        store.delete(0)
+        journal.append("delete", 0)
+
+        remap = journal.compact(store)
+        self.assertEqual(list(remap), [-1, 0, 1, 2])
+
+        # Records written after compaction use the new ids
+        store.update(0, transaction(2, description="Edited"))
+        journal.append("edit", 0, store.get(0))
+        journal.close()
+
+        reloaded = self.reload()
+        self.assertEqual([row["description"] for row in reloaded], ["Edited", "Row 3", "Row 4"])
+
+    def test_torn_tail_is_dropped_and_folded_into_a_snapshot(self):
+        self.write_ledger()
+        with open(self.base_path + ".journal", 'a', encoding='utf-8') as file:
+            file.write('{"op": "delete", "ro')
+
+        store = self.reload()
+        self.assertEqual([row["amount"] for row in store], [13000.0, 50000.0, 60.0])
+
+        # The replayed records now live in a new snapshot with an empty journal
+        self.assertEqual(self.read(self.base_path + ".journal"), '{"generation": 2}\n')
+        self.assertEqual([row["amount"] for row in self.reload()], [13000.0, 50000.0, 60.0])
+
+    def test_replay_writes_nothing_until_open(self):
+        self.write_ledger()
+        snapshot = self.read(self.base_path + ".snapshot")
+        journal = main.TransactionJournal(self.base_path)
+        store = main.TransactionStore()
+
+        self.assertTrue(journal.replay(store))
+        self.assertIsNone(journal.file)
+        self.assertEqual(self.read(self.base_path + ".snapshot"), snapshot)
+
+        journal.open(store, True)
+        journal.close()
+        self.assertEqual(journal.generation, 2)
+        self.assertEqual(self.read(self.base_path + ".journal"), '{"generation": 2}\n')
+
+    def test_journal_from_another_generation_is_ignored(self):
+        self.write_ledger(journal_generation=0)
+
+        store = self.reload()
+        self.assertEqual([row["amount"] for row in store], [12000.0, 50000.0])
+
+    def test_load_renumbers_snapshot_ids_with_gaps(self):
+        self.write_lines(self.base_path + ".snapshot", [
+            '{"generation": 3, "fields": ["date", "description", "amount", "category", "type"]}',
+            '[4, "2024-01-01", "Rent", 12000.0, "Rent", "Expense"]',
+            '[9, "2024-01-02", "Salary", 50000.0, "Salary Income", "Income"]'
+        ])
+        journal = main.TransactionJournal(self.base_path)
+        store = main.TransactionStore()
+        journal.load(store)
+
+        # Row 9 is row 1 from now on, in the store and in the files
+        store.update(1, transaction(2, description="Bonus", amount=5000.0, category="Salary Income", kind="Income"))
+        journal.append("edit", 1, store.get(1))
+        journal.close()
+
+        self.assertEqual(journal.generation, 4)
+        self.assertEqual([row["description"] for row in self.reload()], ["Rent", "Bonus"])
+
+    def test_failed_load_leaves_files_untouched_and_refuses_writes(self):
+        self.write_ledger()
+        with open(self.base_path + ".journal", 'a', encoding='utf-8') as file:
+            file.write('{"op": "delete", "row": 7}\n')
+        snapshot = self.read(self.base_path + ".snapshot")
+        journal_text = self.read(self.base_path + ".journal")
+
+        journal = main.TransactionJournal(self.base_path)
+        store = main.TransactionStore()
+        with self.assertRaises(KeyError):
+            journal.load(store)
+        with self.assertRaises(RuntimeError):
+            journal.append("add", 0, transaction(1))
+        with self.assertRaises(RuntimeError):
+            journal.compact(store)
+        journal.close()
+
+        self.assertEqual(self.read(self.base_path + ".snapshot"), snapshot)
+        self.assertEqual(self.read(self.base_path + ".journal"), journal_text)
+
+    def test_load_builds_date_index_for_newest_first_rows(self):
+        journal = main.TransactionJournal(self.base_path)
+        store = main.TransactionStore()
+        journal.compact(store)
+        for day in range(28, 0, -1):
+            row = transaction(day)
+            journal.append("add", store.append(row), row)
+        journal.close()
+
+        reloaded = self.reload()
+        self.assertEqual(list(reloaded.date_index), sorted(reloaded.date_index))
+        self.assertEqual(list(reloaded.date_index), list(store.date_index))
+        start = main.TransactionStore.parse_date("2024-01-01")
+        self.assertEqual(reloaded.rows_between(start, start + 2), [27, 26])
+
+
+class StubTree:
+    """The slice of ttk.Treeview the virtual table window uses, without a display"""
+
+    def __init__(self, row_height=20, heading_height=25, height=0):
+        self.items = []
+        self.values = {}
+        self.row_height, self.heading_height, self.height = row_height, heading_height, height
+        self.writes = 0
+        self.focused = ""
+        self.top = 0
+
+    def get_children(self):
+        return tuple(self.items)
+
+    def delete(self, *iids):
+        for iid in iids:
+            self.items.remove(iid)
+            del self.values[iid]
+
+    def insert(self, parent, index, iid, values, tags):
+        self.items.insert(index, iid)
+        self.values[iid] = (values, tags)
+        self.writes += 1
+
+    def item(self, iid, values, tags):
+        self.values[iid] = (values, tags)
+        self.writes += 1
+
+    def move(self, iid, parent, index):
+        self.items.remove(iid)
+        self.items.insert(index, iid)
+
+    def index(self, iid):
+        return self.items.index(iid)
+
+    def exists(self, iid):
+        return iid in self.values
+
+    def focus(self, iid=None):
+        if iid is None:
+            return self.focused
+        self.focused = iid
+
+    def selection_set(self, iid):
+        self.selected = iid
+
+    def yview_moveto(self, fraction):
+        self.top = 0
+
+    def yview_scroll(self, number, what):
+        self.top += number
+
+    def bbox(self, iid):
+        position = self.items.index(iid) - self.top
+        if position < 0:
+            return ""
+        return (0, self.heading_height + position * self.row_height, 100, self.row_height)
+
+    def winfo_height(self):
+        return self.height
+
+    def after_idle(self, callback):
+        self.idle = callback
+
+
+class TableWindowTests(unittest.TestCase):
+    def setUp(self):
+        self.store = main.TransactionStore()
+        self.store.extend(transaction(day % 28 + 1, description=f"Row {day}") for day in range(100))
+        self.tracker = main.ExpenseTracker.__new__(main.ExpenseTracker)
+        self.tracker.transactions = self.store
+        self.tracker.tree = self.tree = StubTree()
+        self.tracker.table_scrollbar = mock.Mock()
+        self.tracker.view_rows = []
+        self.tracker.view_offset = 0
+        self.tracker.view_window_start = 0
+        self.tracker.table_values = {}
+        self.tracker.table_overscan = 5
+        self.tracker.table_page = 10
+        self.tracker.table_row_metrics = None
+        self.tracker.view_filters = None
+
+    def shown(self):
+        return [int(iid) for iid in self.tree.items]
+
+    def test_only_the_visible_window_is_materialized(self):
+        self.tracker.display_transactions(self.store.row_ids())
+        self.assertEqual(self.shown(), list(range(15)))
+        self.assertEqual(self.tree.values["0"][0][1], "Row 0")
+        self.assertEqual(self.tree.values["1"][1], ("oddrow",))
+        self.tracker.table_scrollbar.set.assert_called_with(0.0, 0.1)
+
+        writes = self.tree.writes
+        self.tracker.on_table_scroll("scroll", 1, "pages")
+
+        self.assertEqual(self.shown(), list(range(5, 25)))
+        self.assertEqual(self.tree.top, 5)
+        # Rows still in the window keep their items untouched
+        self.assertEqual(self.tree.writes - writes, 10)
+        self.tracker.table_scrollbar.set.assert_called_with(0.1, 0.2)
+
+        self.tracker.on_table_scroll("moveto", "0.99")
+        self.assertEqual(self.tracker.view_offset, 90)
+        self.assertEqual(self.shown(), list(range(85, 100)))
+
+    def test_arrow_keys_scroll_the_window_with_the_selection(self):
+        self.tracker.display_transactions(self.store.row_ids())
+        self.tree.focus("9")
+
+        self.tracker._move_table_selection(1)
+
+        self.assertEqual((self.tree.selected, self.tracker.view_offset), ("10", 1))
+        self.assertEqual(self.shown(), list(range(0, 16)))
+
+    def test_compaction_renumbers_the_view(self):
+        self.tracker.display_transactions(self.store.query(min_amount=0))
+        for row_id in range(0, 100, 2):
+            self.store.delete(row_id)
+        self.tracker.view_rows = [row_id for row_id in self.tracker.view_rows if self.store.live[row_id]]
+
+        self.tracker.remap_table_rows(self.store.compact())
+
+        self.assertEqual(self.shown(), list(range(15)))
+        self.assertEqual(self.tree.values["0"][0][1], "Row 1")
+        self.assertEqual(self.tree.values["0"][1], ("evenrow",))
+
+    def test_page_follows_the_tree_height(self):
+        self.tracker.display_transactions(self.store.row_ids())
+        self.tree.height = 25 + 20 * 30
+
+        self.tree.idle()
+
+        self.assertEqual((self.tracker.table_row_metrics, self.tracker.table_page), ((20, 25), 30))
+        self.assertEqual(self.shown(), list(range(35)))
+
+
+class StubRoot:
+    """Collects root.after callbacks instead of running a Tk event loop"""
+
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, delay, callback):
+        self.scheduled.append(callback)
+        return f"after#{len(self.scheduled)}"
+
+
+class BackgroundWorkerTests(unittest.TestCase):
+    def setUp(self):
+        self.root = StubRoot()
+        self.worker = main.BackgroundWorker(self.root)
+        self.addCleanup(self.worker.executor.shutdown)
+        # Jobs run through _run() on this thread, so nothing races the assertions
+        self.worker.executor = mock.Mock()
+        self.worker.executor.submit.side_effect = lambda run, job, func, args: self.queued.append((run, job, func, args))
+        self.queued = []
+        self.calls = []
+
+    def run_queued(self):
+        for run, job, func, args in self.queued:
+            run(job, func, args)
+        self.queued = []
+
+    def poll(self):
+        self.root.scheduled = []
+        self.worker._poll()
+        self.assertEqual(len(self.root.scheduled), 1)
+
+    def submit(self, func, *args, key=None, name="job"):
+        return self.worker.submit(
+            func, *args, key=key,
+            on_done=lambda value: self.calls.append((name, "done", value)),
+            on_error=lambda error: self.calls.append((name, "error", str(error))),
+            on_progress=lambda *values: self.calls.append((name, "progress", values)),
+            on_discard=lambda value: self.calls.append((name, "discard", value)))
+
+    def test_newest_job_with_a_key_wins(self):
+        self.submit(lambda job, value: value, 1, key="summary", name="first")
+        second = self.submit(lambda job, value: value, 2, key="summary", name="second")
+        self.submit(lambda job: "other", key="other", name="other")
+        self.assertIs(self.worker.pending["summary"], second)
+
+        self.run_queued()
+        self.poll()
+
+        # The superseded job was cancelled before it ran, so it neither ran nor reported
+        self.assertEqual(self.calls, [("second", "done", 2), ("other", "done", "other")])
+        self.assertFalse(self.worker.is_pending("summary"))
+
+    def test_cancelled_jobs_report_nothing_but_discard_finished_work(self):
+        def step(job):
+            job.progress(0.5, 10)
+            self.worker.cancel("import")
+            job.check()
+
+        self.submit(step, key="import", name="stopped")
+        self.run_queued()
+        self.poll()
+        self.assertEqual(self.calls, [])
+        self.assertFalse(self.worker.is_pending("import"))
+
+        self.submit(lambda job: "built", key="import", name="late")
+        self.run_queued()
+        self.worker.cancel("import")
+        self.poll()
+        self.assertEqual(self.calls, [("late", "discard", "built")])
+
+    def test_progress_and_errors_are_delivered_on_poll(self):
+        def fail(job):
+            job.progress(1.0, 3)
+            raise ValueError("bad row")
+
+        self.submit(fail, key="save", name="save")
+        self.run_queued()
+        self.assertEqual(self.calls, [])
+        self.poll()
+
+        self.assertEqual(self.calls, [("save", "progress", (1.0, 3)), ("save", "error", "bad row")])
+        self.assertFalse(self.worker.is_pending("save"))
+
+
+class ChartRefreshTests(unittest.TestCase):
+    def setUp(self):
+        self.root = StubRoot()
+        self.tracker = tracker = main.ExpenseTracker.__new__(main.ExpenseTracker)
+        tracker.root = self.root
+        tracker.fig_pie = Figure(figsize=(8, 6))
+        tracker.ax_pie = tracker.fig_pie.subplots()
+        tracker.fig_bar = Figure(figsize=(10, 6))
+        tracker.ax_bar = tracker.fig_bar.subplots()
+        tracker.canvas_pie, tracker.canvas_bar = mock.Mock(), mock.Mock()
+        tracker.chart_periods = {"day": "Daily", "week": "Weekly", "month": "Monthly", "quarter": "Quarterly", "year": "Yearly"}
+        tracker.chart_refresh_ms = 100
+        tracker.chart_refresh_id = None
+        tracker.pending_chart_data = None
+        tracker.drawn_expense_data = None
+        tracker.drawn_period_totals = None
+        tracker.pie_artists = None
+        tracker.bar_artists = None
+        tracker.max_bar_labels = 24
+
+    def refresh(self, expenses, periods, period="month"):
+        self.tracker.schedule_chart_refresh(expenses, (period, periods))
+
+    def run_scheduled(self):
+        scheduled, self.root.scheduled = self.root.scheduled, []
+        for callback in scheduled:
+            callback()
+
+    def test_bursts_redraw_once_with_the_latest_data(self):
+        for amount in (10000.0, 20000.0, 30000.0):
+            self.refresh({"Rent": amount}, {("Expense", 24288): amount})
+        self.assertEqual(len(self.root.scheduled), 1)
+
+        self.run_scheduled()
+
+        self.assertEqual(self.tracker.drawn_expense_data, {"Rent": 30000.0})
+        self.assertEqual(self.tracker.bar_artists[1][0].get_height(), 0)
+        self.assertEqual(self.tracker.bar_artists[2][0].get_height(), 30000.0)
+        self.assertEqual(self.tracker.canvas_pie.draw_idle.call_count, 1)
+
+        # Unchanged numbers leave both charts alone
+        self.refresh({"Rent": 30000.0}, {("Expense", 24288): 30000.0})
+        self.run_scheduled()
+        self.assertEqual(self.tracker.canvas_pie.draw_idle.call_count, 1)
+        self.assertEqual(self.tracker.canvas_bar.draw_idle.call_count, 1)
+
+    def test_same_categories_and_periods_reuse_the_artists(self):
+        self.refresh({"Rent": 30000.0, "Fuel": 10000.0}, {("Income", 24288): 50000.0, ("Expense", 24288): 40000.0})
+        self.run_scheduled()
+        wedges, bars = self.tracker.pie_artists[1], self.tracker.bar_artists[2]
+
+        self.refresh({"Rent": 10000.0, "Fuel": 10000.0}, {("Income", 24288): 50000.0, ("Expense", 24288): 20000.0})
+        self.run_scheduled()
+
+        self.assertIs(self.tracker.pie_artists[1], wedges)
+        self.assertIs(self.tracker.bar_artists[2], bars)
+        self.assertEqual((wedges[0].theta1, wedges[0].theta2, wedges[1].theta2), (90.0, 270.0, 450.0))
+        self.assertEqual(self.tracker.pie_artists[3][0].get_text(), "50.0%")
+        self.assertEqual(bars[0].get_height(), 20000.0)
+        self.assertEqual(self.tracker.bar_artists[4][0].get_text(), "₹20,000")
+
+        # A new period or category rebuilds the chart
+        self.refresh({"Rent": 10000.0}, {("Expense", 24288): 20000.0, ("Expense", 24289): 5000.0})
+        self.run_scheduled()
+        self.assertIsNot(self.tracker.pie_artists[1], wedges)
+        self.assertEqual(self.tracker.bar_artists[0], ("month", [24288, 24289]))
+
+
+class CSVImporterTests(unittest.TestCase):
+    """Every case runs through both the pandas and the csv module parser"""
+
+    EDGE_CASES = (
+        "date,description,amount,category,type\n"
+        "2024-01-05,Milk,60,Groceries,Expense\n"
+        "2024-01-05,Milk,60,Groceries,Expense\n"
+        " 2024-01-06 ,Bread, 45.5 ,Groceries,Expense\n"
+        "2024-01-07,Not a number,nan,Groceries,Expense\n"
+        "2024-01-07,Infinite,inf,Groceries,Expense\n"
+        "2024-01-07,Negative infinite,-Infinity,Groceries,Expense\n"
+        "2024-01-07,Overflow,1e400,Groceries,Expense\n"
+        "2024-01-07,Separator,1_000,Groceries,Expense\n"
+        "2024-01-07,Blank,,Groceries,Expense\n"
+        "2024-02-30,Bad date,10,Groceries,Expense\n"
+        "not a date,Bad date,10,Groceries,Expense\n"
+        "2024-01-08,Salary,50000,Salary Income,Income\n"
+    )
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="expense-tests-")
+        self.path = os.path.join(self.directory, "import.csv")
+        with open(self.path, 'w', encoding='utf-8', newline='') as file:
+            file.write(self.EDGE_CASES)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def parsers(self):
+        yield "csv", mock.patch.object(main, "pd", None)
+        if main.pd is not None:
+            yield "pandas", mock.patch.object(main, "pd", main.pd)
+
+    def run_import(self, dedupe=False):
+        results = {}
+        for name, parser in self.parsers():
+            with parser:
+                importer = main.CSVImporter(self.path, chunk_rows=2, dedupe=dedupe)
+                store = main.TransactionStore()
+                for columns in importer.chunks():
+                    store.extend_columns(columns)
+            results[name] = (importer, store)
+        return results
+
+    def test_non_finite_and_malformed_rows_are_skipped(self):
+        for name, (importer, store) in self.run_import().items():
+            with self.subTest(parser=name):
+                self.assertEqual([(row["date"], row["amount"]) for row in store],
+                                 [("2024-01-05", 60.0), ("2024-01-05", 60.0),
+                                  ("2024-01-06", 45.5), ("2024-01-08", 50000.0)])
+                self.assertEqual((importer.rows_read, importer.imported, importer.invalid, importer.duplicates),
+                                 (12, 4, 8, 0))
+
+    def test_duplicates_are_kept_unless_dedupe_is_asked_for(self):
+        for name, (importer, store) in self.run_import(dedupe=True).items():
+            with self.subTest(parser=name):
+                self.assertEqual([row["description"] for row in store], ["Milk", "Bread", "Salary"])
+                self.assertEqual(importer.duplicates, 1)
+                self.assertEqual(importer.summary(), "3 transactions (skipped 8 invalid and 1 exact duplicate rows)")
+
+    def test_parsers_agree(self):
+        results = self.run_import()
+        if len(results) < 2:
+            self.skipTest("pandas is not installed")
+        self.assertEqual(list(results["csv"][1]), list(results["pandas"][1]))
+
+
+if __name__ == "__main__":
+    unittest.main()